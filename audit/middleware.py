@@ -0,0 +1,31 @@
+from inspect import iscoroutinefunction, markcoroutinefunction
+
+from .recorder import reset_actor, set_actor
+
+
+class AuditActorMiddleware:
+    """Attributes model changes made while handling a request to its user."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = set_actor(lambda: request.user)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_actor(token)
+
+    async def __acall__(self, request):
+        token = set_actor(lambda: request.user)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_actor(token)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class AuditEntry(models.Model):
+    """One recorded change to a tracked model (see audit/recorder.py)."""
+
+    CREATE = 'CREATE'
+    UPDATE = 'UPDATE'
+    DELETE = 'DELETE'
+    ADJUST = 'ADJUST'  # Relative change made in SQL, e.g. a stock decrement; changes hold deltas
+    ACTION_CHOICES = [
+        (CREATE, 'Created'),
+        (UPDATE, 'Updated'),
+        (DELETE, 'Deleted'),
+        (ADJUST, 'Adjusted'),
+    ]
+
+    timestamp = models.DateTimeField(db_index=True)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_entries'
+    )
+    # Kept as text so the entry still names the user after the account is deleted
+    actor_name = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    model = models.CharField(max_length=100)  # app_label.modelname
+    object_id = models.CharField(max_length=64)
+    object_repr = models.CharField(max_length=200)
+    # {field: [before, after]}, or {field: delta} for ADJUST
+    changes = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'timestamp'], name='audit_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.model} #{self.object_id} by {self.actor_name or 'system'}"
@@ -0,0 +1,133 @@
+"""
+Captures who changed what on the tracked models.
+
+``audit_changes(Model)`` (called from each app's ready()) snapshots the
+tracked fields when an instance is loaded, and on save/delete records the
+difference with the current user (set by AuditActorMiddleware). Changes
+made in SQL without signals, such as the conditional stock decrement,
+call ``record_adjustment`` themselves; set-based writes over many rows
+(bulk_create, update()) call ``record_bulk_changes`` once. Entries are handed to the
+background writer only when the transaction commits, so a rolled-back
+checkout leaves no trace.
+"""
+
+import contextvars
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import AuditEntry
+from .writer import get_writer
+
+_actor = contextvars.ContextVar('audit_actor', default=None)
+
+_tracked_fields = {}
+
+
+def set_actor(get_user):
+    """
+    Sets the user changes are attributed to, as a callable returning it, so a
+    request's user is only loaded once something is recorded. Returns a token for reset_actor().
+    """
+    return _actor.set(get_user)
+
+
+def reset_actor(token):
+    _actor.reset(token)
+
+
+def _values(instance):
+    # Deferred fields are skipped rather than loaded
+    loaded = instance.__dict__
+    return {name: loaded[name] for name in _tracked_fields[type(instance)] if name in loaded}
+
+
+def _snapshot(sender, instance, **kwargs):
+    instance._audit_snapshot = _values(instance)
+
+
+def _current_actor():
+    get_user = _actor.get()
+    return get_user() if get_user is not None else None
+
+
+def _entry(model, object_id, object_repr, action, changes, actor):
+    authenticated = actor is not None and actor.is_authenticated
+    return {
+        'timestamp': timezone.now(),
+        'actor_id': actor.pk if authenticated else None,
+        'actor_name': actor.get_username() if authenticated else '',
+        'action': action,
+        'model': model._meta.label_lower,
+        'object_id': str(object_id),
+        'object_repr': str(object_repr)[:200],
+        'changes': changes,
+    }
+
+
+def _put_all(entries):
+    writer = get_writer()
+    for entry in entries:
+        writer.put(entry)
+
+
+def _enqueue(instance, action, changes, using, actor=None):
+    entry = _entry(type(instance), instance.pk, instance, action, changes, actor or _current_actor())
+    transaction.on_commit(partial(get_writer().put, entry), using=using)
+
+
+def _on_save(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    current = _values(instance)
+    if created:
+        changes = {name: [None, value] for name, value in current.items()}
+    else:
+        before = getattr(instance, '_audit_snapshot', {})
+        changes = {
+            name: [before[name], value]
+            for name, value in current.items()
+            if name in before and before[name] != value
+        }
+    instance._audit_snapshot = current
+    if changes:
+        _enqueue(instance, AuditEntry.CREATE if created else AuditEntry.UPDATE, changes, using)
+
+
+def _on_delete(sender, instance, using=None, **kwargs):
+    _enqueue(instance, AuditEntry.DELETE, {name: [value, None] for name, value in _values(instance).items()}, using)
+
+
+def audit_changes(*models, exclude=()):
+    """Records creates, updates and deletes of `models`, ignoring the fields named in `exclude`."""
+    for model in models:
+        _tracked_fields[model] = tuple(
+            field.attname for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in exclude
+        )
+        post_init.connect(_snapshot, sender=model, dispatch_uid=f'audit_snapshot_{model._meta.label_lower}')
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'audit_save_{model._meta.label_lower}')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'audit_delete_{model._meta.label_lower}')
+
+
+def record_adjustment(instance, using='default', actor=None, **deltas):
+    """
+    Records a relative change made without save(), e.g. ``record_adjustment(product, stock_quantity=-2)``.
+    `actor` overrides the current user, e.g. for work done by a job on someone's behalf.
+    """
+    _enqueue(instance, AuditEntry.ADJUST, deltas, using, actor)
+
+
+def record_bulk_changes(model, rows, action=AuditEntry.ADJUST, actor=None, using='default'):
+    """
+    Records one entry per row of `model` written without signals by a
+    set-based write. `rows` are (pk, object_repr, changes) in the format of
+    `action`; no instances are needed. All entries are handed to the
+    writer together when the transaction commits.
+    """
+    actor = actor or _current_actor()
+    entries = [_entry(model, pk, object_repr, action, changes, actor) for pk, object_repr, changes in rows]
+    if entries:
+        transaction.on_commit(partial(_put_all, entries), using=using)
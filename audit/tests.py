@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from products.models import Product
+from .models import AuditEntry
+from .writer import get_writer
+
+
+class RecorderTests(TransactionTestCase):
+    # Entries are written by the writer thread after commit; flush() waits for it
+
+    def entries(self):
+        get_writer().flush()
+        return list(AuditEntry.objects.filter(model='products.product').order_by('pk'))
+
+    def create_product(self):
+        return Product.objects.create(name='Tyre', brand='B', size='205/55R16', type='Car', price=Decimal('100.00'))
+
+    def test_committed_save_is_recorded_once(self):
+        with transaction.atomic():
+            product = self.create_product()
+            product.price = Decimal('120.00')
+            product.save()
+            # Nothing is handed to the writer before the commit
+            self.assertEqual(get_writer().queue.qsize(), 0)
+
+        entries = self.entries()
+        self.assertEqual([entry.action for entry in entries], [AuditEntry.CREATE, AuditEntry.UPDATE])
+        self.assertEqual(entries[1].object_id, str(product.pk))
+        self.assertEqual(entries[1].changes, {'price': ['100.00', '120.00']})
+
+    def test_rolled_back_save_records_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_product()
+            raise RuntimeError
+        self.assertEqual(self.entries(), [])
+
+    def test_excluded_fields_are_left_out(self):
+        product = self.create_product()
+        # Changes size_key and updated_at as well
+        product.size = '225/45R17'
+        product.save()
+
+        created, updated = self.entries()
+        self.assertFalse({'updated_at', 'size_key'} & set(created.changes))
+        self.assertEqual(updated.changes, {'size': ['205/55R16', '225/45R17']})
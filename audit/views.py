@@ -0,0 +1,27 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.generic import ListView
+
+from .models import AuditEntry
+
+
+class AuditLogListView(LoginRequiredMixin, ListView):
+    """Newest changes first; ?model=products.product&object_id=12 narrows it to one record."""
+    model = AuditEntry
+    template_name = 'audit/audit_log.html'
+    context_object_name = 'entries'
+    paginate_by = 50
+
+    def get_queryset(self):
+        queryset = AuditEntry.objects.all()
+        for param in ('model', 'object_id', 'action'):
+            if self.request.GET.get(param):
+                queryset = queryset.filter(**{param: self.request.GET[param]})
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        filters = self.request.GET.copy()
+        filters.pop('page', None)
+        context['filters'] = filters.urlencode()
+        context['action_choices'] = AuditEntry.ACTION_CHOICES
+        return context
@@ -0,0 +1,128 @@
+"""
+Background writer for audit entries.
+
+Requests only put a dict on an in-memory queue. A daemon thread drains it
+and writes with one ``bulk_create`` per batch: a batch is closed when it
+reaches AUDIT_BATCH_SIZE entries or AUDIT_FLUSH_SECONDS after its first
+entry, whichever comes first. The queue is flushed at interpreter exit.
+A full queue blocks the request briefly instead of dropping entries.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+WRITE_ATTEMPTS = 3
+
+
+class _Marker:
+    """Queued by flush()/close(); set once everything queued before it is written."""
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    def __init__(self, batch_size, flush_seconds, max_queue=50000):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, entry):
+        self._ensure_started()
+        self.queue.put(entry)
+
+    def flush(self, timeout=10):
+        """Blocks until every entry queued so far is written."""
+        if self._running():
+            marker = _Marker()
+            self.queue.put(marker)
+            marker.done.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._running():
+            marker = _Marker(stop=True)
+            self.queue.put(marker)
+            marker.done.wait(timeout)
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            # Also restarts the thread in a forked worker process, where it doesn't exist
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        batch, markers = [], []
+        item = self.queue.get()
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            if isinstance(item, _Marker):
+                markers.append(item)
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, markers
+
+    def _run(self):
+        while True:
+            batch, markers = self._next_batch()
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.done.set()
+                if marker.stop:
+                    connection.close()
+                    return
+
+    def _write(self, batch):
+        from .models import AuditEntry
+
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                AuditEntry.objects.bulk_create([AuditEntry(**entry) for entry in batch])
+                return
+            except Exception:
+                # E.g. the database was locked for too long; start over on a fresh connection
+                connection.close()
+                if attempt == WRITE_ATTEMPTS:
+                    logger.exception("Dropping %d audit entries after %d attempts: %r", len(batch), attempt, batch)
+                else:
+                    time.sleep(attempt)
+
+
+_writer = None
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = AuditWriter(settings.AUDIT_BATCH_SIZE, settings.AUDIT_FLUSH_SECONDS)
+    return _writer
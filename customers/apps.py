@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers'
+
+    def ready(self):
+        from audit.recorder import audit_changes
+        from my_project.caching import track_model_versions
+        from .models import Customer
+
+        track_model_versions(Customer)
+        audit_changes(Customer)
@@ -0,0 +1,20 @@
+from django import forms
+
+from .models import Customer
+from .phones import normalize_phone
+
+
+class CustomerForm(forms.ModelForm):
+    class Meta:
+        model = Customer
+        fields = ['name', 'phone', 'email', 'address']
+
+    def clean_phone(self):
+        # The same number written differently is still the same customer
+        phone = self.cleaned_data.get('phone')
+        key = normalize_phone(phone)
+        if key:
+            existing = Customer.objects.filter(phone_key=key).exclude(pk=self.instance.pk).first()
+            if existing is not None:
+                raise forms.ValidationError(f"This phone number already belongs to {existing.name}.")
+        return phone
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.importing import duplicate_groups, merge_customers
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Merges duplicate customers: their sales and carts move to the customer kept, then they are deleted. "
+        "Either name them (--keep ID --merge ID [ID ...]) or use --by-phone to fold every customer "
+        "whose phone normalizes to another customer's number."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, metavar='ID', help="Customer to keep.")
+        parser.add_argument('--merge', type=int, nargs='+', metavar='ID', help="Customers folded into --keep.")
+        parser.add_argument('--by-phone', action='store_true', help="Merge every group sharing a phone number.")
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be merged.")
+
+    def handle(self, *args, **options):
+        if options['by_phone']:
+            if options['keep'] or options['merge']:
+                raise CommandError("Use either --by-phone or --keep/--merge, not both.")
+            groups = duplicate_groups()
+        else:
+            if not options['keep'] or not options['merge']:
+                raise CommandError("Give --keep and --merge, or --by-phone.")
+            try:
+                keep = Customer.objects.get(pk=options['keep'])
+            except Customer.DoesNotExist:
+                raise CommandError(f"No customer with id {options['keep']}.")
+            duplicates = list(Customer.objects.filter(pk__in=options['merge']).exclude(pk=keep.pk))
+            missing = set(options['merge']) - {customer.pk for customer in duplicates} - {keep.pk}
+            if missing:
+                raise CommandError(f"No customer with id {', '.join(map(str, sorted(missing)))}.")
+            groups = {keep: duplicates}
+
+        moved = merged = 0
+        for keep, duplicates in groups.items():
+            self.stdout.write(
+                f"{keep.pk} {keep.name} ({keep.phone or keep.email}) <- "
+                + ', '.join(f"{customer.pk} {customer.name}" for customer in duplicates)
+            )
+            if not options['dry_run']:
+                moved += merge_customers(keep, duplicates)
+            merged += len(duplicates)
+
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {merged} customer(s) would be merged.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Merged {merged} customer(s); {moved} row(s) re-pointed."))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from customers.segments import run_segmentation
+
+
+class Command(BaseCommand):
+    help = "Recomputes recency/frequency/monetary scores and the segment of every customer (run nightly)."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        segmented, updated = run_segmentation()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{segmented} customer(s) with sales segmented, {updated} updated (computed in {elapsed:.2f}s)."
+        ))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:54
+
+from django.db import migrations, models
+
+from customers.phones import normalize_phone
+
+
+def fill_phone_keys(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    db = schema_editor.connection.alias
+    customers = list(Customer.objects.using(db).only('pk', 'phone').order_by('pk'))
+    seen = set()
+    for customer in customers:
+        key = normalize_phone(customer.phone) or None
+        # Existing duplicates get no key (the oldest customer keeps it) until merge_customers folds them
+        customer.phone_key = key if key not in seen else None
+        seen.add(key)
+    Customer.objects.using(db).bulk_update(customers, ['phone_key'], batch_size=1000)
+    Customer.objects.using(db).filter(email='').update(email=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['name'], name='customer_name_idx'),
+        ),
+        migrations.RunPython(fill_phone_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_phone_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='rfm_score',
+            field=models.CharField(blank=True, db_default='', editable=False, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='segment',
+            field=models.CharField(blank=True, choices=[('champion', 'Champion'), ('loyal', 'Loyal'), ('big_spender', 'Big spender'), ('new', 'New'), ('at_risk', 'At risk'), ('lost', 'Lost'), ('regular', 'Regular')], db_default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['segment', 'name'], name='customer_segment_idx'),
+        ),
+    ]
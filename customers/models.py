@@ -1,19 +1,63 @@
 from django.db import models
 from django.urls import reverse
 
+from .phones import normalize_phone
+
+
 class Customer(models.Model):
+    # RFM segments, assigned nightly by `manage.py segment_customers` (customers/segments.py)
+    CHAMPION = 'champion'
+    LOYAL = 'loyal'
+    BIG_SPENDER = 'big_spender'
+    NEW = 'new'
+    AT_RISK = 'at_risk'
+    LOST = 'lost'
+    REGULAR = 'regular'
+    SEGMENT_CHOICES = [
+        (CHAMPION, 'Champion'),
+        (LOYAL, 'Loyal'),
+        (BIG_SPENDER, 'Big spender'),
+        (NEW, 'New'),
+        (AT_RISK, 'At risk'),
+        (LOST, 'Lost'),
+        (REGULAR, 'Regular'),
+    ]
+
     name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20, blank=True, null=True)
-    email = models.EmailField(max_length=254, unique=True)
+    # Walk-in customers are known by phone; an email is optional but still unique
+    email = models.EmailField(max_length=254, unique=True, blank=True, null=True)
     address = models.TextField(blank=True)
+    # Canonical phone derived from `phone` on save (e.g. '923001234567'); NULL without a usable phone
+    phone_key = models.CharField(max_length=20, unique=True, blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Blank until the customer has a sale and the segmentation has run. A database
+    # default, as the bulk import inserts rows with raw SQL (customers/importing.py)
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES, blank=True, db_default='', editable=False)
+    # Recency, frequency and monetary quintiles, 1 (lowest) to 5, e.g. '545'
+    rfm_score = models.CharField(max_length=3, blank=True, db_default='', editable=False)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # The paginated customer list is ordered by name
+            models.Index(fields=['name'], name='customer_name_idx'),
+            # ... and can be filtered by segment
+            models.Index(fields=['segment', 'name'], name='customer_segment_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def get_absolute_url(self):
         # We will redirect to the list view after modification
-        return reverse('customers:customer_list')
\ No newline at end of file
+        return reverse('customers:customer_list')
+
+    def save(self, *args, **kwargs):
+        # Several customers without a phone or email must not collide on ''
+        self.phone_key = normalize_phone(self.phone) or None
+        self.email = self.email or None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_key'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,32 @@
+import re
+
+from django.conf import settings
+
+NON_DIGITS_RE = re.compile(r'\D')
+
+# Shortest number worth matching on; anything shorter is an extension or a typo
+MIN_PHONE_DIGITS = 7
+
+
+def normalize_phone(value):
+    """
+    Canonical form of a phone number for matching customers, in international
+    digits without '+', e.g. '0300-1234567', '+92 300 1234567' and
+    '0092 3001234567' all become '923001234567' (with PHONE_COUNTRY_CODE '92').
+    Returns '' when there are too few digits to be a phone number.
+    """
+    if not value:
+        return ''
+    digits = NON_DIGITS_RE.sub('', value)
+    if digits.startswith('00'):
+        # International prefix
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        # National trunk prefix
+        digits = settings.PHONE_COUNTRY_CODE + digits[1:]
+    elif not value.lstrip().startswith('+') and len(digits) <= settings.PHONE_NATIONAL_DIGITS:
+        # Written without the trunk prefix, e.g. '300 1234567'
+        digits = settings.PHONE_COUNTRY_CODE + digits
+    if len(digits) < MIN_PHONE_DIGITS:
+        return ''
+    return digits[:20]
@@ -0,0 +1,146 @@
+"""
+RFM customer segmentation in one vectorized pass.
+
+Every sale is streamed as (customer, day, total) in chunks into NumPy
+arrays, including the sales moved to the archive. The arrays are reduced
+per customer with ``np.bincount`` and ``np.maximum.at`` into recency
+(last purchase), frequency (number of sales) and monetary value (total
+spent). Each measure is scored 1-5 by quintile among the customers who
+have bought anything. Tied values share the score of their middle rank,
+so the many one-off buyers score low on frequency but a day on which
+everyone bought scores 3, not 1. The scores map to a segment.
+
+The rows are read with the ORM's SQL but without its per-row converters
+(SQLite hands back the day as text and the total as a float, which NumPy
+converts a chunk at a time). Only customers whose segment or score
+changed are written: there are at most a few hundred distinct (segment,
+score) pairs, so that is one UPDATE per pair and chunk of ids, where
+bulk_update would build a CASE expression per row.
+"""
+
+from collections import defaultdict
+from itertools import islice
+
+import numpy as np
+from django.db import connections, transaction
+from django.db.models.functions import TruncDate
+
+from my_project.caching import bump_model_version
+from sales.archive import archive_available
+from sales.models import Sale
+from .models import Customer
+
+CHUNK_SIZE = 20000
+UPDATE_BATCH_SIZE = 1000  # Ids per UPDATE, well below SQLite's parameter limit
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def load_sales():
+    """
+    Every sale, live and archived, as three aligned arrays: customer ids
+    (int64), days (datetime64[D]) and totals (float64).
+    """
+    managers = [Sale.objects]
+    if archive_available():
+        managers.append(Sale.archived)
+    customer_ids, days, totals = [], [], []
+    for manager in managers:
+        rows = (
+            manager.annotate(day=TruncDate('sale_date'))
+            .values_list('customer_id', 'day', 'total_amount')
+            .order_by()
+        )
+        sql, params = rows.query.sql_with_params()
+        with connections[rows.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            while chunk := cursor.fetchmany(CHUNK_SIZE):
+                chunk_customers, chunk_days, chunk_totals = zip(*chunk)
+                customer_ids.append(np.array(chunk_customers, dtype=np.int64))
+                days.append(np.array(chunk_days, dtype='datetime64[D]'))
+                totals.append(np.array(chunk_totals, dtype=np.float64))
+    if not customer_ids:
+        return np.empty(0, np.int64), np.empty(0, 'datetime64[D]'), np.empty(0, np.float64)
+    return np.concatenate(customer_ids), np.concatenate(days), np.concatenate(totals)
+
+
+def quintile_scores(values):
+    """Scores 1-5 by percentile (mid) rank among `values`; equal values score the same."""
+    if not len(values):
+        return np.empty(0, np.int64)
+    ordered = np.sort(values)
+    ranks = np.searchsorted(ordered, values, side='left') + np.searchsorted(ordered, values, side='right')
+    return 1 + (5 * ranks) // (2 * len(values))
+
+
+def compute_rfm(pks, customer_ids, days, totals):
+    """
+    Pure NumPy core. `pks` must be sorted. Returns (bought, recency,
+    frequency, monetary), aligned with `pks`: `bought` is a bool mask
+    and the scores are 1-5 (0 for customers without a sale).
+    """
+    n = len(pks)
+    # Sales of customers deleted (or merged away) since are ignored
+    known = np.isin(customer_ids, pks)
+    rows = np.searchsorted(pks, customer_ids[known])
+
+    frequency = np.bincount(rows, minlength=n)
+    monetary = np.bincount(rows, weights=totals[known], minlength=n)
+    last_day = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(last_day, rows, days[known].astype(np.int64))
+
+    bought = frequency > 0
+    scores = []
+    # Recency is scored on the last purchase day, so the most recent buyers score 5
+    for measure in (last_day, frequency, monetary):
+        score = np.zeros(n, np.int64)
+        score[bought] = quintile_scores(measure[bought])
+        scores.append(score)
+    return (bought, *scores)
+
+
+def segment_labels(bought, recency, frequency, monetary):
+    """The segment for each customer, '' for customers without a sale. First matching rule wins."""
+    rules = [
+        (recency >= 4) & (frequency >= 4) & (monetary >= 4), Customer.CHAMPION,
+        (recency <= 2) & ((frequency >= 4) | (monetary >= 4)), Customer.AT_RISK,
+        frequency >= 4, Customer.LOYAL,
+        monetary >= 4, Customer.BIG_SPENDER,
+        recency >= 4, Customer.NEW,
+        recency == 1, Customer.LOST,
+    ]
+    conditions, labels = rules[::2], rules[1::2]
+    segments = np.select(conditions, labels, default=Customer.REGULAR).astype(object)
+    segments[~bought] = ''
+    return segments
+
+
+def run_segmentation():
+    """Re-segments every customer. Returns (customers segmented, rows updated)."""
+    current = list(Customer.objects.order_by('pk').values_list('pk', 'segment', 'rfm_score'))
+    if not current:
+        return 0, 0
+    pks = np.array([row[0] for row in current], dtype=np.int64)
+    customer_ids, days, totals = load_sales()
+
+    bought, recency, frequency, monetary = compute_rfm(pks, customer_ids, days, totals)
+    segments = segment_labels(bought, recency, frequency, monetary)
+    scores = np.where(bought, (recency * 100 + frequency * 10 + monetary).astype(str), '')
+
+    changed = defaultdict(list)
+    for (pk, old_segment, old_score), segment, score in zip(current, segments.tolist(), scores.tolist()):
+        if (segment, score) != (old_segment, old_score):
+            changed[segment, score].append(pk)
+    updated = 0
+    if changed:
+        with transaction.atomic():
+            for (segment, score), ids in changed.items():
+                for chunk in _chunks(ids, UPDATE_BATCH_SIZE):
+                    updated += Customer.objects.filter(pk__in=chunk).update(segment=segment, rfm_score=score)
+            # .update() sends no signals
+            transaction.on_commit(lambda: bump_model_version(Customer))
+    return int(bought.sum()), updated
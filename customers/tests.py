@@ -1,3 +1,60 @@
-from django.test import TestCase
+import numpy as np
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .models import Customer
+from .segments import compute_rfm, quintile_scores, segment_labels
+
+
+class QuintileScoreTests(SimpleTestCase):
+    def test_distinct_values_spread_over_one_to_five(self):
+        self.assertEqual(quintile_scores(np.array([1, 2, 3, 4, 5])).tolist(), [1, 2, 3, 4, 5])
+
+    def test_scores_follow_input_order(self):
+        self.assertEqual(quintile_scores(np.array([5.0, 1.0, 3.0])).tolist(), [5, 1, 3])
+
+    def test_equal_values_share_the_middle_score(self):
+        self.assertEqual(quintile_scores(np.array([7, 7, 7, 7])).tolist(), [3, 3, 3, 3])
+
+    def test_ties_score_by_their_middle_rank(self):
+        # Eight one-off buyers sit at the 40th percentile, not the bottom
+        scores = quintile_scores(np.array([1] * 8 + [5, 9]))
+        self.assertEqual(scores.tolist(), [3] * 8 + [5, 5])
+
+    def test_empty(self):
+        self.assertEqual(len(quintile_scores(np.array([]))), 0)
+
+
+class SegmentLabelTests(SimpleTestCase):
+    def test_first_matching_rule_wins(self):
+        cases = [
+            ((5, 5, 5), Customer.CHAMPION),
+            ((1, 5, 1), Customer.AT_RISK),  # Also matches LOST
+            ((3, 4, 1), Customer.LOYAL),
+            ((3, 1, 4), Customer.BIG_SPENDER),
+            ((4, 1, 1), Customer.NEW),
+            ((1, 1, 1), Customer.LOST),
+            ((3, 3, 3), Customer.REGULAR),
+        ]
+        recency, frequency, monetary = (np.array(column) for column in zip(*(scores for scores, _ in cases)))
+        bought = np.ones(len(cases), bool)
+
+        labels = segment_labels(bought, recency, frequency, monetary)
+        self.assertEqual(labels.tolist(), [label for _, label in cases])
+
+    def test_customers_without_a_sale_have_no_segment(self):
+        labels = segment_labels(np.array([False]), np.array([0]), np.array([0]), np.array([0]))
+        self.assertEqual(labels.tolist(), [''])
+
+
+class ComputeRfmTests(SimpleTestCase):
+    def test_scores_per_customer(self):
+        pks = np.array([1, 2, 3])
+        customer_ids = np.array([1, 1, 2, 9])  # 9 was deleted since
+        days = np.array(['2026-01-01', '2026-03-01', '2026-02-01', '2026-04-01'], dtype='datetime64[D]')
+        totals = np.array([100.0, 100.0, 500.0, 50.0])
+
+        bought, recency, frequency, monetary = compute_rfm(pks, customer_ids, days, totals)
+        self.assertEqual(bought.tolist(), [True, True, False])
+        self.assertEqual(recency.tolist(), [4, 2, 0])
+        self.assertEqual(frequency.tolist(), [4, 2, 0])
+        self.assertEqual(monetary.tolist(), [2, 4, 0])
@@ -2,19 +2,39 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
+from my_project.caching import VersionedCacheMixin
+from .forms import CustomerForm
 from .models import Customer
 
 # List View
-class CustomerListView(LoginRequiredMixin, ListView):
+class CustomerListView(LoginRequiredMixin, VersionedCacheMixin, ListView):
     model = Customer
+    cache_models = (Customer,)
     template_name = 'customers/customer_list.html'
     context_object_name = 'customers'
+    paginate_by = 50
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?segment= filters on the stored RFM segment (customer_segment_idx)
+        self.segment = self.request.GET.get('segment', '')
+        if self.segment in dict(Customer.SEGMENT_CHOICES):
+            queryset = queryset.filter(segment=self.segment)
+        else:
+            self.segment = ''
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['segment'] = self.segment
+        context['segment_choices'] = Customer.SEGMENT_CHOICES
+        return context
 
 # Create View
 class CustomerCreateView(LoginRequiredMixin, CreateView):
     model = Customer
     template_name = 'customers/customer_form.html'
-    fields = ['name', 'phone', 'email', 'address']
+    form_class = CustomerForm
     success_url = reverse_lazy('customers:customer_list')
 
     def form_valid(self, form):
@@ -25,7 +45,7 @@ class CustomerCreateView(LoginRequiredMixin, CreateView):
 class CustomerUpdateView(LoginRequiredMixin, UpdateView):
     model = Customer
     template_name = 'customers/customer_form.html'
-    fields = ['name', 'phone', 'email', 'address']
+    form_class = CustomerForm
     success_url = reverse_lazy('customers:customer_list')
 
     def form_valid(self, form):
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+
+from dashboard.views import DASHBOARD_METRICS
+from my_project.asyncdb import db_query
+
+SERVERS = {
+    # What the Dockerfile used to run
+    'WSGI (runserver)': [sys.executable, 'manage.py', 'runserver', '--noreload', '127.0.0.1:{port}'],
+    'ASGI (uvicorn)': [sys.executable, '-m', 'uvicorn', 'my_project.asgi:application',
+                       '--host', '127.0.0.1', '--port', '{port}', '--no-access-log'],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    return (f"p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms, "
+            f"{len(latencies) / elapsed:.0f} req/s")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares dashboard latency: its queries run one after another vs concurrently, "
+        "and the page served over WSGI (runserver) vs ASGI (uvicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per server.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Simultaneous clients.")
+        parser.add_argument('--rounds', type=int, default=50, help="Rounds of the in-process query comparison.")
+
+    def handle(self, *args, **options):
+        self.compare_queries(options['rounds'])
+
+        user, _ = get_user_model().objects.get_or_create(username='bench-dashboard')
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        try:
+            cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+            for label, command in SERVERS.items():
+                self.stdout.write(f"{label:>17}: {self.bench_server(command, cookie, options)}")
+        finally:
+            session.delete()
+            user.delete()
+
+    def compare_queries(self, rounds):
+        sequential = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for metric in DASHBOARD_METRICS:
+                metric()
+            sequential.append(time.perf_counter() - started)
+
+        async def concurrent_round():
+            started = time.perf_counter()
+            await asyncio.gather(*(db_query(metric) for metric in DASHBOARD_METRICS))
+            return time.perf_counter() - started
+
+        async def run():
+            return [await concurrent_round() for _ in range(rounds)]
+
+        concurrent = asyncio.run(run())
+        self.stdout.write(
+            f"Dashboard queries: sequential p50 {statistics.median(sequential) * 1000:.1f}ms, "
+            f"concurrent p50 {statistics.median(concurrent) * 1000:.1f}ms"
+        )
+
+    def bench_server(self, command, cookie, options):
+        port = _free_port()
+        server = subprocess.Popen(
+            [part.format(port=port) for part in command],
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}/"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        return "server did not start"
+                    time.sleep(0.2)
+
+            def fetch(_):
+                request = urllib.request.Request(url, headers={'Cookie': cookie})
+                started = time.perf_counter()
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    if response.status != 200:
+                        raise RuntimeError(f"HTTP {response.status}")
+                return time.perf_counter() - started
+
+            fetch(None)  # Warm-up
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                latencies = list(pool.map(fetch, range(options['requests'])))
+            return _summary(latencies, time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
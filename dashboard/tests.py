@@ -1,3 +1,57 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.models import Session
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import SimpleTestCase, override_settings
+
+from customers.models import Customer
+from my_project.caching import bump_model_version, get_model_version
+from my_project.routers import REPORTING_DB, ReportingRouter, reporting_reads
+from products.models import Product
+from sales.models import Sale
+
+
+class ReportingRouterTests(SimpleTestCase):
+    def read_db(self, model):
+        token = reporting_reads.set(True)
+        try:
+            return ReportingRouter().db_for_read(model)
+        finally:
+            reporting_reads.reset(token)
+
+    def test_report_models_read_from_the_snapshot(self):
+        for model in (Sale, Product, Customer):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.read_db(model), REPORTING_DB)
+
+    def test_users_and_sessions_read_live(self):
+        for model in (User, Permission, Session):
+            with self.subTest(model=model.__name__):
+                self.assertIsNone(self.read_db(model))
+
+    def test_nothing_reads_from_the_snapshot_outside_a_report(self):
+        self.assertIsNone(ReportingRouter().db_for_read(Sale))
+
+
+class ModelVersionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        versions = {**settings.CACHES['versions'], 'LOCATION': directory.name}
+        override = override_settings(CACHES={**settings.CACHES, 'versions': versions})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.location = directory.name
+
+    def test_bump_in_another_process_is_seen_here(self):
+        before = get_model_version(Sale)
+        # What another worker process has: its own cache instance over the same directory
+        other_worker = FileBasedCache(self.location, {})
+        with mock.patch('my_project.caching._version_cache', return_value=other_worker):
+            bump_model_version(Sale)
+            self.assertNotEqual(get_model_version(Sale), before)
+        self.assertEqual(get_model_version(Sale), other_worker.get('model-version:sales.sale'))
+        self.assertNotEqual(get_model_version(Sale), before)
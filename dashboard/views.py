@@ -1,30 +1,45 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, F
-from datetime import date
+from django.utils import timezone
 # Import models from other apps
 from customers.models import Customer
-from products.models import Product
+from products.models import Product, ReorderSuggestion
 from sales.models import Sale, InstallmentPlan
+from sales.archive import archive_available
+from sales.closing import day_bounds
+from maintenance.reporting import reads_from_reporting
+from my_project.asyncdb import db_query
 
-@login_required
-def dashboard_view(request):
-    # --- 1. Core Financial and Entity Metrics ---
-    
+# Each metric is independent of the others, so the view runs them concurrently.
+# They return plain values (no lazy querysets) for rendering outside the DB threads.
+
+def revenue_metrics():
     # Total Revenue (All Time)
-    total_revenue_query = Sale.objects.aggregate(total=Sum('total_amount'))
-    total_revenue = total_revenue_query['total'] or 0.00
-    
-    # Today's Sales Count
-    today = date.today()
-    today_sales_count = Sale.objects.filter(sale_date__date=today).count()
-    
-    # Entity Counts
-    total_products = Product.objects.count()
-    total_customers = Customer.objects.count()
-    
-    # --- 2. Advanced Financial Metrics (Outstanding Balance) ---
-    
+    total_revenue = Sale.objects.aggregate(total=Sum('total_amount'))['total'] or 0
+    # Plus settled sales moved to the archive database
+    if archive_available():
+        total_revenue += Sale.archived.aggregate(total=Sum('total_amount'))['total'] or 0
+    return {'total_revenue': total_revenue}
+
+
+def today_metrics():
+    # Today's Sales Count; a range on the indexed sale_date instead of a per-row date cast
+    start, end = day_bounds(timezone.localdate())
+    return {'today_sales_count': Sale.objects.filter(sale_date__gte=start, sale_date__lt=end).count()}
+
+
+def entity_metrics():
+    return {
+        'total_products': Product.objects.count(),
+        'total_customers': Customer.objects.count(),
+    }
+
+
+def outstanding_metrics():
     # Calculate the remaining balance for all installment plans
     outstanding_plans = InstallmentPlan.objects.annotate(
         # Calculate total paid by summing amounts from all related payments
@@ -35,24 +50,31 @@ def dashboard_view(request):
     ).filter(
         remaining_balance__gt=0 # Filter only plans that still owe money
     )
-    
-    outstanding_installments_count = outstanding_plans.count()
-    # Sum the remaining_balance from the filtered set to get the total amount owed
-    outstanding_balance_sum = outstanding_plans.aggregate(total_outstanding=Sum('remaining_balance'))['total_outstanding'] or 0.00
-    
-    # --- 3. Inventory Warnings ---
-    
-    # Low Stock Warning (products with stock between 1 and 9)
-    low_stock_count = Product.objects.filter(stock_quantity__lt=10, stock_quantity__gt=0).count()
-    
-    context = {
-        'total_revenue': total_revenue,
-        'today_sales_count': today_sales_count,
-        'total_products': total_products,
-        'total_customers': total_customers,
-        'outstanding_installments_count': outstanding_installments_count,
-        'outstanding_balance_sum': outstanding_balance_sum,
-        'low_stock_count': low_stock_count,
+    return {
+        'outstanding_installments_count': outstanding_plans.count(),
+        # Sum the remaining_balance from the filtered set to get the total amount owed
+        'outstanding_balance_sum': outstanding_plans.aggregate(total_outstanding=Sum('remaining_balance'))['total_outstanding'] or 0.00,
     }
-    
-    return render(request, 'dashboard/dashboard.html', context)
\ No newline at end of file
+
+
+def inventory_metrics():
+    return {
+        # Low Stock Warning (products with stock between 1 and 9)
+        'low_stock_count': Product.objects.filter(stock_quantity__lt=10, stock_quantity__gt=0).count(),
+        # Reorder suggestions from `manage.py forecast_stock` (soonest stock-out first)
+        'reorder_suggestions': list(ReorderSuggestion.objects.select_related('product')[:5]),
+        'reorder_count': ReorderSuggestion.objects.count(),
+    }
+
+
+DASHBOARD_METRICS = (revenue_metrics, today_metrics, entity_metrics, outstanding_metrics, inventory_metrics)
+
+
+@login_required
+@reads_from_reporting
+async def dashboard_view(request):
+    context = {}
+    for metrics in await asyncio.gather(*(db_query(metric) for metric in DASHBOARD_METRICS)):
+        context.update(metrics)
+    # Rendering touches request.user and the session, which are synchronous
+    return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
@@ -0,0 +1,24 @@
+#!/bin/bash
+# Runs the two processes of the app:
+#   - uvicorn serving my_project.asgi with 2 worker processes. They share the
+#     database, the cache version counters (my_project/caching.py) and the live
+#     feed (products/live.py), so any worker can serve any request.
+#   - manage.py run_worker, which runs the queued jobs (reorder refresh,
+#     scheduled repricing, ...; see jobs/queue.py).
+# A stop signal is passed on to both, so running jobs finish first. If either
+# process exits, the other is stopped too, and the container's restart policy
+# brings both back.
+set -u
+
+uv run python manage.py run_worker &
+worker=$!
+uv run uvicorn my_project.asgi:application --host 0.0.0.0 --port 8000 --workers 2 &
+web=$!
+
+trap 'kill -TERM "$worker" "$web" 2>/dev/null' TERM INT
+
+wait -n "$worker" "$web"
+status=$?
+kill -TERM "$worker" "$web" 2>/dev/null
+wait
+exit "$status"
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import enqueue, queue_stats
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures job queue throughput and latency: enqueues no-op jobs and drains them "
+        "with a burst worker. Deletes its jobs afterwards; run it against a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=1000, help="Jobs to enqueue.")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--job-seconds', type=float, default=0.0, help="Simulated work per job.")
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+
+        started = time.perf_counter()
+        for _ in range(options['jobs']):
+            enqueue('jobs.noop', {'sleep': options['job_seconds']})
+        enqueue_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        worker = Worker(concurrency=options['concurrency'], pool=options['pool'], poll_interval=0.05)
+        worker.run(burst=True, handle_signals=False)
+        drain_seconds = time.perf_counter() - started
+
+        stats = queue_stats(since=started_at)
+        Job.objects.filter(name='jobs.noop', created_at__gte=started_at).delete()
+
+        self.stdout.write(
+            f"Enqueue: {options['jobs']} jobs in {enqueue_seconds:.2f}s "
+            f"({enqueue_seconds / options['jobs'] * 1000:.2f}ms per job)"
+        )
+        self.stdout.write(
+            f"Drain:   {worker.processed} jobs in {drain_seconds:.2f}s "
+            f"({worker.processed / drain_seconds:.0f} jobs/s, {options['concurrency']} on the {options['pool']} pool), "
+            f"{worker.failed} failed"
+        )
+        for label in ('wait', 'run', 'total'):
+            p50, p95 = stats[label]
+            if p50 is not None:
+                self.stdout.write(f"  {label:>5}: p50 {p50 * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms")
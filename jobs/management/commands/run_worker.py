@@ -0,0 +1,45 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.queue import queue_stats
+from jobs.worker import Worker
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs from the Job table until stopped (SIGTERM/Ctrl+C finishes running jobs first)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Jobs run at the same time.")
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help="Run jobs on threads (I/O-bound work) or processes (CPU-bound work).")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and latency of the last hour, then exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats(queue_stats(since=timezone.now() - datetime.timedelta(hours=1)))
+
+        worker = Worker(
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"Worker {worker.worker_id} started ({options['concurrency']} on the {options['pool']} pool).")
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped: {worker.processed} job(s) run, {worker.failed} failed."))
+
+    def print_stats(self, stats):
+        self.stdout.write(', '.join(f"{status.lower()}: {count}" for status, count in stats['counts'].items()))
+        throughput = f"{stats['throughput']:.1f} jobs/s" if stats['throughput'] else '-'
+        self.stdout.write(f"Finished in the last hour: {stats['finished']} ({throughput})")
+        for label in ('wait', 'run', 'total'):
+            p50, p95 = stats[label]
+            self.stdout.write(f"  {label:>5}: p50 {_ms(p50)}, p95 {_ms(p95)}")
@@ -0,0 +1,192 @@
+"""
+A small job queue backed by the Job table, so no broker is needed.
+
+Handlers are plain functions registered by name in an app's tasks.py:
+
+    @register('products.refresh_reorder_suggestions')
+    def refresh_reorder_suggestions():
+        ...
+
+Views call ``enqueue_on_commit`` so a job only exists once the request's
+transaction has committed; a rolled-back checkout leaves nothing behind.
+``manage.py run_worker`` claims due jobs, highest priority first, and
+runs them (see jobs/worker.py). A failed job is retried with exponential
+backoff until max_attempts, then kept as FAILED with its traceback.
+Claiming is a conditional UPDATE, so several workers can share the table.
+
+A claimed job holds a lease of LEASE_SECONDS, which its worker renews
+every HEARTBEAT_SECONDS for as long as the job runs, however long that
+is. Only jobs whose lease has expired, because their worker died or
+hung, are handed to another worker.
+"""
+
+import datetime
+import statistics
+import traceback
+import uuid
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Job
+
+RETRY_BASE_SECONDS = 10
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = 15  # Several renewals per lease, so one slow UPDATE doesn't lose it
+
+_handlers = {}
+
+
+def register(name):
+    """Decorator registering `func` as the handler for jobs called `name`."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise LookupError(f"No job handler registered as '{name}'.")
+
+
+def enqueue(name, payload=None, priority=0, delay=0, max_attempts=3, key=''):
+    """
+    Adds a job and returns it. `payload` is passed to the handler as keyword arguments.
+    With a `key`, nothing is added (None is returned) while a job with that key is still pending.
+    """
+    get_handler(name)  # Fail at the call site, not in the worker
+    if key and Job.objects.filter(key=key, status=Job.PENDING).exists():
+        return None
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+        max_attempts=max_attempts,
+        key=key,
+    )
+
+
+def enqueue_on_commit(name, payload=None, **options):
+    """Enqueues the job once the current transaction commits (immediately outside one)."""
+    get_handler(name)
+    transaction.on_commit(lambda: enqueue(name, payload, **options))
+
+
+def _lease_end(now):
+    return now + datetime.timedelta(seconds=LEASE_SECONDS)
+
+
+def claim_jobs(worker_id, limit):
+    """Marks up to `limit` due jobs as running for this worker and returns their ids."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+    # Another worker may have claimed some of them since; the status check settles it
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    Job.objects.filter(pk__in=candidates, status=Job.PENDING).update(
+        status=Job.RUNNING, locked_by=token, started_at=now, locked_until=_lease_end(now),
+        attempts=F('attempts') + 1,
+    )
+    return list(
+        Job.objects.filter(locked_by=token, status=Job.RUNNING)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('pk', flat=True)
+    )
+
+
+def run_job(pk):
+    """Runs one claimed job and records the outcome. Returns True on success."""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=pk)
+        claimed = Job.objects.filter(pk=pk, status=Job.RUNNING, locked_by=job.locked_by)
+        try:
+            get_handler(job.name)(**job.payload)
+        except Exception:
+            error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                retry_in = RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+                claimed.update(
+                    status=Job.PENDING, locked_by='', locked_until=None, last_error=error,
+                    run_at=timezone.now() + datetime.timedelta(seconds=retry_in),
+                )
+            else:
+                claimed.update(status=Job.FAILED, finished_at=timezone.now(), locked_until=None, last_error=error)
+            return False
+        claimed.update(status=Job.DONE, finished_at=timezone.now(), locked_until=None)
+        return True
+    finally:
+        close_old_connections()
+
+
+def renew_leases(worker_id, pks):
+    """Extends the leases `worker_id` holds on the running jobs in `pks`. Called every HEARTBEAT_SECONDS."""
+    if not pks:
+        return 0
+    # A job requeued after a missed renewal may belong to another worker by now
+    return Job.objects.filter(pk__in=pks, status=Job.RUNNING, locked_by__startswith=f"{worker_id}:").update(
+        locked_until=_lease_end(timezone.now()),
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Jobs whose lease expired (their worker died or hung) go back to the queue,
+    or to FAILED once they have used up their attempts. Returns the number requeued.
+    """
+    now = timezone.now()
+    # No lease: claimed before leases existed
+    stale = Job.objects.filter(Q(locked_until__lt=now) | Q(locked_until__isnull=True), status=Job.RUNNING)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_until=None, last_error="Worker stopped while running the job.",
+    )
+    return stale.update(status=Job.PENDING, locked_by='', locked_until=None)
+
+
+def purge_finished_jobs(older_than):
+    """Deletes DONE jobs finished before `older_than` ago. Failed jobs are kept for inspection."""
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def _percentiles(values):
+    if len(values) < 2:
+        return (values[0], values[0]) if values else (None, None)
+    cuts = statistics.quantiles(values, n=100)
+    return cuts[49], cuts[94]
+
+
+def queue_stats(since=None):
+    """
+    Queue depth per status, plus throughput and latency of the jobs finished since `since`:
+    wait (due -> started), run (started -> finished), total (enqueued -> finished), in seconds.
+    """
+    counts = dict(Job.objects.values_list('status').annotate(n=Count('id')).order_by())
+    finished = Job.objects.filter(status=Job.DONE)
+    if since is not None:
+        finished = finished.filter(finished_at__gte=since)
+    rows = list(finished.values_list('created_at', 'run_at', 'started_at', 'finished_at'))
+
+    waits = sorted((started - max(run_at, created)).total_seconds() for created, run_at, started, _ in rows)
+    runs = sorted((done - started).total_seconds() for _, _, started, done in rows)
+    totals = sorted((done - created).total_seconds() for created, _, _, done in rows)
+    span = (max(row[3] for row in rows) - min(row[2] for row in rows)).total_seconds() if rows else 0
+
+    return {
+        'counts': {status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'finished': len(rows),
+        'throughput': len(rows) / span if span else None,
+        'wait': _percentiles(waits),
+        'run': _percentiles(runs),
+        'total': _percentiles(totals),
+    }
@@ -0,0 +1,10 @@
+import time
+
+from .queue import register
+
+
+@register('jobs.noop')
+def noop(sleep=0):
+    """Does nothing (optionally slowly); used by bench_job_queue."""
+    if sleep:
+        time.sleep(sleep)
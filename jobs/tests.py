@@ -0,0 +1,52 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_jobs, enqueue, register, renew_leases, requeue_stale_jobs
+
+
+@register('jobs.tests.noop')
+def noop():
+    pass
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        self.job = enqueue('jobs.tests.noop')
+        self.assertEqual(claim_jobs('host:1', 1), [self.job.pk])
+
+    def expire_lease(self):
+        Job.objects.filter(pk=self.job.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+
+    def test_long_running_job_with_a_live_lease_is_left_alone(self):
+        # Started long ago, but its worker keeps renewing the lease
+        Job.objects.filter(pk=self.job.pk).update(started_at=timezone.now() - datetime.timedelta(hours=2))
+        self.expire_lease()
+        self.assertEqual(renew_leases('host:1', [self.job.pk]), 1)
+
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertEqual(Job.objects.get(pk=self.job.pk).status, Job.RUNNING)
+
+    def test_expired_lease_is_requeued(self):
+        self.expire_lease()
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job = Job.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.locked_by, job.locked_until), (Job.PENDING, '', None))
+
+    def test_expired_lease_without_attempts_left_fails(self):
+        Job.objects.filter(pk=self.job.pk).update(max_attempts=1)
+        self.expire_lease()
+
+        requeue_stale_jobs()
+        self.assertEqual(Job.objects.get(pk=self.job.pk).status, Job.FAILED)
+
+    def test_worker_cannot_renew_a_lease_it_lost(self):
+        self.expire_lease()
+        requeue_stale_jobs()
+        claim_jobs('host:2', 1)
+
+        self.assertEqual(renew_leases('host:1', [self.job.pk]), 0)
+        self.assertTrue(Job.objects.get(pk=self.job.pk).locked_by.startswith('host:2:'))
@@ -0,0 +1,99 @@
+"""
+The ``run_worker`` loop: claim due jobs, run them on a pool, repeat.
+
+Jobs are claimed in the main thread, only as many as there are free pool
+slots, so a slow job never holds others hostage in a local backlog. With
+the process pool, the DB connections are closed before the pool forks and
+each process opens its own. The main thread renews the leases of the
+jobs in flight every HEARTBEAT_SECONDS and requeues jobs whose lease
+expired elsewhere.
+"""
+
+import datetime
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.db import connections
+
+from .queue import HEARTBEAT_SECONDS, claim_jobs, purge_finished_jobs, renew_leases, requeue_stale_jobs, run_job
+
+HOUSEKEEPING_INTERVAL = 3600
+
+
+class Worker:
+    def __init__(self, concurrency=4, pool='thread', poll_interval=1.0,
+                 keep_done=datetime.timedelta(days=7), log=None):
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.keep_done = keep_done
+        self.log = log or (lambda message: None)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self, *args):
+        # Running jobs are finished; nothing new is claimed
+        self.stopping = True
+
+    def _executor(self):
+        if self.pool == 'process':
+            connections.close_all()
+            return ProcessPoolExecutor(self.concurrency, mp_context=multiprocessing.get_context('fork'))
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix='job')
+
+    def _heartbeat(self, in_flight):
+        renew_leases(self.worker_id, list(in_flight.values()))
+        if requeued := requeue_stale_jobs():
+            self.log(f"Requeued {requeued} job(s) whose worker stopped renewing their lease.")
+
+    def _housekeeping(self):
+        if purged := purge_finished_jobs(self.keep_done):
+            self.log(f"Purged {purged} finished job(s).")
+
+    def run(self, burst=False, handle_signals=True):
+        """Processes jobs until stopped, or, with `burst`, until no job is due."""
+        if handle_signals:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        self._heartbeat({})
+        self._housekeeping()
+        last_heartbeat = last_housekeeping = time.monotonic()
+        in_flight = {}  # future -> job id
+        with self._executor() as executor:
+            while not self.stopping or in_flight:
+                if time.monotonic() - last_heartbeat > HEARTBEAT_SECONDS:
+                    self._heartbeat(in_flight)
+                    last_heartbeat = time.monotonic()
+
+                claimed = []
+                free = self.concurrency - len(in_flight)
+                if free and not self.stopping:
+                    claimed = claim_jobs(self.worker_id, free)
+                    in_flight.update((executor.submit(run_job, pk), pk) for pk in claimed)
+
+                if not in_flight:
+                    if burst:
+                        break
+                    if time.monotonic() - last_housekeeping > HOUSEKEEPING_INTERVAL:
+                        self._housekeeping()
+                        last_housekeeping = time.monotonic()
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # Claimed a full batch: top up as soon as a slot frees; otherwise poll for new jobs.
+                # Either way, wake up in time for the next heartbeat
+                timeout = HEARTBEAT_SECONDS if free == len(claimed) else self.poll_interval
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del in_flight[future]
+                    self.processed += 1
+                    if not future.result():
+                        self.failed += 1
+        return self.processed
@@ -0,0 +1,168 @@
+"""
+Online SQLite backups that don't stall the tills.
+
+The SQLite online backup API copies the live database a few pages at a
+time. The source is only read-locked for the duration of one step, and
+we sleep between steps so writers (checkouts) get the database back
+almost immediately. If a writer changes the database mid-copy, SQLite
+restarts the copy on its own; the result is always a consistent snapshot.
+
+Snapshots are gzip-compressed, written next to a sha256sum-compatible
+checksum file, and rotated so only the newest few are kept.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.utils import timezone
+
+SNAPSHOT_SUFFIX = '.sqlite3.gz'
+CHECKSUM_SUFFIX = '.sha256'
+COPY_BUFFER = 1024 * 1024
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(source_path, target_path, pages, pause, stats):
+    state = {'step_started': time.perf_counter(), 'remaining': None}
+
+    def progress(status, remaining, total):
+        step = time.perf_counter() - state['step_started']
+        stats['steps'] += 1
+        stats['pages'] = total
+        stats['longest_step'] = max(stats['longest_step'], step)
+        if state['remaining'] is not None and remaining > state['remaining']:
+            # A writer modified the source and SQLite started the copy over
+            raise _Restarted
+        state['remaining'] = remaining
+        if remaining:
+            # The source lock is released between steps: let writers in
+            time.sleep(pause)
+        state['step_started'] = time.perf_counter()
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+        source.close()
+
+
+def online_backup(source_path, target_path, pages=256, pause=0.02, max_restarts=4):
+    """
+    Copies `source_path` into a new SQLite file at `target_path` in steps of `pages`.
+    Each time a write restarts the copy, the step size is quadrupled so a busy till
+    can't starve the backup; after `max_restarts` the copy is done in one step.
+    Returns stats: pages, steps, restarts, longest_step (the longest time a writer
+    could have waited on us, in seconds) and elapsed.
+    """
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0, 'longest_step': 0.0}
+    started = time.perf_counter()
+    while True:
+        step_pages = -1 if stats['restarts'] >= max_restarts else pages * 4 ** stats['restarts']
+        try:
+            _copy(source_path, target_path, step_pages, pause, stats)
+            break
+        except _Restarted:
+            stats['restarts'] += 1
+    stats['elapsed'] = time.perf_counter() - started
+    return stats
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(COPY_BUFFER):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_snapshot(source_path, backup_dir, name, pages=256, pause=0.02):
+    """
+    Takes an online backup of `source_path` and stores it as
+    ``<name>-<timestamp>.sqlite3.gz`` plus a ``.sha256`` file in `backup_dir`.
+    Returns the backup stats with `path`, `size` (database bytes) and `compressed_size` added.
+    """
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    snapshot = backup_dir / f"{name}-{stamp}{SNAPSHOT_SUFFIX}"
+
+    with tempfile.TemporaryDirectory(dir=backup_dir) as workdir:
+        raw = Path(workdir) / 'snapshot.sqlite3'
+        stats = online_backup(source_path, raw, pages=pages, pause=pause)
+
+        partial = Path(workdir) / snapshot.name
+        with open(raw, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        stats['size'] = raw.stat().st_size
+        stats['compressed_size'] = partial.stat().st_size
+        checksum = _sha256(partial)
+        # Publish atomically: a half-written snapshot never carries the final name
+        os.replace(partial, snapshot)
+
+    snapshot.with_name(snapshot.name + CHECKSUM_SUFFIX).write_text(f"{checksum}  {snapshot.name}\n")
+    stats['path'] = snapshot
+    return stats
+
+
+def list_snapshots(backup_dir, name):
+    """Snapshots of `name`, newest first."""
+    return sorted(Path(backup_dir).glob(f"{name}-*{SNAPSHOT_SUFFIX}"), reverse=True)
+
+
+def rotate_snapshots(backup_dir, name, keep):
+    """Deletes all but the newest `keep` snapshots of `name`. Returns the removed paths."""
+    removed = list_snapshots(backup_dir, name)[keep:]
+    for snapshot in removed:
+        snapshot.unlink()
+        snapshot.with_name(snapshot.name + CHECKSUM_SUFFIX).unlink(missing_ok=True)
+    return removed
+
+
+def verify_snapshot(snapshot):
+    """
+    Restore-verifies a snapshot: checks its checksum, restores it to a scratch
+    file and runs PRAGMA integrity_check. Returns a dict with `ok`, `problems`
+    and per-table row counts.
+    """
+    snapshot = Path(snapshot)
+    problems = []
+
+    checksum_file = snapshot.with_name(snapshot.name + CHECKSUM_SUFFIX)
+    if not checksum_file.exists():
+        problems.append("checksum file missing")
+    elif checksum_file.read_text().split()[0] != _sha256(snapshot):
+        problems.append("checksum mismatch")
+
+    tables = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        restored = Path(workdir) / 'restored.sqlite3'
+        try:
+            with gzip.open(snapshot, 'rb') as src, open(restored, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER)
+            connection = sqlite3.connect(restored)
+            try:
+                result = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+                if result != ['ok']:
+                    problems.extend(result)
+                names = [row[0] for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+                )]
+                for table in names:
+                    tables[table] = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            finally:
+                connection.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            problems.append(f"restore failed: {e}")
+
+    return {'ok': not problems, 'problems': problems, 'tables': tables}
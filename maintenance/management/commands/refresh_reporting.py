@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from maintenance.reporting import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Refreshes the read-only reporting snapshot used by the dashboard. "
+        "Run it from cron, or keep it running with --every. Refresh after migrating."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, nargs='?', const=settings.REPORTING_REFRESH_SECONDS,
+                            metavar='SECONDS', help="Keep refreshing at this interval (default: REPORTING_REFRESH_SECONDS).")
+        parser.add_argument('--pages', type=int, default=256, help="Pages copied per step (smaller = shorter writer waits).")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = refresh_snapshot(pages=options['pages'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Reporting snapshot refreshed at {stats['taken_at']:%H:%M:%S} in {stats['elapsed']:.2f}s "
+                f"(longest writer stall {stats['longest_step'] * 1000:.1f} ms, {stats['restarts']} restart(s))."
+            ))
+            if not options['every']:
+                break
+            time.sleep(max(0, options['every'] - stats['elapsed']))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from maintenance.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the worker warm-up phases (URLs, templates, database, product cache) and "
+        "logs how long each took. Workers run it themselves at start when WARMUP_ON_START is set."
+    )
+
+    def handle(self, *args, **options):
+        # Per-phase timings go to the maintenance.warmup logger
+        timings = warm_up()
+        self.stdout.write(self.style.SUCCESS(
+            f"Warm-up finished in {sum(elapsed for _, elapsed, _ in timings) * 1000:.1f} ms."
+        ))
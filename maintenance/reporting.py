@@ -0,0 +1,110 @@
+"""
+The read-only reporting snapshot (see ReportingRouter in routers.py).
+
+``refresh_snapshot`` copies the live database with the online backup API
+into a temporary file, stamps it, and swaps it in with a rename. Open
+connections keep reading the old file; each new request opens the new
+one. A snapshot taken before the latest migrations is ignored until the
+next refresh, so reports never query columns it doesn't have yet.
+"""
+
+import functools
+import os
+import sqlite3
+from inspect import iscoroutinefunction
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from my_project.routers import REPORTING_DB, reporting_reads
+from .backup import online_backup
+
+SNAPSHOT_TABLE = 'reporting_snapshot'
+
+
+def refresh_snapshot(pages=256, pause=0.02):
+    """Replaces the reporting snapshot with a fresh copy of the default database. Returns the backup stats."""
+    target = Path(settings.REPORTING_SNAPSHOT)
+    partial = target.with_name(target.name + '.partial')
+    partial.unlink(missing_ok=True)
+
+    taken_at = timezone.now()
+    stats = online_backup(settings.DATABASES['default']['NAME'], partial, pages=pages, pause=pause)
+
+    snapshot = sqlite3.connect(partial)
+    try:
+        migrations = snapshot.execute(f"SELECT COUNT(*) FROM {MigrationRecorder.Migration._meta.db_table}").fetchone()[0]
+        snapshot.execute(f"CREATE TABLE {SNAPSHOT_TABLE} (taken_at TEXT NOT NULL, migrations INTEGER NOT NULL)")
+        snapshot.execute(f"INSERT INTO {SNAPSHOT_TABLE} VALUES (?, ?)", (taken_at.isoformat(), migrations))
+        snapshot.commit()
+    finally:
+        snapshot.close()
+
+    os.replace(partial, target)
+    stats['taken_at'] = taken_at
+    return stats
+
+
+def snapshot_status():
+    """
+    None if there is no usable snapshot; otherwise a dict with `taken_at`,
+    `age` and `stale` (older than twice the refresh interval).
+    """
+    if not Path(settings.REPORTING_SNAPSHOT).exists():
+        return None
+    try:
+        with connections[REPORTING_DB].cursor() as cursor:
+            cursor.execute(f"SELECT taken_at, migrations FROM {SNAPSHOT_TABLE}")
+            taken_at, migrations = cursor.fetchone()
+    except (DatabaseError, TypeError):
+        return None
+    if migrations != MigrationRecorder(connections['default']).migration_qs.count():
+        return None
+
+    taken_at = parse_datetime(taken_at)
+    age = timezone.now() - taken_at
+    return {
+        'taken_at': taken_at,
+        'age': age,
+        'stale': age.total_seconds() > 2 * settings.REPORTING_REFRESH_SECONDS,
+    }
+
+
+def reads_from_reporting(view):
+    """
+    View decorator: the view's reads of report models (including during
+    template rendering) go to the reporting snapshot when there is a usable
+    one, and to the live database otherwise. Auth and session lookups always
+    read the live database (see ReportingRouter).
+    ``request.reporting_snapshot`` holds the snapshot_status() for the page to show.
+    Works on sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            request.reporting_snapshot = await sync_to_async(snapshot_status)()
+            token = reporting_reads.set(request.reporting_snapshot is not None)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                reporting_reads.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.reporting_snapshot = snapshot_status()
+        token = reporting_reads.set(request.reporting_snapshot is not None)
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                # TemplateResponses render lazily; do it while the snapshot is selected
+                response.render()
+            return response
+        finally:
+            reporting_reads.reset(token)
+    return wrapper
@@ -0,0 +1,122 @@
+"""
+Worker warm-up.
+
+A fresh worker builds the URL resolver, compiles templates and fills the
+product row cache on its first requests, so the first customers after a
+deploy wait for all of it. ``warm_up()`` does that work up front. The
+ASGI/WSGI entry points call it once per worker process when
+WARMUP_ON_START is set; ``manage.py warm_up`` runs the same phases to show
+what startup costs. Everything primed here is process-wide: the resolver,
+the cached template loader and the local-memory cache. DB connections are
+per thread, so the database phase only loads the backend and the file
+pages, then closes its connection again.
+"""
+
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import render_to_string
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_urls():
+    count = 0
+
+    def walk(resolver):
+        nonlocal count
+        resolver.reverse_dict  # Builds the reverse lookup tables
+        for pattern in resolver.url_patterns:
+            pattern.pattern.regex  # Compiled lazily on first use
+            if isinstance(pattern, URLResolver):
+                walk(pattern)
+            else:
+                count += 1
+
+    walk(get_resolver())
+    return f"{count} patterns"
+
+
+def _warm_templates():
+    compiled = failed = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in [*engine.engine.dirs, *get_app_template_dirs('templates')]:
+            for path in sorted(Path(directory).rglob('*')):
+                if not path.is_file():
+                    continue
+                name = path.relative_to(directory).as_posix()
+                try:
+                    engine.get_template(name)
+                    compiled += 1
+                except Exception as exc:
+                    # A broken template must not keep the worker from starting
+                    failed += 1
+                    logger.warning("Warm-up could not compile %s: %s", name, str(exc).splitlines()[0])
+    return f"{compiled} templates" + (f", {failed} failed" if failed else "")
+
+
+def _warm_database():
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM %s" % connection.ops.quote_name(Product._meta.db_table))
+            (count,) = cursor.fetchone()
+    finally:
+        connection.close()
+    return f"{connection.vendor}, {count} products"
+
+
+def _warm_product_cache():
+    # Renders the product list once so its per-row fragments (name, price,
+    # stock) are cached, in the list's own order, up to WARMUP_PRODUCT_ROWS.
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = '/products/'
+    request.user = AnonymousUser()
+    products = list(Product.objects.all()[:settings.WARMUP_PRODUCT_ROWS])
+    try:
+        render_to_string('products/product_list.html', {
+            'products': products,
+            'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        }, request=request)
+    finally:
+        connections[DEFAULT_DB_ALIAS].close()
+    return f"{len(products)} rows"
+
+
+PHASES = (
+    ('urls', _warm_urls),
+    ('templates', _warm_templates),
+    ('database', _warm_database),
+    ('product cache', _warm_product_cache),
+)
+
+
+def warm_up():
+    """Runs every phase, logging how long each took. Returns [(phase, seconds, detail)]."""
+    timings = []
+    for phase, func in PHASES:
+        started = time.perf_counter()
+        try:
+            detail = func()
+        except Exception as exc:
+            detail = f"failed: {exc}"
+            logger.exception("Warm-up phase %s failed", phase)
+        elapsed = time.perf_counter() - started
+        logger.info("Warm-up %s: %.1f ms (%s)", phase, elapsed * 1000, detail)
+        timings.append((phase, elapsed, detail))
+    logger.info("Warm-up finished in %.1f ms", sum(elapsed for _, elapsed, _ in timings) * 1000)
+    return timings
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_project.settings')
 
 application = get_asgi_application()
+
+if settings.WARMUP_ON_START:
+    # Once per worker process, before it serves its first request
+    from maintenance.warmup import warm_up
+
+    warm_up()
@@ -0,0 +1,34 @@
+"""
+Running ORM queries from async views.
+
+``db_query(func)`` runs a synchronous function (one or more ORM queries)
+on a bounded thread pool, so an async view can await several independent
+queries at once without one thread per request. Each pool thread keeps
+its own DB connection open between calls (opening one costs about as much
+as a dashboard query); only the reporting snapshot is reopened every time,
+since refresh_reporting swaps in a new file. Context variables (the
+reporting router, the audit actor) carry over into the pool.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .routers import REPORTING_DB
+
+_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='async-db')
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        for connection in connections.all(initialized_only=True):
+            if connection.alias == REPORTING_DB or (connection.errors_occurred and not connection.is_usable()):
+                connection.close()
+
+
+async def db_query(func, *args, **kwargs):
+    return await sync_to_async(_run, thread_sensitive=False, executor=_executor)(func, args, kwargs)
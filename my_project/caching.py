@@ -0,0 +1,111 @@
+"""
+Model-versioned cache keys.
+
+Every tracked model gets a version number. Any save or delete of a row
+bumps that model's version (after the surrounding transaction commits), so
+every cache key built from it changes and stale fragments are simply never
+read again; the LRU cull of the local-memory backend reclaims them.
+
+Fragments are cached per process, but the versions are kept in the
+'versions' cache, which all worker processes share: a sale committed in
+one worker changes the keys the other workers build too. A bump stores a
+fresh timestamp rather than incrementing, since incr() on a shared
+backend is a read then a write and two bumps could both store the same
+value.
+
+Bulk writes (``QuerySet.update()``, ``bulk_create()``) do not send signals;
+code doing them must call ``bump_model_version()`` itself.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+VERSION_KEY_PREFIX = 'model-version'
+VERSION_CACHE = 'versions'
+
+
+def _version_key(model):
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def _fresh_version():
+    # A timestamp, so a version is never re-issued while fragments stored under it still exist
+    return time.time_ns()
+
+
+def _version_cache():
+    return caches[VERSION_CACHE]
+
+
+def get_model_versions(*models):
+    """Returns the current version of each model, in the order given."""
+    cache = _version_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def get_model_version(model):
+    return get_model_versions(model)[0]
+
+
+def bump_model_version(model):
+    """Invalidates every cache key built from `model`, in every process."""
+    _version_cache().set(_version_key(model), _fresh_version(), timeout=None)
+
+
+def cache_version_token(*models):
+    """Combined version of several models, for use as a `{% cache %}` vary_on argument."""
+    return '.'.join(str(version) for version in get_model_versions(*models))
+
+
+def versioned_cache_key(prefix, *models, extra=()):
+    """Builds a cache key that changes whenever any of `models` is written."""
+    parts = [prefix, cache_version_token(*models)]
+    parts.extend(str(part) for part in extra)
+    return ':'.join(parts)
+
+
+def _bump_on_commit(sender, **kwargs):
+    # Bumping before commit would let a concurrent reader cache the old rows
+    # under the new version, so wait until the write is visible.
+    transaction.on_commit(lambda: bump_model_version(sender), using=kwargs.get('using'))
+
+
+def track_model_versions(*models):
+    """Connects post_save/post_delete so writes to `models` bump their versions. Call from AppConfig.ready()."""
+    for model in models:
+        uid = f"versioned-cache:{model._meta.label_lower}"
+        post_save.connect(_bump_on_commit, sender=model, dispatch_uid=f"{uid}:save")
+        post_delete.connect(_bump_on_commit, sender=model, dispatch_uid=f"{uid}:delete")
+
+
+class VersionedCacheMixin:
+    """
+    Adds `cache_version` (and `cache_timeout`) to the template context of a view.
+
+    Templates wrap the expensive part in
+    ``{% cache cache_timeout "name" cache_version %}`` so it is re-rendered only
+    after one of `cache_models` changes.
+    """
+    cache_models = ()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cache_version'] = cache_version_token(*self.cache_models)
+        snapshot = getattr(self.request, 'reporting_snapshot', None)
+        if snapshot is not None:
+            # Read from the reporting snapshot: a refresh changes the rows without a write here
+            context['cache_version'] += f".{snapshot['taken_at'].timestamp():.0f}"
+        context['cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+        return context
@@ -0,0 +1,73 @@
+"""
+Database routers.
+
+The ``archive`` database holds fully settled sales moved out of the hot
+database by ``manage.py archive_sales``. Nothing is routed there
+implicitly: historical queries ask for it explicitly (``Sale.archived``
+or ``.using('archive')``), and rows loaded from it keep their related
+lookups (items, customer, products) in the archive.
+
+The ``reporting`` database is a read-only snapshot of the default one
+(``manage.py refresh_reporting``). Views opt in with
+``maintenance.reporting.reads_from_reporting``; while one runs, reads of
+the report models (REPORTING_APPS) go to the snapshot so long aggregates
+never hold up checkout. Users, sessions and permissions are still read
+live, so a login or deactivation since the last refresh counts at once.
+"""
+
+import contextvars
+
+ARCHIVE_DB = 'archive'
+REPORTING_DB = 'reporting'
+
+# True while the current request reads from the reporting snapshot
+reporting_reads = contextvars.ContextVar('reporting_reads', default=False)
+
+# Apps whose tables exist in the archive (a sale plus everything it references)
+ARCHIVE_APPS = {'sales', 'customers', 'products'}
+
+# Apps read from the reporting snapshot while reporting_reads is set
+REPORTING_APPS = {'sales', 'customers', 'products'}
+
+
+class ArchiveRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == ARCHIVE_DB:
+            return ARCHIVE_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if ARCHIVE_DB in (obj1._state.db, obj2._state.db):
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ARCHIVE_DB:
+            return app_label in ARCHIVE_APPS
+        return None
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        if reporting_reads.get() and model._meta.app_label in REPORTING_APPS:
+            return REPORTING_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        # The snapshot is opened read-only; writes always go to the live database
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Snapshot rows are copies of live rows
+        if {obj1._state.db, obj2._state.db} <= {'default', REPORTING_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPORTING_DB:
+            return False
+        return None
@@ -0,0 +1,60 @@
+"""
+Read-only report rows without model instances.
+
+A model instance carries a __dict__, a ModelState and a trip through
+Model.from_db() per row, several times the memory of the values it
+holds. Report pages and exports only read their rows, so they fetch
+``values_list`` tuples instead and map each into a small row class: a
+``@dataclass(slots=True)`` whose field names are the columns selected.
+Columns from related tables are annotated onto the queryset under the
+row's field name (e.g. ``customer_name=F('customer__name')``).
+
+``iter_rows`` streams a queryset as rows in chunks from a server-side
+cursor, for exports over any number of rows. ``RowList`` is the same
+query for ListView and Paginator: it counts with COUNT(*) and only
+builds the rows of the slice (page) it is asked for.
+"""
+
+import dataclasses
+from itertools import starmap
+
+CHUNK_SIZE = 2000
+
+
+def row_fields(row_type):
+    """The columns `row_type` is built from, in constructor order."""
+    return tuple(field.name for field in dataclasses.fields(row_type))
+
+
+def iter_rows(queryset, row_type, chunk_size=CHUNK_SIZE):
+    """`queryset` as `row_type` instances, fetched `chunk_size` rows at a time."""
+    rows = queryset.values_list(*row_fields(row_type))
+    return starmap(row_type, rows.iterator(chunk_size=chunk_size))
+
+
+class RowList:
+    """A sliceable, countable view of `queryset` as `row_type` rows, for ListView's queryset."""
+
+    def __init__(self, queryset, row_type):
+        self.queryset = queryset
+        self.row_type = row_type
+
+    @property
+    def ordered(self):
+        # Read by Paginator, which warns about unordered pages
+        return self.queryset.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter_rows(self.queryset, self.row_type)
+
+    def __getitem__(self, index):
+        rows = self.queryset.values_list(*row_fields(self.row_type))[index]
+        if isinstance(index, slice):
+            return list(starmap(self.row_type, rows))
+        return self.row_type(*rows)
@@ -46,6 +46,9 @@ INSTALLED_APPS = [
     "products.apps.ProductsConfig",
     "sales.apps.SalesConfig",
     "dashboard.apps.DashboardConfig",
+    "maintenance.apps.MaintenanceConfig",
+    "jobs.apps.JobsConfig",
+    "audit.apps.AuditConfig",
 ]
 
 MIDDLEWARE = [
@@ -57,16 +60,26 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'audit.middleware.AuditActorMiddleware',
 ]
 
 ROOT_URLCONF = 'my_project.urls'
 
+# Templates are compiled once per process and reused in production; in
+# development the plain loaders pick up edits without a restart.
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    template_loaders = [('django.template.loaders.cached.Loader', template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -92,13 +105,100 @@ STORAGES = {
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+REPORTING_SNAPSHOT = BASE_DIR / 'reporting.sqlite3'
+# How often the snapshot is refreshed; the dashboard warns when it is twice as old
+REPORTING_REFRESH_SECONDS = 300
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Settled sales older than the archive cutoff (manage.py archive_sales)
+    'archive': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'archive.sqlite3',
+    },
+    # Read-only snapshot for dashboards and reports (manage.py refresh_reporting).
+    # immutable=1: the file is only ever replaced, never written in place
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{REPORTING_SNAPSHOT}?mode=ro&immutable=1",
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['my_project.routers.ArchiveRouter', 'my_project.routers.ReportingRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local-memory cache with LRU eviction. Keys for list pages and fragments are
+# built from per-model version numbers (see my_project/caching.py), so entries
+# never need explicit deletes; old versions just age out of the LRU.
+# The version numbers themselves live in 'versions', a file cache every
+# worker process shares, so a write in one worker invalidates the others.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pos-default',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 4,  # Drop the least recently used quarter when full
+        },
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'model-versions',
+        'TIMEOUT': None,
+    },
+}
+
+# Seconds a versioned fragment may live even without a write (safety net)
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# Customer phone numbers are matched in international form (customers/phones.py)
+PHONE_COUNTRY_CODE = '92'
+PHONE_NATIONAL_DIGITS = 10  # Digits after the trunk prefix, e.g. 300 1234567
+
+# Worker warm-up (maintenance/warmup.py): resolve URLs, compile templates and
+# cache product rows before the first request. Off in development.
+WARMUP_ON_START = not DEBUG
+WARMUP_PRODUCT_ROWS = 500  # Rows of the product list cached at start
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Per-phase startup timings
+        'maintenance.warmup': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+
+# Online backups (manage.py backup_db)
+BACKUP_DIR = BASE_DIR / 'backups'
+BACKUP_KEEP = 14  # Newest snapshots kept per database
+
+# Threads async views use to run ORM queries concurrently (my_project/asyncdb.py)
+ASYNC_DB_THREADS = 8
+
+# Audit log: entries are written in the background in batches of up to this size / age
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_SECONDS = 1.0
+
+# Branches: till name -> Location code it sells from (products/stock.py). Other tills
+# sell from the default location, e.g. {'T1': 'main', 'T2': 'gulberg'}
+TILL_LOCATIONS = {}
+
+# Carts untouched for this long are deleted by manage.py sweep_carts (products/carts.py)
+CART_TTL_HOURS = 24
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -7,5 +7,6 @@ urlpatterns = [
     path("customers/", include("customers.urls")),
     path('products/', include('products.urls')),
     path('sales/', include('sales.urls')),
+    path('audit/', include('audit.urls')),
     path('', include('dashboard.urls')),
 ]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_project.settings')
 
 application = get_wsgi_application()
+
+if settings.WARMUP_ON_START:
+    # Once per worker process, before it serves its first request
+    from maintenance.warmup import warm_up
+
+    warm_up()
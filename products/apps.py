@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from audit.recorder import audit_changes
+        from my_project.caching import track_model_versions
+        from .models import Product
+
+        track_model_versions(Product)
+        audit_changes(Product, exclude=('updated_at', 'size_key'))
+
+        from . import signals  # noqa: F401 (connects receivers)
@@ -0,0 +1,56 @@
+"""
+Cart lifecycle.
+
+Each salesperson has at most one open cart, enforced by the
+one_cart_per_user constraint; a cart line is unique per product. With the
+constraints in place get_or_create is race-safe: the losing request's
+INSERT fails and it reads the winner's row instead. A cart's updated_at is
+touched whenever its items change, and ``sweep_stale_carts`` deletes carts
+idle for longer than CART_TTL_HOURS, a chunk per transaction, so the cart
+tables only hold what is in use. Checkout deletes the cart outright.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Cart
+
+SWEEP_CHUNK_SIZE = 500
+
+
+def get_user_cart(user):
+    """The user's cart, created on first use."""
+    cart, created = Cart.objects.get_or_create(user=user, defaults={'customer': None})
+    return cart
+
+
+def touch_cart(cart):
+    """Marks the cart as in use; item changes don't save the cart itself."""
+    cart.updated_at = timezone.now()
+    Cart.objects.filter(pk=cart.pk).update(updated_at=cart.updated_at)
+
+
+def stale_carts(ttl=None):
+    """Carts untouched for longer than `ttl` (default CART_TTL_HOURS)."""
+    if ttl is None:
+        ttl = datetime.timedelta(hours=settings.CART_TTL_HOURS)
+    return Cart.objects.filter(updated_at__lt=timezone.now() - ttl)
+
+
+def sweep_stale_carts(ttl=None, chunk_size=SWEEP_CHUNK_SIZE, progress=None):
+    """Deletes stale carts and their items, `chunk_size` carts per transaction. Returns the carts deleted."""
+    carts = stale_carts(ttl)
+    deleted = 0
+    while True:
+        cart_ids = list(carts.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not cart_ids:
+            break
+        # Re-checks staleness, in case a cart was touched since; carts and items
+        # send no signals, so this is one DELETE per table in one transaction
+        _, counts = carts.filter(pk__in=cart_ids).delete()
+        deleted += counts.get(Cart._meta.label, 0)
+        if progress:
+            progress(deleted)
+    return deleted
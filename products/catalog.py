@@ -0,0 +1,131 @@
+"""
+Catalog delta sync for tills and the sale form.
+
+Clients keep a local copy of the catalog and ask only for what changed
+since their cursor, an opaque (updated_at, id) watermark. Product changes
+and deletes (ProductTombstone rows) are merged in watermark order, so one
+cursor covers both. Rows changed in the last SETTLE_SECONDS are held back:
+a slower transaction may still commit an earlier timestamp, and a cursor
+must never move past it.
+"""
+
+import base64
+import datetime
+import hashlib
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Product, ProductTombstone
+
+SETTLE_SECONDS = 2
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+PRODUCT_FIELDS = ('id', 'name', 'brand', 'size', 'type', 'price', 'stock_quantity', 'updated_at')
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (timestamp, pk); raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp, pk = parse_datetime(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if timestamp is None:
+        raise ValueError("Invalid cursor.")
+    return timestamp, pk
+
+
+def _after(cursor, ts_field, id_field):
+    if cursor is None:
+        return Q()
+    timestamp, pk = cursor
+    return Q(**{f'{ts_field}__gt': timestamp}) | Q(**{ts_field: timestamp, f'{id_field}__gt': pk})
+
+
+def product_payload(product):
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'brand': product.brand,
+        'size': product.size,
+        'type': product.type,
+        'price': str(product.price),
+        'stock_quantity': product.stock_quantity,
+        'updated_at': product.updated_at.isoformat(),
+    }
+
+
+def catalog_state():
+    """
+    Cheap summary of the whole catalog for conditional GETs.
+    Returns (last_modified, version) where version changes with any write.
+    last_modified is None while the newest change is still settling.
+    """
+    products = Product.objects.aggregate(last=Max('updated_at'), count=Count('id'))
+    tombstones = ProductTombstone.objects.aggregate(last=Max('deleted_at'), count=Count('id'))
+    stamps = [stamp for stamp in (products['last'], tombstones['last']) if stamp is not None]
+    last_modified = max(stamps) if stamps else None
+
+    version = f"{products['last']}|{products['count']}|{tombstones['last']}|{tombstones['count']}"
+    horizon = timezone.now() - datetime.timedelta(seconds=SETTLE_SECONDS)
+    if last_modified is not None and last_modified > horizon:
+        # Held-back rows become visible as time passes without any new write,
+        # so neither validator may stay stable until they have settled
+        version += f"|{horizon.timestamp():.0f}"
+        last_modified = None
+    return last_modified, hashlib.md5(version.encode()).hexdigest()
+
+
+def catalog_changes(cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Products changed and deleted after `cursor` (None = full catalog), oldest first.
+    Returns a dict with `products`, `deleted` (ids), `next_cursor` and `has_more`.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    horizon = timezone.now() - datetime.timedelta(seconds=SETTLE_SECONDS)
+
+    products = list(
+        Product.objects.filter(_after(after, 'updated_at', 'id'), updated_at__lte=horizon)
+        .order_by('updated_at', 'id').only(*PRODUCT_FIELDS)[:limit + 1]
+    )
+    entries = [(product.updated_at, product.pk, 'product', product) for product in products]
+    if after is not None:
+        # A full download starts from an empty catalog, so old deletes are irrelevant
+        tombstones = (
+            ProductTombstone.objects.filter(_after(after, 'deleted_at', 'product_id'), deleted_at__lte=horizon)
+            .order_by('deleted_at', 'product_id')[:limit + 1]
+        )
+        entries.extend((tomb.deleted_at, tomb.product_id, 'deleted', tomb) for tomb in tombstones)
+    entries.sort(key=lambda entry: entry[:3])
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if entries:
+        next_cursor = encode_cursor(entries[-1][0], entries[-1][1])
+    else:
+        next_cursor = cursor or None
+
+    return {
+        'products': [product_payload(obj) for _, _, kind, obj in entries if kind == 'product'],
+        'deleted': [pk for _, pk, kind, _ in entries if kind == 'deleted'],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+    }
+
+
+def catalog_lookup(ids):
+    """Current state of specific products (e.g. the sale form's price lookup), bypassing the settle window."""
+    found = {product.pk: product for product in Product.objects.filter(pk__in=ids).only(*PRODUCT_FIELDS)}
+    return {
+        'products': [product_payload(found[pk]) for pk in ids if pk in found],
+        'deleted': [pk for pk in ids if pk not in found],
+    }
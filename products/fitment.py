@@ -0,0 +1,109 @@
+"""
+Vehicle fitment index: which tyres in the catalog fit a given vehicle.
+
+VehicleFitment holds the OEM sizes per vehicle. FitmentMatch is the
+precomputed vehicle -> product join, so a lookup is a single indexed
+query. It is maintained incrementally: a product is re-matched when its
+normalized size changes, and loading fitment data adds the matches for
+the new (vehicle, size) pairs. Stock is read from the live Product row in
+the lookup, so sales and restocks need no index maintenance.
+"""
+
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+
+from .models import FitmentMatch, Product, Vehicle, VehicleFitment
+from .sizes import normalize_tyre_size
+
+LOAD_CHUNK_SIZE = 2000
+
+
+def find_fitting_products(make, model, year):
+    """In-stock products that fit the vehicle, cheapest first (one query)."""
+    return (
+        Product.objects.filter(
+            fitment_matches__vehicle__make=make,
+            fitment_matches__vehicle__model=model,
+            fitment_matches__vehicle__year=year,
+            stock_quantity__gt=0,
+        )
+        .order_by('price', 'name')
+    )
+
+
+def refresh_product_matches(product):
+    """Re-matches one product against every vehicle that takes its size."""
+    with transaction.atomic():
+        FitmentMatch.objects.filter(product=product).delete()
+        if product.size_key:
+            vehicle_ids = VehicleFitment.objects.filter(tyre_size=product.size_key).values_list('vehicle_id', flat=True)
+            FitmentMatch.objects.bulk_create(
+                (FitmentMatch(vehicle_id=vehicle_id, product=product) for vehicle_id in vehicle_ids),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def load_fitments(rows):
+    """
+    Bulk-loads fitment data from an iterable of dicts with keys
+    make, model, year_from, year_to (optional) and tyre_size.
+    Existing vehicles and fitments are kept. Returns the number of rows read.
+    """
+    # In-memory index of the catalog by size, built once per load
+    products_by_size = defaultdict(list)
+    for pk, size_key in Product.objects.exclude(size_key='').values_list('pk', 'size_key'):
+        products_by_size[size_key].append(pk)
+
+    count = 0
+    with transaction.atomic():
+        for chunk in _chunks(rows, LOAD_CHUNK_SIZE):
+            count += len(chunk)
+            pairs = set()
+            for row in chunk:
+                size = normalize_tyre_size(row['tyre_size'])
+                if not size:
+                    raise ValueError(f"Unrecognised tyre size {row['tyre_size']!r} for {row['make']} {row['model']}.")
+                year_from = int(row['year_from'])
+                year_to = int(row.get('year_to') or year_from)
+                for year in range(year_from, year_to + 1):
+                    pairs.add(((row['make'].strip(), row['model'].strip(), year), size))
+
+            keys = {key for key, _ in pairs}
+            Vehicle.objects.bulk_create(
+                (Vehicle(make=make, model=model, year=year) for make, model, year in keys),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            vehicle_ids = {
+                (make, model, year): pk
+                for pk, make, model, year in Vehicle.objects.filter(
+                    make__in={key[0] for key in keys},
+                    model__in={key[1] for key in keys},
+                    year__in={key[2] for key in keys},
+                ).values_list('pk', 'make', 'model', 'year')
+            }
+
+            VehicleFitment.objects.bulk_create(
+                (VehicleFitment(vehicle_id=vehicle_ids[key], tyre_size=size) for key, size in pairs),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            FitmentMatch.objects.bulk_create(
+                (
+                    FitmentMatch(vehicle_id=vehicle_ids[key], product_id=product_id)
+                    for key, size in pairs
+                    for product_id in products_by_size.get(size, ())
+                ),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+    return count
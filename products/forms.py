@@ -0,0 +1,75 @@
+from django import forms
+from django.utils import timezone
+
+from .models import Location, PriceChange, Product
+from .sizes import normalize_tyre_size
+
+
+class PriceChangeForm(forms.ModelForm):
+    brand = forms.ChoiceField(required=False)
+    type = forms.ChoiceField(required=False)
+    size_key = forms.CharField(required=False, label="Size", help_text="e.g. 205/55R16; blank for every size")
+    effective_at = forms.DateTimeField(
+        required=False, label="Effective from",
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        help_text="Blank applies the change now",
+    )
+
+    class Meta:
+        model = PriceChange
+        fields = ['brand', 'type', 'size_key', 'mode', 'amount', 'rounding', 'effective_at']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        products = Product.objects.order_by()
+        self.fields['brand'].choices = [('', 'All brands')] + [
+            (brand, brand) for brand in products.values_list('brand', flat=True).distinct().order_by('brand')
+        ]
+        self.fields['type'].choices = [('', 'All types')] + [
+            (kind, kind) for kind in products.values_list('type', flat=True).distinct().order_by('type')
+        ]
+
+    def clean_size_key(self):
+        size = self.cleaned_data['size_key'].strip()
+        if not size:
+            return ''
+        size_key = normalize_tyre_size(size)
+        if not size_key:
+            raise forms.ValidationError("Not a tyre size (expected e.g. 205/55R16).")
+        return size_key
+
+    def clean_amount(self):
+        amount = self.cleaned_data['amount']
+        if amount == 0:
+            raise forms.ValidationError("Enter a non-zero change.")
+        if self.cleaned_data.get('mode') == PriceChange.PERCENT and amount <= -100:
+            raise forms.ValidationError("A price can't drop by 100% or more.")
+        return amount
+
+    def clean_effective_at(self):
+        return self.cleaned_data['effective_at'] or timezone.now()
+
+
+class LocationForm(forms.ModelForm):
+    class Meta:
+        model = Location
+        fields = ['code', 'name']
+        help_texts = {'code': "Short name used in settings.TILL_LOCATIONS, e.g. gulberg"}
+
+
+class StockTransferForm(forms.Form):
+    product = forms.ModelChoiceField(queryset=Product.objects.none())
+    source = forms.ModelChoiceField(queryset=Location.objects.all(), label="From")
+    destination = forms.ModelChoiceField(queryset=Location.objects.all(), label="To")
+    quantity = forms.IntegerField(min_value=1)
+
+    def __init__(self, *args, products, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Offered per tyre size, not the whole catalog
+        self.fields['product'].queryset = products
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('source') and cleaned_data.get('source') == cleaned_data.get('destination'):
+            raise forms.ValidationError("Choose two different locations.")
+        return cleaned_data
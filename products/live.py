@@ -0,0 +1,267 @@
+"""
+Live stock and price feed for open screens (server-sent events).
+
+Code that changes a product's stock or price calls
+``publish_product_changes(pks)``, which adds a ProductEvent row naming
+those products in the same transaction as the change, so the event
+commits or rolls back with it. Event ids come from the table's
+AUTOINCREMENT key and SQLite has one writer at a time, so ids become
+visible in increasing order: an id is a cursor that every worker process
+(and every management command that writes) shares.
+
+Each process runs one tailer thread, started with its first subscriber,
+that polls the table every POLL_SECONDS for events after the last one it
+saw, reads the current stock and price of the products they name in one
+query and hands the events to the subscribers of that process. An event
+carries absolute values, not differences, so applying one twice is
+harmless and any number of missed events collapse into one.
+
+A subscriber is one open ``products:product_stream`` response: an async
+generator on the server's event loop with a bounded asyncio.Queue. The
+tailer never waits on a slow client: when its queue is full the
+subscriber is dropped and its stream ends. The browser's EventSource
+then reconnects with the Last-Event-ID of the last event it received and
+the missed events are replayed from the table. Pages embed ``cursor()``
+at render time and pass it on their first connect, so changes committed
+between rendering and connecting are replayed too. A cursor older than
+the retained HISTORY_SIZE events, or not from this database, gets a
+``reset`` event instead, and the page fetches the current values of its
+products from ``products:product_state``.
+
+Streams hold no thread, but need an ASGI server (the Dockerfile runs
+uvicorn). They end after STREAM_SECONDS and the browser reconnects.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from .models import Product, ProductEvent, StockShard
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 10000      # Events kept for replay to reconnecting clients
+PRUNE_EVERY = 1000        # Every Nth event deletes the events older than HISTORY_SIZE
+CLIENT_BUFFER_SIZE = 100  # Events a subscriber may fall behind before it is dropped
+HEARTBEAT_SECONDS = 15    # Comment lines keep proxies from closing an idle stream
+STREAM_SECONDS = 300
+RETRY_MILLISECONDS = 3000
+POLL_SECONDS = 0.5
+TAIL_BATCH_SIZE = 500     # Events read per poll
+EVENT_BATCH_SIZE = 500    # Products per event, e.g. for a bulk repricing
+
+
+def _event(event_id, kind, data):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {kind}", f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+def _chunks(items, size=EVENT_BATCH_SIZE):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def latest_event_id():
+    return ProductEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def product_states(pks):
+    """Committed stock and price of the products in `pks`: [{'id', 'stock_quantity', 'price'}, ...]."""
+    rows = list(Product.objects.filter(pk__in=pks).values_list('pk', 'stock_quantity', 'price', 'stock_shards'))
+    sharded = [pk for pk, _, _, shards in rows if shards]
+    shard_totals = {}
+    if sharded:
+        # Sharded products' stock_quantity is only folded periodically
+        shard_totals = dict(
+            StockShard.objects.filter(product__in=sharded).values('product').annotate(total=Sum('quantity'))
+            .values_list('product', 'total')
+        )
+    return [
+        {'id': pk, 'stock_quantity': shard_totals.get(pk, 0) if shards else stock, 'price': str(price)}
+        for pk, stock, price, shards in sorted(rows)
+    ]
+
+
+def replay_events(last_event_id):
+    """
+    Returns (events, latest id): what a client that has seen up to `last_event_id`
+    missed, as the current values of every product changed since, or a reset.
+    """
+    latest = latest_event_id()
+    if not last_event_id.isdigit() or int(last_event_id) > latest:
+        # Not a cursor from this database, e.g. one issued before a restore
+        return [_event(latest, 'reset', {})], latest
+    cursor = int(last_event_id)
+    if cursor == latest:
+        return [], latest
+    oldest = ProductEvent.objects.order_by('pk').values_list('pk', flat=True).first()
+    if oldest is None or cursor < oldest - 1:
+        # Some of the events after the cursor have been pruned
+        return [_event(latest, 'reset', {})], latest
+    pks = set()
+    for product_ids in ProductEvent.objects.filter(pk__gt=cursor, pk__lte=latest).values_list('product_ids', flat=True):
+        pks.update(product_ids)
+    chunks = [products for chunk in _chunks(sorted(pks)) if (products := product_states(chunk))]
+    # Only the last message carries the id, so a client cut off halfway asks for all of it again
+    return [
+        _event(latest if index == len(chunks) - 1 else None, 'products', {'products': products})
+        for index, products in enumerate(chunks)
+    ], latest
+
+
+class Subscription:
+    def __init__(self, feed, loop, buffer_size):
+        self.feed = feed
+        self.loop = loop
+        self.buffer = asyncio.Queue(maxsize=buffer_size)
+        # Live events up to this id are already covered by the replay
+        self.replayed_to = 0
+        self.dropped = False
+
+    def deliver(self, events):
+        # Runs on the subscriber's event loop, scheduled by the tailer thread
+        for event_id, text in events:
+            if self.dropped:
+                return
+            try:
+                self.buffer.put_nowait((event_id, text))
+            except asyncio.QueueFull:
+                self.dropped = True
+                self.feed.unsubscribe(self)
+
+    async def stream(self, replay, heartbeat=HEARTBEAT_SECONDS, duration=STREAM_SECONDS):
+        """The SSE body: the replayed events, then live ones until `duration` passes or the client falls behind."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            for text in replay:
+                yield text
+            while not self.dropped and (remaining := deadline - loop.time()) > 0:
+                try:
+                    event_id, text = await asyncio.wait_for(self.buffer.get(), min(heartbeat, remaining))
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_id > self.replayed_to:
+                    yield text
+        finally:
+            # Also runs when the server closes the response of a client that went away
+            self.feed.unsubscribe(self)
+
+
+class ProductFeed:
+    """Tails the ProductEvent table while this process has subscribers, and fans new events out to them."""
+
+    def __init__(self, buffer_size=CLIENT_BUFFER_SIZE, poll_seconds=POLL_SECONDS):
+        self._buffer_size = buffer_size
+        self._poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers = set()
+        self._last_id = 0
+        self._thread = None
+        self._pid = None
+
+    def cursor(self):
+        """The id of the latest event: pass it as `last_event_id` to see only what comes after."""
+        return str(latest_event_id())
+
+    def subscribe(self, last_event_id=None, loop=None):
+        """
+        Returns (subscription, replay): the events to send first, then the subscription's
+        live events. Runs ORM queries; async callers go through db_query.
+        """
+        subscription = Subscription(self, loop or asyncio.get_running_loop(), self._buffer_size)
+        with self._lock:
+            if not self._subscribers:
+                # The tailer was idle; events before now are the replay's job
+                self._last_id = max(self._last_id, latest_event_id())
+            # Registered before the replay is read, so no event falls in between
+            self._subscribers.add(subscription)
+        self._ensure_started()
+        self._wake.set()
+        replay = []
+        if last_event_id:
+            replay, subscription.replayed_to = replay_events(last_event_id)
+        return subscription, replay
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            # Also restarts the thread in a forked worker process, where it doesn't exist
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='product-feed', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+                after = self._last_id
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                events = list(
+                    ProductEvent.objects.filter(pk__gt=after).order_by('pk')
+                    .values_list('pk', 'product_ids')[:TAIL_BATCH_SIZE]
+                )
+                if events:
+                    self._dispatch(events)
+            except DatabaseError:
+                # E.g. the database was locked; try again on a fresh connection
+                logger.exception("Reading product events failed")
+                connection.close()
+                events = []
+            if len(events) < TAIL_BATCH_SIZE:
+                time.sleep(self._poll_seconds)
+
+    def _dispatch(self, events):
+        pks = sorted({pk for _, product_ids in events for pk in product_ids})
+        states = {state['id']: state for chunk in _chunks(pks) for state in product_states(chunk)}
+        texts = [
+            (event_id, _event(event_id, 'products', {'products': [states[pk] for pk in product_ids if pk in states]}))
+            for event_id, product_ids in events
+        ]
+        with self._lock:
+            self._last_id = max(self._last_id, events[-1][0])
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, texts)
+            except RuntimeError:
+                # Its event loop has been closed
+                self.unsubscribe(subscriber)
+
+
+FEED = ProductFeed()
+
+
+def publish_product_changes(pks):
+    """Records that the stock or price of `pks` changed, as part of the current transaction."""
+    for chunk in _chunks(sorted(set(pks))):
+        event = ProductEvent.objects.create(product_ids=chunk)
+        if event.pk % PRUNE_EVERY == 0:
+            ProductEvent.objects.filter(pk__lte=event.pk - HISTORY_SIZE).delete()
@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from products.models import Product
+from products.stock import add_to_location, available_stock, decrement_stock, default_location
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares checkout stock decrements on a single Product row against sharded counters "
+        "under concurrent writers. Creates and deletes its own product; run it against a copy "
+        "of the database, not during opening hours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent tills (writer threads).")
+        parser.add_argument('--sales', type=int, default=200, help="Decrements per thread.")
+        parser.add_argument('--shards', type=int, default=8, help="Shard count for the sharded run.")
+
+    def handle(self, *args, **options):
+        threads, sales = options['threads'], options['sales']
+        for label, shards in (('single row', 0), (f"{options['shards']} shards", options['shards'])):
+            result = self._run(threads, sales, shards)
+            self.stdout.write(
+                f"{label:>12}: {result['ops']} sales in {result['elapsed']:.2f}s "
+                f"({result['ops'] / result['elapsed']:.0f}/s), "
+                f"p50 {result['p50'] * 1000:.1f}ms, p95 {result['p95'] * 1000:.1f}ms, "
+                f"max {result['max'] * 1000:.1f}ms, lock retries {result['retries']}, "
+                f"stock {'ok' if result['consistent'] else 'MISMATCH'}"
+            )
+
+    def _run(self, threads, sales, shards):
+        initial = threads * sales
+        product = Product.objects.create(
+            name='Stock contention benchmark', brand='-', type='-', price=1,
+            stock_quantity=initial, stock_shards=shards,
+        )
+        location = default_location()
+        # Creates the shards at the location for a sharded product
+        add_to_location(product, location, initial)
+
+        latencies = []
+        retries = [0]
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(threads)
+
+        def till():
+            own_latencies, own_retries = [], 0
+            start_barrier.wait()
+            try:
+                for _ in range(sales):
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                decrement_stock(product, 1, location)
+                            break
+                        except OperationalError:
+                            # SQLite "database is locked": back off and retry like a till would
+                            own_retries += 1
+                            time.sleep(0.001)
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                retries[0] += own_retries
+
+        workers = [threading.Thread(target=till) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            consistent = available_stock(product) == initial - len(latencies)
+        finally:
+            product.delete()
+
+        latencies.sort()
+        return {
+            'ops': len(latencies),
+            'elapsed': elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'max': latencies[-1],
+            'retries': retries[0],
+            'consistent': consistent,
+        }
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.stock import fold_stock_shards
+
+
+class Command(BaseCommand):
+    help = "Folds the stock shards of hot products back into Product.stock_quantity. Run periodically (e.g. every minute from cron)."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = fold_stock_shards()
+        self.stdout.write(self.style.SUCCESS(f"Folded stock shards: {changed} product(s) updated."))
@@ -0,0 +1,26 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.fitment import load_fitments
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads vehicle fitment data from a CSV with columns "
+        "make, model, year_from, year_to, tyre_size (year_to may be blank)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                count = load_fitments(csv.DictReader(f))
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Could not load fitments: {e}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} fitment row(s) in {elapsed:.2f}s."))
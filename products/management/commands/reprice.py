@@ -0,0 +1,81 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.models import PriceChange
+from products.repricing import apply_due_price_changes, apply_price_change, preview
+from products.sizes import normalize_tyre_size
+from products.tasks import schedule_price_change
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprices every product matching --brand/--type/--size by --percent or --amount, rounded to --rounding. "
+        "Shows a preview unless --apply is given; with --at the change is scheduled instead. "
+        "--apply-due applies scheduled changes whose date has passed (if no worker is running)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brand', default='')
+        parser.add_argument('--type', default='')
+        parser.add_argument('--size', default='', help="Tyre size, e.g. 205/55R16.")
+        change = parser.add_mutually_exclusive_group()
+        change.add_argument('--percent', type=Decimal, help="Percentage change, e.g. 7.5 or -5.")
+        change.add_argument('--amount', type=Decimal, help="Change in rupees, e.g. 250 or -100.")
+        parser.add_argument('--rounding', default=PriceChange.ROUND_CENTS,
+                            choices=[code for code, label in PriceChange.ROUNDING_CHOICES],
+                            help="Round new prices to this step.")
+        parser.add_argument('--at', help="Effective date and time (ISO 8601); schedules the change.")
+        parser.add_argument('--apply', action='store_true', help="Apply (or schedule) instead of previewing.")
+        parser.add_argument('--apply-due', action='store_true', help="Apply scheduled changes that are due, then exit.")
+
+    def handle(self, *args, **options):
+        if options['apply_due']:
+            for change in apply_due_price_changes():
+                self.stdout.write(self.style.SUCCESS(f"Applied {change} to {change.product_count} product(s)."))
+            return
+
+        if options['percent'] is None and options['amount'] is None:
+            raise CommandError("Give --percent or --amount.")
+        size_key = normalize_tyre_size(options['size'])
+        if options['size'] and not size_key:
+            raise CommandError(f"Not a tyre size: {options['size']!r}.")
+        effective_at = timezone.now()
+        if options['at']:
+            effective_at = parse_datetime(options['at'])
+            if effective_at is None:
+                raise CommandError("--at must be an ISO 8601 date and time.")
+            if timezone.is_naive(effective_at):
+                effective_at = timezone.make_aware(effective_at)
+
+        change = PriceChange(
+            brand=options['brand'], type=options['type'], size_key=size_key,
+            mode=PriceChange.PERCENT if options['percent'] is not None else PriceChange.ABSOLUTE,
+            amount=options['percent'] if options['percent'] is not None else options['amount'],
+            rounding=options['rounding'], effective_at=effective_at,
+        )
+
+        if not options['apply']:
+            started = time.perf_counter()
+            summary = preview(change, limit=10)
+            for row in summary['rows']:
+                self.stdout.write(f"  {row['name']} ({row['brand']}): {row['price']} -> {row['new_price']}")
+            self.stdout.write(
+                f"{change}: {summary['count']} product(s) would change "
+                f"(previewed in {time.perf_counter() - started:.2f}s). Add --apply to run it."
+            )
+            return
+
+        change.save()
+        if effective_at > timezone.now():
+            schedule_price_change(change)
+            self.stdout.write(self.style.SUCCESS(f"Scheduled {change} for {timezone.localtime(effective_at):%Y-%m-%d %H:%M}."))
+            return
+        started = time.perf_counter()
+        count = apply_price_change(change)
+        self.stdout.write(self.style.SUCCESS(
+            f"Repriced {count} product(s) in {time.perf_counter() - started:.2f}s: {change}."
+        ))
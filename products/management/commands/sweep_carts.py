@@ -0,0 +1,37 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from products.carts import SWEEP_CHUNK_SIZE, stale_carts, sweep_stale_carts
+
+
+class Command(BaseCommand):
+    help = "Deletes carts (and their items) untouched for longer than CART_TTL_HOURS, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=float, default=settings.CART_TTL_HOURS,
+                            help="Delete carts idle for longer than this (default: CART_TTL_HOURS).")
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE, help="Carts deleted per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the stale carts.")
+
+    def handle(self, *args, **options):
+        if options['ttl_hours'] <= 0 or options['chunk_size'] <= 0:
+            raise CommandError("--ttl-hours and --chunk-size must be positive.")
+        ttl = datetime.timedelta(hours=options['ttl_hours'])
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale_carts(ttl).count()} cart(s) idle for more than {options['ttl_hours']:g}h.")
+            return
+
+        started = time.perf_counter()
+        deleted = sweep_stale_carts(
+            ttl,
+            chunk_size=options['chunk_size'],
+            progress=lambda n: self.stdout.write(f"  {n} cart(s) deleted..."),
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} cart(s) idle for more than {options['ttl_hours']:g}h in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_velocity', models.DecimalField(decimal_places=2, help_text='Units sold per day (recent moving average)', max_digits=10)),
+                ('days_of_cover', models.DecimalField(decimal_places=1, help_text='Days until stock runs out at the current velocity', max_digits=10)),
+                ('suggested_quantity', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_suggestion', to='products.product')),
+            ],
+            options={
+                'ordering': ['days_of_cover'],
+            },
+        ),
+    ]
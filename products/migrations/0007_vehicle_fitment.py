@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from products.sizes import normalize_tyre_size
+
+
+def fill_size_keys(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    db = schema_editor.connection.alias
+    products = list(Product.objects.using(db).only('pk', 'size'))
+    for product in products:
+        product.size_key = normalize_tyre_size(product.size)
+    Product.objects.using(db).bulk_update(products, ['size_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_reordersuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='size_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.CreateModel(
+            name='Vehicle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('make', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('year', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'ordering': ['make', 'model', 'year'],
+                'constraints': [models.UniqueConstraint(fields=('make', 'model', 'year'), name='unique_vehicle')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FitmentMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fitment_matches', to='products.product')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='products.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'product'), name='unique_fitment_match')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VehicleFitment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tyre_size', models.CharField(db_index=True, max_length=20)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fitments', to='products.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'tyre_size'), name='unique_vehicle_fitment')],
+            },
+        ),
+        migrations.RunPython(fill_size_keys, migrations.RunPython.noop),
+    ]
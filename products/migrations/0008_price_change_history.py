@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_vehicle_fitment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(blank=True, max_length=100)),
+                ('type', models.CharField(blank=True, max_length=100)),
+                ('size_key', models.CharField(blank=True, help_text='Normalized tyre size, e.g. 205/55R16', max_length=20)),
+                ('mode', models.CharField(choices=[('PERCENT', 'Percentage'), ('ABSOLUTE', 'Amount (Rs)')], default='PERCENT', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Percent or rupees; negative lowers prices', max_digits=10)),
+                ('rounding', models.CharField(choices=[('0.01', 'No rounding'), ('1', 'Nearest Rs 1'), ('10', 'Nearest Rs 10'), ('50', 'Nearest Rs 50'), ('100', 'Nearest Rs 100')], default='0.01', max_length=5)),
+                ('effective_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('SCHEDULED', 'Scheduled'), ('APPLIED', 'Applied'), ('CANCELLED', 'Cancelled')], default='SCHEDULED', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='price_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-effective_at', '-pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_at', models.DateTimeField()),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('price_change', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='history', to='products.pricechange')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='products.product')),
+            ],
+            options={
+                'ordering': ['-effective_at', '-pk'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pricechange',
+            index=models.Index(fields=['status', 'effective_at'], name='price_change_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productpricehistory',
+            index=models.Index(fields=['product', 'effective_at'], name='price_history_product_idx'),
+        ),
+    ]
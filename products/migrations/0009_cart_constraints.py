@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    Cart = apps.get_model('products', 'Cart')
+    CartItem = apps.get_model('products', 'CartItem')
+    db = schema_editor.connection.alias
+    # A user's most recently updated cart is kept; the items of the others move into it
+    for row in Cart.objects.using(db).values('user').annotate(n=Count('pk')).filter(n__gt=1):
+        cart_ids = list(Cart.objects.using(db).filter(user=row['user']).order_by('-updated_at', '-pk').values_list('pk', flat=True))
+        CartItem.objects.using(db).filter(cart_id__in=cart_ids[1:]).update(cart_id=cart_ids[0])
+        Cart.objects.using(db).filter(pk__in=cart_ids[1:]).delete()
+    # Then repeated lines for one product are summed into the oldest line
+    for row in CartItem.objects.using(db).values('cart', 'product').annotate(n=Count('pk')).filter(n__gt=1):
+        items = list(CartItem.objects.using(db).filter(cart=row['cart'], product=row['product']).order_by('pk'))
+        items[0].quantity = sum(item.quantity for item in items)
+        items[0].save(update_fields=['quantity'])
+        CartItem.objects.using(db).filter(pk__in=[item.pk for item in items[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_phone_key'),
+        ('products', '0008_price_change_history'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='cart_updated_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='one_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:15
+
+import django.db.models.deletion
+from django.db.models import Sum
+from django.conf import settings
+from django.db import migrations, models
+
+
+def stock_default_location(apps, schema_editor):
+    Location = apps.get_model('products', 'Location')
+    LocationStock = apps.get_model('products', 'LocationStock')
+    Product = apps.get_model('products', 'Product')
+    StockShard = apps.get_model('products', 'StockShard')
+    db = schema_editor.connection.alias
+    # Everything on hand so far is at the one branch there was
+    main = Location.objects.using(db).create(code='main', name='Main branch', is_default=True)
+    sharded = dict(StockShard.objects.using(db).values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+    LocationStock.objects.using(db).bulk_create(
+        [
+            LocationStock(product_id=pk, location=main, quantity=sharded.get(pk, 0) if shards else quantity)
+            for pk, quantity, shards in Product.objects.using(db).values_list('pk', 'stock_quantity', 'stock_shards').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_cart_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=20, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('is_default', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['name'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='one_default_location')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LocationStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock', to='products.location')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='location_stock', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'location'), name='unique_location_stock')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('TRANSFER', 'Transfer'), ('ADJUSTMENT', 'Adjustment')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('transfer_id', models.UUIDField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='products.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'ordering': ['-created_at', '-pk'],
+                'indexes': [models.Index(fields=['location', 'created_at'], name='stock_movement_location_idx')],
+            },
+        ),
+        migrations.RunPython(stock_default_location, migrations.RunPython.noop),
+    ]
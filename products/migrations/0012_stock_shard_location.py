@@ -0,0 +1,49 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def shard_per_location(apps, schema_editor):
+    # The shards held a product's total; LocationStock has the exact stock per location, spread it over new shards
+    Product = apps.get_model('products', 'Product')
+    LocationStock = apps.get_model('products', 'LocationStock')
+    StockShard = apps.get_model('products', 'StockShard')
+    db = schema_editor.connection.alias
+    for product_id, shard_count in Product.objects.using(db).filter(stock_shards__gt=0).values_list('pk', 'stock_shards'):
+        StockShard.objects.using(db).filter(product_id=product_id).delete()
+        shards = []
+        for location_id, quantity in LocationStock.objects.using(db).filter(product_id=product_id).values_list('location_id', 'quantity'):
+            base, extra = divmod(quantity, shard_count)
+            shards += [
+                StockShard(product_id=product_id, location_id=location_id, shard_no=n, quantity=base + (1 if n < extra else 0))
+                for n in range(shard_count)
+            ]
+        StockShard.objects.using(db).bulk_create(shards)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_event'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='stockshard',
+            name='unique_stock_shard',
+        ),
+        migrations.AddField(
+            model_name='stockshard',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_shards', to='products.location'),
+        ),
+        migrations.RunPython(shard_per_location, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockshard',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_shards', to='products.location'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('product', 'location', 'shard_no'), name='unique_stock_shard'),
+        ),
+    ]
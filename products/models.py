@@ -2,6 +2,7 @@ from django.db import models
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from customers.models import Customer
+from .sizes import normalize_tyre_size
 
 User = get_user_model()
 
@@ -12,32 +13,321 @@ class Product(models.Model):
     size = models.CharField(max_length=50, blank=True, null=True, help_text="e.g., L, XL, 32/32")
     type = models.CharField(max_length=100, help_text="e.g., Shirt, Electronics, Grocery")
     description = models.TextField(blank=True)
+    # Canonical tyre size derived from `size` on save (e.g. '205/55R16'); joins to VehicleFitment
+    size_key = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     
     # Financial/Stock fields
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.IntegerField(default=0)
+    stock_shards = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="0 = normal stock. For hot SKUs, split stock across this many counter rows to cut checkout lock waits."
+    )
     
     # Audit fields
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; keys the cached product_list.html rows.
+    # Bulk .update() calls must set it explicitly (updated_at=timezone.now(), not the
+    # database Now(), so every stored value has the same format for watermark comparisons).
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Watermark scans for the catalog delta-sync API
+            models.Index(fields=['updated_at', 'id'], name='product_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.brand})"
 
     def get_absolute_url(self):
         return reverse('products:product_list')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a save can tell whether the fitment index needs refreshing
+        instance._loaded_size_key = instance.__dict__.get('size_key')
+        return instance
+
+    @property
+    def size_key_changed(self):
+        return getattr(self, '_loaded_size_key', None) != self.size_key
+
+    def save(self, *args, **kwargs):
+        self.size_key = normalize_tyre_size(self.size)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'size' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'size_key'}
+        super().save(*args, **kwargs)
     
 
 
+class ProductTombstone(models.Model):
+    # Left behind when a product is deleted, so catalog sync clients learn about the delete
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'product_id'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class ProductEvent(models.Model):
+    # Outbox of stock and price changes for the live feed (products/live.py); the id is the feed's cursor
+    product_ids = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Event {self.pk}: {len(self.product_ids)} products"
+
+
+class StockShard(models.Model):
+    # One of N counters holding part of a hot product's stock at one location (see products/stock.py).
+    # While a product is sharded, LocationStock and Product.stock_quantity hold the last folded totals.
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    location = models.ForeignKey('Location', on_delete=models.PROTECT, related_name='stock_shards')
+    shard_no = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location', 'shard_no'], name='unique_stock_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} shard {self.shard_no} at {self.location.name}: {self.quantity}"
+
+
+class Location(models.Model):
+    # A branch (or warehouse) holding stock. Tills sell from the location
+    # settings.TILL_LOCATIONS maps them to, and otherwise from the default one.
+    code = models.SlugField(max_length=20, unique=True)
+    name = models.CharField(max_length=100)
+    is_default = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['is_default'], condition=models.Q(is_default=True), name='one_default_location',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class LocationStock(models.Model):
+    # Units of a product on hand at one location (see products/stock.py).
+    # Product.stock_quantity is the total over all locations.
+    # No separate product index: unique_location_stock leads with product
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='location_stock', db_index=False)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock')
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the (product, location) index every stock lookup goes through
+            models.UniqueConstraint(fields=['product', 'location'], name='unique_location_stock'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} at {self.location.name}: {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """
+    A change to the stock at one location other than a sale. A transfer is
+    two movements, out of one location and into another, sharing a transfer_id.
+    """
+    TRANSFER = 'TRANSFER'
+    ADJUSTMENT = 'ADJUSTMENT'
+    KIND_CHOICES = [
+        (TRANSFER, 'Transfer'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed: negative out of the location, positive into it
+    quantity = models.IntegerField()
+    transfer_id = models.UUIDField(null=True, blank=True, db_index=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-pk']
+        indexes = [
+            models.Index(fields=['location', 'created_at'], name='stock_movement_location_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} x {self.product.name} at {self.location.name}"
+
+
+class PriceChange(models.Model):
+    """
+    A bulk repricing run (products/repricing.py): every product matching the
+    filters gets the same percentage or absolute change, applied in one UPDATE,
+    now or at `effective_at` by a background job.
+    """
+    PERCENT = 'PERCENT'
+    ABSOLUTE = 'ABSOLUTE'
+    MODE_CHOICES = [
+        (PERCENT, 'Percentage'),
+        (ABSOLUTE, 'Amount (Rs)'),
+    ]
+
+    # Prices are rounded to the nearest multiple of the step
+    ROUND_CENTS = '0.01'
+    ROUND_RUPEE = '1'
+    ROUND_TEN = '10'
+    ROUND_FIFTY = '50'
+    ROUND_HUNDRED = '100'
+    ROUNDING_CHOICES = [
+        (ROUND_CENTS, 'No rounding'),
+        (ROUND_RUPEE, 'Nearest Rs 1'),
+        (ROUND_TEN, 'Nearest Rs 10'),
+        (ROUND_FIFTY, 'Nearest Rs 50'),
+        (ROUND_HUNDRED, 'Nearest Rs 100'),
+    ]
+
+    SCHEDULED = 'SCHEDULED'
+    APPLIED = 'APPLIED'
+    CANCELLED = 'CANCELLED'
+    STATUS_CHOICES = [
+        (SCHEDULED, 'Scheduled'),
+        (APPLIED, 'Applied'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    # Filters; blank matches everything
+    brand = models.CharField(max_length=100, blank=True)
+    type = models.CharField(max_length=100, blank=True)
+    size_key = models.CharField(max_length=20, blank=True, help_text="Normalized tyre size, e.g. 205/55R16")
+
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=PERCENT)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="Percent or rupees; negative lowers prices")
+    rounding = models.CharField(max_length=5, choices=ROUNDING_CHOICES, default=ROUND_CENTS)
+
+    effective_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=SCHEDULED)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='price_changes')
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-effective_at', '-pk']
+        indexes = [
+            models.Index(fields=['status', 'effective_at'], name='price_change_due_idx'),
+        ]
+
+    def __str__(self):
+        sign = '+' if self.amount >= 0 else ''
+        change = f"{sign}{self.amount}%" if self.mode == self.PERCENT else f"{sign}Rs {self.amount}"
+        scope = ', '.join(part for part in (self.brand, self.type, self.size_key) if part) or 'all products'
+        return f"{change} on {scope}"
+
+
+class ProductPriceHistory(models.Model):
+    # One row per price a product had; written by repricing runs and product edits
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    price_change = models.ForeignKey(PriceChange, on_delete=models.SET_NULL, null=True, blank=True, related_name='history')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_at = models.DateTimeField()
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['-effective_at', '-pk']
+        indexes = [
+            models.Index(fields=['product', 'effective_at'], name='price_history_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.new_price} at {self.effective_at:%Y-%m-%d %H:%M}"
+
+
+class ReorderSuggestion(models.Model):
+    # Written in bulk by `manage.py forecast_stock`; read by the dashboard
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='reorder_suggestion')
+    daily_velocity = models.DecimalField(max_digits=10, decimal_places=2, help_text="Units sold per day (recent moving average)")
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, help_text="Days until stock runs out at the current velocity")
+    suggested_quantity = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['days_of_cover']
+
+    def __str__(self):
+        return f"Reorder {self.suggested_quantity} x {self.product.name}"
+
+
+class Vehicle(models.Model):
+    make = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    year = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['make', 'model', 'year']
+        constraints = [
+            models.UniqueConstraint(fields=['make', 'model', 'year'], name='unique_vehicle'),
+        ]
+
+    def __str__(self):
+        return f"{self.year} {self.make} {self.model}"
+
+
+class VehicleFitment(models.Model):
+    # An OEM tyre size for a vehicle (normalized, see products/sizes.py)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='fitments')
+    tyre_size = models.CharField(max_length=20, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'tyre_size'], name='unique_vehicle_fitment'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle}: {self.tyre_size}"
+
+
+class FitmentMatch(models.Model):
+    # Precomputed vehicle -> product join, maintained by products/fitment.py.
+    # Stock is deliberately not copied here: lookups filter on the live Product row.
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='matches')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='fitment_matches')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'product'], name='unique_fitment_match'),
+        ]
+
+
 class Cart(models.Model):
-    # Links the cart to the salesperson (logged-in user)
+    # Links the cart to the salesperson (logged-in user); one open cart each, see products/carts.py
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts') 
     # Optional: Link to a specific customer being served
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Touched whenever the items change; `manage.py sweep_carts` deletes carts idle past CART_TTL_HOURS
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='one_cart_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='cart_updated_at_idx'),
+        ]
     
     def get_total_items(self):
         """Calculates the total number of unique items in the cart."""
@@ -52,6 +342,11 @@ class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
     
     @property
     def subtotal(self):
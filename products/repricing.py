@@ -0,0 +1,129 @@
+"""
+Bulk repricing.
+
+A PriceChange names the products (brand, type, normalized size) and the
+change: a percentage or an amount, then rounding to a step. The new price
+is a single SQL expression, so the preview shows exactly what the run
+will write, and a run is one UPDATE however many products match. The
+history rows are written first with bulk_create, from the same query, in
+the same transaction, and each repriced product gets an audit entry
+attributed to whoever created the change. Changes dated in the future are applied by a
+background job (see tasks.py).
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from audit.models import AuditEntry
+from audit.recorder import record_bulk_changes
+from my_project.caching import bump_model_version
+from .live import publish_product_changes
+from .models import PriceChange, Product, ProductPriceHistory
+
+PREVIEW_ROWS = 200
+
+
+def matching_products(change):
+    """Products selected by the change's filters."""
+    products = Product.objects.all()
+    if change.brand:
+        products = products.filter(brand=change.brand)
+    if change.type:
+        products = products.filter(type=change.type)
+    if change.size_key:
+        products = products.filter(size_key=change.size_key)
+    return products
+
+
+def new_price_expression(change):
+    """The repriced value of F('price'), rounded to the change's step and never below zero."""
+    price = F('price')
+    if change.mode == PriceChange.PERCENT:
+        value = price * (Decimal(100) + change.amount) / Decimal(100)
+    else:
+        value = price + change.amount
+    step = Decimal(change.rounding)
+    if step == Decimal(PriceChange.ROUND_CENTS):
+        value = Round(value, 2)
+    else:
+        value = Round(value / step) * step
+    return ExpressionWrapper(
+        Greatest(value, Value(Decimal(0))),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def changed_products(change):
+    """Matching products whose price the change would actually alter."""
+    return matching_products(change).exclude(price=new_price_expression(change))
+
+
+def preview(change, limit=PREVIEW_ROWS):
+    """Summary of what applying `change` now would do, plus the first `limit` rows."""
+    rows = changed_products(change).annotate(new_price=new_price_expression(change))
+    summary = rows.aggregate(count=Count('pk'), old_total=Sum('price'), new_total=Sum('new_price'))
+    summary['rows'] = list(
+        rows.order_by('brand', 'name').values('pk', 'name', 'brand', 'size', 'price', 'new_price')[:limit]
+    )
+    return summary
+
+
+def apply_price_change(change):
+    """
+    Applies a scheduled change in one transaction. Returns the number of
+    products repriced, or None if the change was already applied or cancelled.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Claiming the change is the first write, so SQLite's write lock is held
+        # before any price is read: the history below matches what the UPDATE changes.
+        claimed = PriceChange.objects.filter(pk=change.pk, status=PriceChange.SCHEDULED).update(
+            status=PriceChange.APPLIED, applied_at=now,
+        )
+        if not claimed:
+            return None
+
+        rows = changed_products(change)
+        changed = list(
+            rows.annotate(new_price=new_price_expression(change)).values_list('pk', 'name', 'brand', 'price', 'new_price')
+        )
+        history = [
+            ProductPriceHistory(
+                product_id=pk, price_change_id=change.pk, old_price=old_price, new_price=new_price,
+                effective_at=now, changed_by_id=change.created_by_id,
+            )
+            for pk, _, _, old_price, new_price in changed
+        ]
+        ProductPriceHistory.objects.bulk_create(history, batch_size=1000)
+        count = rows.update(price=new_price_expression(change), updated_at=now)
+        # .update() sends no signals; same entries as editing each product's price
+        record_bulk_changes(
+            Product,
+            ((pk, f"{name} ({brand})", {'price': [old_price, new_price]}) for pk, name, brand, old_price, new_price in changed),
+            action=AuditEntry.UPDATE,
+            actor=change.created_by,
+        )
+        PriceChange.objects.filter(pk=change.pk).update(product_count=count)
+        transaction.on_commit(lambda: bump_model_version(Product))
+        publish_product_changes(entry.product_id for entry in history)
+
+    change.status, change.applied_at, change.product_count = PriceChange.APPLIED, now, count
+    return count
+
+
+def apply_due_price_changes():
+    """Applies every scheduled change whose effective date has passed, oldest first. Returns them."""
+    due = list(PriceChange.objects.filter(status=PriceChange.SCHEDULED, effective_at__lte=timezone.now()).order_by('effective_at', 'pk'))
+    return [change for change in due if apply_price_change(change) is not None]
+
+
+def cancel_price_change(change):
+    """Cancels a change that hasn't been applied yet. Returns False if it was too late."""
+    cancelled = PriceChange.objects.filter(pk=change.pk, status=PriceChange.SCHEDULED).update(status=PriceChange.CANCELLED)
+    if cancelled:
+        change.status = PriceChange.CANCELLED
+    return bool(cancelled)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .fitment import refresh_product_matches
+from .live import publish_product_changes
+from .models import Product, ProductTombstone
+
+
+@receiver(post_delete, sender=Product, dispatch_uid='products:record_product_tombstone')
+def record_product_tombstone(sender, instance, using, **kwargs):
+    """Records deleted products so catalog sync clients can drop them too."""
+    ProductTombstone.objects.using(using).create(product_id=instance.pk)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='products:refresh_fitment_matches')
+def refresh_fitment_matches(sender, instance, created, raw, **kwargs):
+    """Keeps the vehicle fitment index in step when a product's tyre size changes."""
+    if raw:
+        return
+    if created or instance.size_key_changed:
+        refresh_product_matches(instance)
+    instance._loaded_size_key = instance.size_key
+
+
+@receiver(post_save, sender=Product, dispatch_uid='products:publish_live_changes')
+def publish_live_changes(sender, instance, raw, **kwargs):
+    """Pushes edited stock and prices to open screens, see products/live.py."""
+    if not raw:
+        publish_product_changes([instance.pk])
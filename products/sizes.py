@@ -0,0 +1,18 @@
+import re
+
+# 205/55R16, 205/55 R16, 205/55ZR16, 205/55-16, 205 55 16, 205/55 R 16 91V ...
+TYRE_SIZE_RE = re.compile(r'(\d{3})\s*[/\s]\s*(\d{2})\s*(?:Z?R|-|\s)\s*F?\s*(\d{2}(?:\.\d)?)', re.IGNORECASE)
+
+
+def normalize_tyre_size(value):
+    """
+    Canonical form of a tyre size string, e.g. '205/55 zr16 91V' -> '205/55R16'.
+    Returns '' when no width/aspect/rim pattern is found.
+    """
+    if not value:
+        return ''
+    match = TYRE_SIZE_RE.search(value)
+    if not match:
+        return ''
+    width, aspect, rim = match.groups()
+    return f"{width}/{aspect}R{rim}"
@@ -0,0 +1,302 @@
+"""
+Stock decrements for checkout, per location, with an optional sharded mode
+for hot SKUs.
+
+Stock is held per (product, location) in LocationStock; a sale takes it
+from the location of the till that rang it up (``location_for_till``).
+Product.stock_quantity is the maintained total over all locations, which
+the product screens, the catalog API and the forecasts read. Both are
+changed in the same transaction, each with a conditional UPDATE, so
+neither can go below zero. Transfers between locations leave the total
+alone and are recorded as a pair of StockMovements.
+
+A product with ``stock_shards = N > 0`` keeps its live stock at each
+location in N StockShard rows. A checkout decrements a randomly chosen
+shard at its till's location and writes no other stock row, so
+concurrent sales of the same tyre at one branch rarely wait on the same
+row. LocationStock and Product.stock_quantity then hold the last folded
+figures (see ``fold_stock_shards``, run periodically by
+``manage.py fold_stock_shards``); use ``stock_at()`` and
+``available_stock()`` when the exact figure matters.
+"""
+
+import random
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from audit.recorder import record_adjustment
+from my_project.caching import bump_model_version
+from .live import publish_product_changes
+from .models import Location, LocationStock, Product, StockMovement, StockShard
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, requested, available, location=None):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        self.location = location
+        where = f" at {location.name}" if location is not None else ""
+        super().__init__(f"Insufficient stock for {product.name}{where}. Only {available} available.")
+
+
+def default_location():
+    return Location.objects.get(is_default=True)
+
+
+def location_for_till(till):
+    """The location a till sells from: settings.TILL_LOCATIONS[till], or the default location."""
+    code = settings.TILL_LOCATIONS.get(till)
+    if code is None:
+        return default_location()
+    return Location.objects.get(code=code)
+
+
+def stock_at(product, location):
+    """Units of `product` on hand at `location`."""
+    if product.stock_shards:
+        shards = StockShard.objects.filter(product=product, location=location)
+        return shards.aggregate(total=Sum('quantity'))['total'] or 0
+    return LocationStock.objects.filter(product=product, location=location).values_list('quantity', flat=True).first() or 0
+
+
+def take_from_location(product, location, quantity):
+    """Removes `quantity` units at `location`, or raises InsufficientStock. Call inside a transaction."""
+    if product.stock_shards:
+        _take_from_shards(product, location, quantity)
+        return
+    updated = LocationStock.objects.filter(product=product, location=location, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+    )
+    if not updated:
+        raise InsufficientStock(product, quantity, stock_at(product, location), location)
+
+
+def add_to_location(product, location, quantity):
+    """Adds `quantity` units at `location`, creating its stock row on first use."""
+    if product.stock_shards:
+        _add_to_shards(product, location, quantity)
+        return
+    updated = LocationStock.objects.filter(product=product, location=location).update(
+        quantity=F('quantity') + quantity,
+    )
+    if not updated:
+        LocationStock.objects.create(product=product, location=location, quantity=quantity)
+
+
+def available_stock(product):
+    """Exact units on hand: the sum of the shards for sharded products."""
+    if not product.stock_shards:
+        return Product.objects.filter(pk=product.pk).values_list('stock_quantity', flat=True).get()
+    return StockShard.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def decrement_stock(product, quantity, location=None):
+    """
+    Removes `quantity` units of `product` at `location` (default: the default
+    location) and from its total, or raises InsufficientStock without changing anything.
+    A sharded product's total follows at the next fold.
+    Inside a transaction, look the location up before it starts: a read ahead of the
+    first write makes SQLite fail a contended transaction instead of waiting for the lock.
+    """
+    location = location or default_location()
+    with transaction.atomic():
+        take_from_location(product, location, quantity)
+        if not product.stock_shards:
+            _decrement_total(product, quantity)
+        publish_product_changes([product.pk])
+    record_adjustment(product, stock_quantity=-quantity)
+
+
+def _decrement_total(product, quantity):
+    # Conditional, set-based decrement: no read-modify-write race between tills
+    updated = Product.objects.filter(pk=product.pk, stock_quantity__gte=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        raise InsufficientStock(product, quantity, available_stock(product))
+    # .update() sends no signals, so invalidate cached product pages and audit ourselves
+    transaction.on_commit(lambda: bump_model_version(Product))
+
+
+def _spread(product, location_id, quantity):
+    base, extra = divmod(quantity, product.stock_shards)
+    return [
+        StockShard(product=product, location_id=location_id, shard_no=n, quantity=base + (1 if n < extra else 0))
+        for n in range(product.stock_shards)
+    ]
+
+
+def _take_from_shards(product, location, quantity):
+    shard_nos = list(range(product.stock_shards))
+    random.shuffle(shard_nos)
+
+    # Fast path: try the location's shards in random order until one covers the whole quantity
+    for shard_no in shard_nos:
+        updated = StockShard.objects.filter(
+            product=product, location=location, shard_no=shard_no, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity)
+        if updated:
+            return
+
+    # No single shard is big enough: lock them all and drain across shards
+    with transaction.atomic():
+        shards = list(
+            StockShard.objects.select_for_update().filter(product=product, location=location).order_by('shard_no')
+        )
+        total = sum(shard.quantity for shard in shards)
+        if total < quantity:
+            raise InsufficientStock(product, quantity, total, location)
+        remaining = quantity
+        for shard in shards:
+            taken = min(shard.quantity, remaining)
+            if taken > 0:
+                shard.quantity -= taken
+                remaining -= taken
+            if not remaining:
+                break
+        StockShard.objects.bulk_update(shards, ['quantity'])
+
+
+def _add_to_shards(product, location, quantity):
+    updated = StockShard.objects.filter(
+        product=product, location=location, shard_no=random.randrange(product.stock_shards),
+    ).update(quantity=F('quantity') + quantity)
+    if not updated:
+        # First stock at this location; its folded row is created with it, so the location is listed
+        StockShard.objects.bulk_create(_spread(product, location.pk, quantity))
+        LocationStock.objects.get_or_create(product=product, location=location, defaults={'quantity': quantity})
+
+
+def reset_stock_shards(product):
+    """
+    Rebuilds the shard rows after `product.stock_shards` changed: the exact
+    stock at each location is spread evenly over the new number of shards,
+    or with stock_shards = 0 kept in LocationStock and the shards removed.
+    Leaves LocationStock and Product.stock_quantity exact.
+    """
+    with transaction.atomic():
+        existing = StockShard.objects.select_for_update().filter(product=product)
+        if existing.exists():
+            # Sharded until now: the shards hold the exact figures
+            at_location = dict(
+                existing.values('location').annotate(total=Sum('quantity')).values_list('location', 'total')
+            )
+        else:
+            at_location = dict(LocationStock.objects.filter(product=product).values_list('location', 'quantity'))
+        existing.delete()
+
+        if product.stock_shards:
+            StockShard.objects.bulk_create(
+                shard for location_id, quantity in at_location.items() for shard in _spread(product, location_id, quantity)
+            )
+        for location_id, quantity in at_location.items():
+            LocationStock.objects.update_or_create(product=product, location_id=location_id, defaults={'quantity': quantity})
+
+        total = sum(at_location.values())
+        Product.objects.filter(pk=product.pk).update(stock_quantity=total, updated_at=timezone.now())
+        product.stock_quantity = total
+        transaction.on_commit(lambda: bump_model_version(Product))
+        publish_product_changes([product.pk])
+
+
+def fold_stock_shards():
+    """
+    Copies the shard totals of every sharded product into its LocationStock rows
+    and Product.stock_quantity. Returns the number of products changed.
+    """
+    shard_totals = defaultdict(dict)
+    for product_id, location_id, total in (
+        StockShard.objects.values('product', 'location').annotate(total=Sum('quantity'))
+        .values_list('product', 'location', 'total')
+    ):
+        shard_totals[product_id][location_id] = total
+    folded = defaultdict(dict)
+    for product_id, location_id, quantity in LocationStock.objects.filter(
+        product__stock_shards__gt=0,
+    ).values_list('product', 'location', 'quantity'):
+        folded[product_id][location_id] = quantity
+
+    changed = []
+    for product in Product.objects.filter(stock_shards__gt=0).only('pk', 'stock_quantity'):
+        totals = shard_totals.get(product.pk, {})
+        stale = {location_id: total for location_id, total in totals.items() if folded[product.pk].get(location_id) != total}
+        for location_id, total in stale.items():
+            LocationStock.objects.update_or_create(product=product, location_id=location_id, defaults={'quantity': total})
+        total = sum(totals.values())
+        if product.stock_quantity != total:
+            Product.objects.filter(pk=product.pk).update(stock_quantity=total, updated_at=timezone.now())
+        if stale or product.stock_quantity != total:
+            changed.append(product.pk)
+    if changed:
+        transaction.on_commit(lambda: bump_model_version(Product))
+    return len(changed)
+
+
+def adjust_location_stock(product, location, delta, user=None):
+    """
+    Books a counted difference at `location` (e.g. after a stock take entered
+    as the new total on the product form) and records it as an adjustment.
+    The caller sets the total. Raises InsufficientStock if the location would go below zero.
+    """
+    if not delta:
+        return
+    with transaction.atomic():
+        if delta < 0:
+            take_from_location(product, location, -delta)
+        else:
+            add_to_location(product, location, delta)
+        StockMovement.objects.create(
+            product=product, location=location, kind=StockMovement.ADJUSTMENT, quantity=delta, created_by=user,
+        )
+
+
+def transfer_stock(product, source, destination, quantity, user=None):
+    """
+    Moves `quantity` units from `source` to `destination`, written as a pair of
+    movements sharing a transfer id (returned). The product's total is unchanged.
+    """
+    if source == destination:
+        raise ValueError("A transfer needs two different locations.")
+    transfer_id = uuid.uuid4()
+    with transaction.atomic():
+        take_from_location(product, source, quantity)
+        add_to_location(product, destination, quantity)
+        StockMovement.objects.bulk_create([
+            StockMovement(product=product, location=source, kind=StockMovement.TRANSFER, quantity=-quantity,
+                          transfer_id=transfer_id, created_by=user),
+            StockMovement(product=product, location=destination, kind=StockMovement.TRANSFER, quantity=quantity,
+                          transfer_id=transfer_id, created_by=user),
+        ])
+    return transfer_id
+
+
+def where_in_stock(size_key):
+    """
+    Stock rows of every product of the given normalized size with units on hand,
+    by location. One query: products by their size_key index, then the
+    (product, location) index of LocationStock; sharded products' rows get
+    their exact shard totals from a second one.
+    """
+    rows = list(
+        LocationStock.objects.filter(Q(quantity__gt=0) | Q(product__stock_shards__gt=0), product__size_key=size_key)
+        .select_related('product', 'location')
+        .order_by('location__name', 'product__name')
+    )
+    sharded = {row.product_id for row in rows if row.product.stock_shards}
+    if sharded:
+        totals = {
+            (product_id, location_id): total
+            for product_id, location_id, total in StockShard.objects.filter(product__in=sharded)
+            .values('product', 'location').annotate(total=Sum('quantity')).values_list('product', 'location', 'total')
+        }
+        for row in rows:
+            if row.product_id in sharded:
+                row.quantity = totals.get((row.product_id, row.location_id), 0)
+    return [row for row in rows if row.quantity > 0]
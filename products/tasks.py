@@ -0,0 +1,40 @@
+from django.utils import timezone
+
+from jobs.queue import enqueue_on_commit, register
+
+from .forecast import run_forecast
+from .repricing import apply_due_price_changes
+
+REORDER_REFRESH = 'products.refresh_reorder_suggestions'
+
+
+@register(REORDER_REFRESH)
+def refresh_reorder_suggestions():
+    run_forecast()
+
+
+def schedule_reorder_refresh():
+    """
+    Refreshes the reorder suggestions in the background after the current transaction commits.
+    Sales within the delay share a single run.
+    """
+    enqueue_on_commit(REORDER_REFRESH, priority=-1, delay=60, key=REORDER_REFRESH)
+
+
+APPLY_PRICE_CHANGE = 'products.apply_price_change'
+
+
+@register(APPLY_PRICE_CHANGE)
+def apply_scheduled_price_changes(change_id=None):
+    # `change_id` only labels the job; any other change that came due while
+    # no worker was running is applied too, oldest first
+    apply_due_price_changes()
+
+
+def schedule_price_change(change):
+    """Applies `change` in the background at its effective date, once the current transaction commits."""
+    delay = max(0, (change.effective_at - timezone.now()).total_seconds())
+    enqueue_on_commit(
+        APPLY_PRICE_CHANGE, {'change_id': change.pk},
+        priority=1, delay=delay, max_attempts=5, key=f"{APPLY_PRICE_CHANGE}:{change.pk}",
+    )
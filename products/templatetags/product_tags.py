@@ -0,0 +1,23 @@
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# Stands in for the per-user CSRF token inside shared (cached) fragments
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+
+
+@register.simple_tag
+def csrf_placeholder():
+    """
+    Renders a csrf hidden input carrying a placeholder instead of the real token.
+    Usage: inside a {% cache %} block, wrapped by {% filter fill_csrf:csrf_token %}
+    """
+    return format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">', CSRF_PLACEHOLDER)
+
+
+@register.filter(name='fill_csrf', is_safe=True)
+def fill_csrf(value, token):
+    """Swaps every csrf placeholder in already-rendered HTML for this request's token."""
+    return mark_safe(str(value).replace(CSRF_PLACEHOLDER, str(token)))
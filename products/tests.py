@@ -1,3 +1,334 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from audit.models import AuditEntry
+from customers.models import Customer
+from sales.models import Sale
+from .carts import get_user_cart, sweep_stale_carts
+from .live import ProductFeed, latest_event_id, publish_product_changes, replay_events
+from .models import (
+    Cart, CartItem, Location, LocationStock, PriceChange, Product, ProductEvent, ProductPriceHistory, StockMovement,
+    StockShard,
+)
+from .repricing import apply_price_change
+from .stock import (
+    InsufficientStock, add_to_location, available_stock, decrement_stock, default_location, fold_stock_shards,
+    reset_stock_shards, stock_at, transfer_stock,
+)
+
+
+class RepricingAuditTests(TestCase):
+    def test_each_repriced_product_is_audited_as_the_change_author(self):
+        author = User.objects.create_user('pricing')
+        michelin = Product.objects.create(name='Pilot', brand='Michelin', type='Car', price=Decimal('100.00'))
+        Product.objects.create(name='Turanza', brand='Bridgestone', type='Car', price=Decimal('100.00'))
+        change = PriceChange.objects.create(
+            brand='Michelin', amount=Decimal('10'), effective_at=timezone.now(), created_by=author,
+        )
+
+        writer = mock.Mock()
+        with mock.patch('audit.recorder.get_writer', return_value=writer), \
+                self.captureOnCommitCallbacks(execute=True):
+            apply_price_change(change)
+
+        entries = [call.args[0] for call in writer.put.call_args_list if call.args[0]['model'] == 'products.product']
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['object_id'], str(michelin.pk))
+        self.assertEqual(entries[0]['object_repr'], str(michelin))
+        self.assertEqual(entries[0]['action'], AuditEntry.UPDATE)
+        self.assertEqual(entries[0]['changes'], {'price': [Decimal('100.00'), Decimal('110.00')]})
+        self.assertEqual((entries[0]['actor_id'], entries[0]['actor_name']), (author.pk, 'pricing'))
+
+
+class ProductUpdateTests(TestCase):
+    def test_price_is_not_changed_without_its_history_row(self):
+        self.client.force_login(User.objects.create_user('manager'))
+        product = Product.objects.create(name='Pilot', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=0)
+        form = {
+            'name': 'Pilot', 'brand': 'B', 'size': '', 'type': 'Car', 'price': '120.00',
+            'stock_quantity': 0, 'stock_shards': 0, 'description': '',
+        }
+        with mock.patch.object(ProductPriceHistory.objects, 'create', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.client.post(reverse('products:product_update', args=[product.pk]), form)
+        self.assertEqual(Product.objects.get(pk=product.pk).price, Decimal('100.00'))
+
+        self.client.post(reverse('products:product_update', args=[product.pk]), form)
+        self.assertEqual(Product.objects.get(pk=product.pk).price, Decimal('120.00'))
+        self.assertEqual(
+            list(ProductPriceHistory.objects.filter(product=product).values_list('old_price', 'new_price')),
+            [(Decimal('100.00'), Decimal('120.00'))],
+        )
+
+
+    def test_sharding_a_product_and_recounting_it_in_one_edit(self):
+        self.client.force_login(User.objects.create_user('manager'))
+        product = Product.objects.create(name='Pilot', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=5)
+        add_to_location(product, default_location(), 5)
+        form = {
+            'name': 'Pilot', 'brand': 'B', 'size': '', 'type': 'Car', 'price': '100.00',
+            'stock_quantity': 8, 'stock_shards': 2, 'description': '',
+        }
+        self.client.post(reverse('products:product_update', args=[product.pk]), form)
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, available_stock(product)), (8, 8))
+        # The live stock spread over two shards, the recount's three added to one of them
+        self.assertEqual(StockShard.objects.filter(product=product).count(), 2)
+
+        form.update(stock_quantity=6, stock_shards=0)
+        self.client.post(reverse('products:product_update', args=[product.pk]), form)
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, stock_at(product, default_location())), (6, 6))
+        self.assertFalse(StockShard.objects.filter(product=product).exists())
+
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('till')
+        cls.product = Product.objects.create(name='Pilot', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=5)
+        add_to_location(cls.product, default_location(), 5)
+
+    def test_one_cart_per_user(self):
+        cart = get_user_cart(self.user)
+        self.assertEqual(get_user_cart(self.user), cart)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, product=self.product)
+
+    def test_sweep_deletes_only_expired_carts(self):
+        fresh = get_user_cart(self.user)
+        stale = [get_user_cart(User.objects.create_user(f"idle{n}")) for n in range(3)]
+        for cart in stale:
+            CartItem.objects.create(cart=cart, product=self.product)
+        # CART_TTL_HOURS is 24
+        Cart.objects.filter(pk__in=[cart.pk for cart in stale]).update(
+            updated_at=timezone.now() - datetime.timedelta(hours=25),
+        )
+
+        self.assertEqual(sweep_stale_carts(chunk_size=2), 3)
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [fresh.pk])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_checkout_deletes_the_cart(self):
+        self.client.force_login(self.user)
+        customer = Customer.objects.create(name='Ali')
+        self.client.post(reverse('products:add_to_cart', args=[self.product.pk]), {'quantity': 2})
+        self.assertEqual(CartItem.objects.filter(cart__user=self.user).count(), 1)
+
+        self.client.post(reverse('products:cart_checkout'), {'customer_id': customer.pk})
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertFalse(CartItem.objects.exists())
+
+
+class LocationStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.main = default_location()
+        cls.branch = Location.objects.create(code='branch', name='Branch')
+        cls.product = Product.objects.create(name='Pilot', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=5)
+        add_to_location(cls.product, cls.main, 5)
+
+    def test_transfer_moves_stock_as_a_pair_of_movements(self):
+        transfer_id = transfer_stock(self.product, self.main, self.branch, 2)
+        self.assertEqual((stock_at(self.product, self.main), stock_at(self.product, self.branch)), (3, 2))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 5)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(transfer_id=transfer_id).values_list('location', 'quantity')),
+            sorted([(self.main.pk, -2), (self.branch.pk, 2)]),
+        )
+
+    def test_transfer_beyond_the_source_stock_changes_nothing(self):
+        with self.assertRaises(InsufficientStock):
+            transfer_stock(self.product, self.main, self.branch, 6)
+        self.assertEqual((stock_at(self.product, self.main), stock_at(self.product, self.branch)), (5, 0))
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_sale_needs_stock_at_its_own_location(self):
+        # Five on hand in total, none of them at the branch
+        with self.assertRaises(InsufficientStock) as raised:
+            decrement_stock(self.product, 1, self.branch)
+        self.assertEqual((raised.exception.location, raised.exception.available), (self.branch, 0))
+        self.assertEqual(stock_at(self.product, self.main), 5)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 5)
+
+        decrement_stock(self.product, 1, self.main)
+        self.assertEqual(stock_at(self.product, self.main), 4)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 4)
+
+
+class StockShardTests(TestCase):
+    def setUp(self):
+        self.main = default_location()
+        self.branch = Location.objects.create(code='branch', name='Branch')
+        self.product = Product.objects.create(
+            name='Hot', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=9, stock_shards=3,
+        )
+        # Creates the product's shards at the location
+        add_to_location(self.product, self.main, 9)
+
+    def shards(self, location=None):
+        return list(
+            StockShard.objects.filter(product=self.product, location=location or self.main)
+            .order_by('shard_no').values_list('quantity', flat=True)
+        )
+
+    def folded(self, location=None):
+        return LocationStock.objects.get(product=self.product, location=location or self.main).quantity
+
+    def test_stock_is_spread_over_the_shards(self):
+        self.assertEqual(self.shards(), [3, 3, 3])
+        self.assertEqual(self.folded(), 9)
+
+    def test_sale_goes_to_a_shard_that_covers_it(self):
+        StockShard.objects.filter(product=self.product).exclude(shard_no=2).update(quantity=0)
+        StockShard.objects.filter(product=self.product, shard_no=2).update(quantity=5)
+        decrement_stock(self.product, 2)
+        self.assertEqual(self.shards(), [0, 0, 3])
+
+    def test_sale_larger_than_any_shard_drains_several(self):
+        decrement_stock(self.product, 7)
+        self.assertEqual(sum(self.shards()), 2)
+        self.assertTrue(all(quantity >= 0 for quantity in self.shards()))
+        self.assertEqual(available_stock(self.product), 2)
+
+    def test_sale_beyond_the_shard_total_changes_nothing(self):
+        decrement_stock(self.product, 7)
+        shards = self.shards()
+        with self.assertRaises(InsufficientStock):
+            decrement_stock(self.product, 3)
+        self.assertEqual(self.shards(), shards)
+
+    def test_sale_at_one_branch_writes_only_that_branchs_shards(self):
+        transfer_stock(self.product, self.main, self.branch, 3)
+        fold_stock_shards()
+        main_shards = self.shards()
+
+        decrement_stock(self.product, 2, self.branch)
+        self.assertEqual(sum(self.shards(self.branch)), 1)
+        self.assertEqual(self.shards(), main_shards)
+        # Neither the branch's folded row nor the total is written by the sale
+        self.assertEqual((self.folded(self.branch), Product.objects.get(pk=self.product.pk).stock_quantity), (3, 9))
+        self.assertEqual((stock_at(self.product, self.branch), available_stock(self.product)), (1, 7))
+
+        with self.assertRaises(InsufficientStock) as raised:
+            decrement_stock(self.product, 2, self.branch)
+        self.assertEqual((raised.exception.location, raised.exception.available), (self.branch, 1))
+
+    def test_fold_copies_shard_totals_into_location_stock_and_the_product(self):
+        transfer_stock(self.product, self.main, self.branch, 3)
+        decrement_stock(self.product, 4)
+        # The folded rows are only brought up to date by the fold
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 9)
+        self.assertEqual(self.folded(), 9)
+        self.assertEqual(fold_stock_shards(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 5)
+        self.assertEqual((self.folded(), self.folded(self.branch)), (2, 3))
+        self.assertEqual(fold_stock_shards(), 0)
+
+    def test_changed_shard_count_keeps_the_live_stock_at_each_location(self):
+        transfer_stock(self.product, self.main, self.branch, 3)
+        decrement_stock(self.product, 1)
+        self.product.stock_shards = 2
+        reset_stock_shards(self.product)
+        self.assertEqual((self.shards(), self.shards(self.branch)), ([3, 2], [2, 1]))
+        self.assertEqual((self.folded(), self.folded(self.branch)), (5, 3))
+
+        self.product.stock_shards = 0
+        reset_stock_shards(self.product)
+        self.assertFalse(StockShard.objects.filter(product=self.product).exists())
+        self.assertEqual((stock_at(self.product, self.main), stock_at(self.product, self.branch)), (5, 3))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 8)
+
+
+def event_data(text):
+    lines = dict(line.split(': ', 1) for line in text.strip().splitlines())
+    return lines.get('id'), lines['event'], json.loads(lines['data'])
+
+
+class LiveFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Product.objects.create(name='A', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=5)
+        cls.b = Product.objects.create(name='B', brand='B', type='Car', price=Decimal('200.00'), stock_quantity=5)
+        add_to_location(cls.a, default_location(), 5)
+
+    def test_event_commits_or_rolls_back_with_the_change(self):
+        before = latest_event_id()
+        decrement_stock(self.a, 1)
+        self.assertEqual(list(ProductEvent.objects.filter(pk__gt=before).values_list('product_ids', flat=True)), [[self.a.pk]])
+
+        before = latest_event_id()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            decrement_stock(self.a, 1)
+            raise RuntimeError
+        self.assertEqual(latest_event_id(), before)
+
+    def test_replay_sends_current_values_of_everything_missed_once(self):
+        cursor = latest_event_id()
+        for pks in ([self.a.pk], [self.b.pk], [self.a.pk]):
+            publish_product_changes(pks)
+        Product.objects.filter(pk=self.a.pk).update(stock_quantity=3)
+
+        events, latest = replay_events(str(cursor))
+        self.assertEqual(latest, latest_event_id())
+        self.assertEqual([event_data(text) for text in events], [(str(latest), 'products', {'products': [
+            {'id': self.a.pk, 'stock_quantity': 3, 'price': '100.00'},
+            {'id': self.b.pk, 'stock_quantity': 5, 'price': '200.00'},
+        ]})])
+        self.assertEqual(replay_events(str(latest)), ([], latest))
+
+    def test_foreign_or_pruned_cursor_gets_a_reset(self):
+        cursor = latest_event_id()
+        publish_product_changes([self.a.pk])
+        publish_product_changes([self.b.pk])
+        latest = latest_event_id()
+        for last_event_id in ('3f2a9c1b-7', str(latest + 10)):
+            with self.subTest(last_event_id=last_event_id):
+                self.assertEqual(event_data(replay_events(last_event_id)[0][0]), (str(latest), 'reset', {}))
+
+        ProductEvent.objects.filter(pk__lte=cursor + 1).delete()
+        self.assertEqual(event_data(replay_events(str(cursor))[0][0]), (str(latest), 'reset', {}))
+        self.assertEqual(len(replay_events(str(cursor + 1))[0]), 1)
+
+    def test_state_endpoint_returns_current_values(self):
+        self.client.force_login(User.objects.create_user('till'))
+        response = self.client.get(reverse('products:product_state'), {'ids': f"{self.b.pk},{self.a.pk}"})
+        self.assertEqual([p['id'] for p in response.json()['products']], [self.a.pk, self.b.pk])
+        self.assertEqual(self.client.get(reverse('products:product_state'), {'ids': 'x'}).status_code, 400)
+        # Streams need an ASGI server; the test client's WSGI request is told not to reconnect
+        self.assertEqual(self.client.get(reverse('products:product_stream')).status_code, 204)
+
+
+class LiveStreamTests(TransactionTestCase):
+    # Changes really commit here; keep the audit writer thread out of it
+    @mock.patch('audit.recorder.get_writer')
+    async def test_change_from_any_process_reaches_an_open_stream(self, _):
+        product = await Product.objects.acreate(name='A', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=5)
+        feed = ProductFeed(poll_seconds=0.05)
+        subscription, replay = await sync_to_async(feed.subscribe)(await sync_to_async(feed.cursor)(), asyncio.get_running_loop())
+        self.assertEqual(replay, [])
+        stream = subscription.stream(replay)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+
+        # Written straight to the table, as another worker would
+        await sync_to_async(Product.objects.filter(pk=product.pk).update)(stock_quantity=2)
+        await sync_to_async(publish_product_changes)([product.pk])
+        event_id, kind, data = event_data(await asyncio.wait_for(anext(stream), 5))
+        self.assertEqual((event_id, kind), (str(await sync_to_async(latest_event_id)()), 'products'))
+        self.assertEqual(data['products'][0]['stock_quantity'], 2)
+
+        await stream.aclose()
+        self.assertEqual(feed.subscriber_count(), 0)
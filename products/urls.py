@@ -8,6 +8,7 @@ urlpatterns = [
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
     path('<int:pk>/update/', views.ProductUpdateView.as_view(), name='product_update'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
+    path('tyre-finder/', views.tyre_finder, name='tyre_finder'),
 
     # --- New Cart & Checkout Views ---
     path('cart/', views.cart_detail, name='cart_detail'),
@@ -15,4 +16,19 @@ urlpatterns = [
     path('cart/remove/<int:item_pk>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
     path('cart/checkout/', views.cart_checkout, name='cart_checkout'),
+
+    # --- Bulk repricing ---
+    path('reprice/', views.reprice, name='reprice'),
+    path('price-changes/', views.PriceChangeListView.as_view(), name='price_change_list'),
+    path('price-changes/<int:pk>/cancel/', views.price_change_cancel, name='price_change_cancel'),
+
+    # --- Stock by branch ---
+    path('stock/', views.branch_stock, name='branch_stock'),
+    path('stock/locations/create/', views.LocationCreateView.as_view(), name='location_create'),
+
+    # --- Catalog sync API ---
+    path('api/catalog/', views.catalog_sync, name='catalog_sync'),
+    # Server-sent stock and price changes for open screens
+    path('api/stream/', views.product_stream, name='product_stream'),
+    path('api/state/', views.product_state, name='product_state'),
 ]
\ No newline at end of file
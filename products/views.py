@@ -1,18 +1,41 @@
+import asyncio
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from .models import Product
 
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import JsonResponse
-from django.db.models import F
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.contrib.auth.decorators import login_required
-from .models import Product, Cart, CartItem
+from .models import Product, CartItem, Vehicle, PriceChange, ProductPriceHistory, Location, StockMovement
+from .forms import LocationForm, PriceChangeForm, StockTransferForm
+from .fitment import find_fitting_products
+from .live import EVENT_BATCH_SIZE, FEED, product_states
+from .carts import get_user_cart, touch_cart
+from .catalog import MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE, catalog_changes, catalog_lookup, catalog_state
+from .repricing import apply_price_change, cancel_price_change, preview
+from .stock import (
+    InsufficientStock, adjust_location_stock, available_stock, decrement_stock,
+    location_for_till, reset_stock_shards, transfer_stock, where_in_stock,
+)
+from .sizes import normalize_tyre_size
+from .tasks import schedule_price_change, schedule_reorder_refresh
+from my_project.asyncdb import db_query
 # Import models we need from other apps
 from customers.models import Customer 
+from sales.invoicing import assign_invoice_number
 from sales.models import Sale, SaleItem # Assuming we convert to Sale/SaleItem
+from sales.tills import current_till
 
 # List View (Read)
 class ProductListView(LoginRequiredMixin, ListView):
@@ -21,27 +44,69 @@ class ProductListView(LoginRequiredMixin, ListView):
     context_object_name = 'products'
     paginate_by = 15
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Rows are cached per (product id, updated_at), see product_list.html
+        context['cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+        # Taken before the rows are read, so the live feed replays anything committed meanwhile
+        context['live_cursor'] = FEED.cursor()
+        return context
+
 # Create View (Create)
 class ProductCreateView(LoginRequiredMixin, CreateView):
     model = Product
     template_name = 'products/product_form.html'
-    fields = ['name', 'brand', 'size', 'type', 'price', 'stock_quantity', 'description']
+    fields = ['name', 'brand', 'size', 'type', 'price', 'stock_quantity', 'stock_shards', 'description']
     success_url = reverse_lazy('products:product_list')
 
+    @transaction.atomic
     def form_valid(self, form):
+        response = super().form_valid(form)
+        # The opening stock is at this till's branch, in its shards for a sharded product
+        adjust_location_stock(
+            self.object, location_for_till(current_till(self.request)), self.object.stock_quantity, self.request.user,
+        )
         messages.success(self.request, f"Product '{form.instance.name}' added successfully.")
-        return super().form_valid(form)
+        return response
 
 # Update View (Update)
 class ProductUpdateView(LoginRequiredMixin, UpdateView):
     model = Product
     template_name = 'products/product_form.html'
-    fields = ['name', 'brand', 'size', 'type', 'price', 'stock_quantity', 'description']
+    fields = ['name', 'brand', 'size', 'type', 'price', 'stock_quantity', 'stock_shards', 'description']
     success_url = reverse_lazy('products:product_list')
 
     def form_valid(self, form):
+        # The form has already set the new figures on self.object; the database still has the old ones
+        stock_before = available_stock(Product.objects.get(pk=self.object.pk))
+        stock_after = self.object.stock_quantity
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+                # A changed shard count moves every branch's live stock into the new shards
+                # (recomputing the total from them); an edited stock figure is a new total,
+                # the difference booked at this till's branch
+                if 'stock_shards' in form.changed_data:
+                    reset_stock_shards(self.object)
+                if 'stock_quantity' in form.changed_data:
+                    adjust_location_stock(
+                        self.object, location_for_till(current_till(self.request)),
+                        stock_after - stock_before, self.request.user,
+                    )
+                    if self.object.stock_quantity != stock_after:
+                        Product.objects.filter(pk=self.object.pk).update(stock_quantity=stock_after)
+                        self.object.stock_quantity = stock_after
+                if 'price' in form.changed_data:
+                    # Committed with the new price or not at all
+                    ProductPriceHistory.objects.create(
+                        product=self.object, old_price=form.initial['price'], new_price=self.object.price,
+                        effective_at=timezone.now(), changed_by=self.request.user,
+                    )
+        except InsufficientStock as e:
+            form.add_error('stock_quantity', f"{e} Transfer stock from another branch instead.")
+            return self.form_invalid(form)
         messages.info(self.request, f"Product '{form.instance.name}' updated.")
-        return super().form_valid(form)
+        return response
 
 # Delete View (Delete)
 class ProductDeleteView(LoginRequiredMixin, DeleteView):
@@ -56,10 +121,28 @@ class ProductDeleteView(LoginRequiredMixin, DeleteView):
     
 
 
-# Utility function to get or create the user's active cart
-def get_user_cart(user):
-    cart, created = Cart.objects.get_or_create(user=user, defaults={'customer': None})
-    return cart
+# Tyre finder (vehicle fitment lookup)
+@login_required
+def tyre_finder(request):
+    make = request.GET.get('make', '').strip()
+    model = request.GET.get('model', '').strip()
+    year = request.GET.get('year', '').strip()
+
+    products = None
+    if make and model and year.isdigit():
+        products = find_fitting_products(make, model, int(year))
+
+    # Suggestions for the search inputs
+    vehicles = Vehicle.objects.order_by()
+    context = {
+        'make': make,
+        'model': model,
+        'year': year,
+        'products': products,
+        'makes': vehicles.values_list('make', flat=True).distinct().order_by('make'),
+        'models': vehicles.filter(make=make).values_list('model', flat=True).distinct().order_by('model') if make else [],
+    }
+    return render(request, 'products/tyre_finder.html', context)
 
 
 # products/views.py (Cart Management View)
@@ -91,6 +174,7 @@ def add_to_cart(request, product_pk):
         cart_item.quantity = F('quantity') + quantity
         cart_item.save()
         cart_item.refresh_from_db() # Refresh to see the new quantity
+    touch_cart(cart)
 
     messages.success(request, f"{quantity} x {product.name} added to cart.")
     return redirect('products:cart_detail') # Redirect to the cart view
@@ -102,6 +186,7 @@ def remove_from_cart(request, item_pk):
     cart = get_user_cart(request.user)
     item = get_object_or_404(CartItem, pk=item_pk, cart=cart)
     item.delete()
+    touch_cart(cart)
     messages.warning(request, f"Item removed from cart.")
     return redirect('products:cart_detail')
 
@@ -109,6 +194,7 @@ def remove_from_cart(request, item_pk):
 def clear_cart(request):
     cart = get_user_cart(request.user)
     cart.items.all().delete()
+    touch_cart(cart)
     messages.info(request, "Cart cleared.")
     return redirect('products:cart_detail')
 
@@ -121,6 +207,7 @@ def cart_detail(request):
     
     context = {
         'cart': cart,
+        'live_cursor': FEED.cursor(),
         'items': cart.items.select_related('product'),
         'customers': customers,
     }
@@ -129,7 +216,6 @@ def cart_detail(request):
 # products/views.py (Checkout View)
 @require_POST
 @login_required
-# @transaction.atomic # Ensure all database operations succeed or fail together
 def cart_checkout(request):
     cart = get_user_cart(request.user)
     
@@ -141,45 +227,235 @@ def cart_checkout(request):
     payment_method = request.POST.get('payment_method', 'CASH') # Default to CASH
     
     customer = get_object_or_404(Customer, pk=customer_id)
+    till = current_till(request)
+    location = location_for_till(till)
     
-    # 1. Create the main Sale object
-    sale = Sale.objects.create(
-        customer=customer,
-        payment_method=payment_method,
-        # total_amount will be updated below
+    try:
+        # Ensure all database operations succeed or fail together
+        with transaction.atomic():
+            # 1. Create the main Sale object
+            sale = Sale.objects.create(
+                customer=customer,
+                payment_method=payment_method,
+                till=till,
+                cashier=request.user,
+                # total_amount will be updated below
+            )
+
+            total_amount = 0
+
+            # 2. Process Cart Items, Create SaleItems, and Reduce Stock
+            for cart_item in cart.items.select_related('product'):
+                product = cart_item.product
+                quantity = cart_item.quantity
+
+                # Reduce Stock at this till's branch (final stock check; raises InsufficientStock and rolls back)
+                decrement_stock(product, quantity, location)
+
+                # Create SaleItem
+                SaleItem.objects.create(
+                    sale=sale,
+                    product=product,
+                    quantity=quantity,
+                    unit_price=product.price,
+                    subtotal=cart_item.subtotal
+                )
+
+                total_amount += cart_item.subtotal
+
+            # 3. Update Sale total, number the invoice (last, so its counter is held briefly) and clear cart
+            sale.total_amount = total_amount
+            assign_invoice_number(sale)
+            sale.save()
+            cart.delete() # The cart and its items; the next visit starts a new one
+
+            # 4. Slow follow-up work runs in the job worker, after commit
+            schedule_reorder_refresh()
+    except InsufficientStock as e:
+        messages.error(request, str(e))
+        return redirect('products:cart_detail')
+
+    messages.success(request, f"Checkout successful! Invoice {sale.invoice_code} recorded for {customer.name}.")
+    return redirect('sales:sale_detail', pk=sale.pk)
+
+
+# --- Stock by branch ---
+
+@login_required
+def branch_stock(request):
+    """Stock per location: where a size is in stock, and transfers of that size between branches."""
+    size = request.GET.get('size', '').strip()
+    size_key = normalize_tyre_size(size) if size else ''
+    form = StockTransferForm(
+        request.POST or None,
+        products=Product.objects.filter(size_key=size_key) if size_key else Product.objects.none(),
+        initial={'product': request.GET.get('product'), 'source': request.GET.get('source')},
     )
+    if request.method == 'POST' and form.is_valid():
+        data = form.cleaned_data
+        try:
+            transfer_stock(data['product'], data['source'], data['destination'], data['quantity'], request.user)
+        except InsufficientStock as e:
+            form.add_error('quantity', str(e))
+        else:
+            messages.success(
+                request, f"Moved {data['quantity']} x {data['product'].name} from {data['source']} to {data['destination']}."
+            )
+            return redirect(f"{reverse('products:branch_stock')}?{urlencode({'size': size})}")
 
-    total_amount = 0
-    
-    # 2. Process Cart Items, Create SaleItems, and Reduce Stock
-    for cart_item in cart.items.all():
-        product = cart_item.product
-        quantity = cart_item.quantity
-        
-        # Perform final stock check
-        if product.stock_quantity < quantity:
-            messages.error(request, f"Insufficient stock for {product.name}. Only {product.stock_quantity} available.")
-            raise Exception("Stock check failed during checkout.") # Rollback transaction
-            
-        # Create SaleItem
-        SaleItem.objects.create(
-            sale=sale,
-            product=product,
-            quantity=quantity,
-            unit_price=product.price,
-            subtotal=cart_item.subtotal
-        )
-        
-        total_amount += cart_item.subtotal
-        
-        # Reduce Stock
-        product.stock_quantity -= quantity
-        product.save()
-        
-    # 3. Update Sale total and clear cart
-    sale.total_amount = total_amount
-    sale.save()
-    cart.items.all().delete() # Clear the temporary cart
-
-    messages.success(request, f"Checkout successful! Sale #{sale.pk} recorded for {customer.name}.")
-    return redirect('sales:sale_detail', pk=sale.pk)
\ No newline at end of file
+    # The latest transfers by their incoming half, each with the location it came from
+    transfers = list(
+        StockMovement.objects.filter(kind=StockMovement.TRANSFER, quantity__gt=0)
+        .select_related('product', 'location', 'created_by')[:20]
+    )
+    sources = dict(
+        StockMovement.objects.filter(transfer_id__in=[t.transfer_id for t in transfers], quantity__lt=0)
+        .values_list('transfer_id', 'location__name')
+    )
+    for transfer in transfers:
+        transfer.source_name = sources.get(transfer.transfer_id)
+
+    context = {
+        'form': form,
+        'size': size,
+        'size_key': size_key,
+        'availability': list(where_in_stock(size_key)) if size_key else None,
+        'locations': Location.objects.annotate(units=Sum('stock__quantity')),
+        'transfers': transfers,
+    }
+    return render(request, 'products/branch_stock.html', context)
+
+
+class LocationCreateView(LoginRequiredMixin, CreateView):
+    model = Location
+    form_class = LocationForm
+    template_name = 'products/location_form.html'
+    success_url = reverse_lazy('products:branch_stock')
+
+    def form_valid(self, form):
+        messages.success(self.request, f"Location '{form.instance.name}' added.")
+        return super().form_valid(form)
+
+
+# --- Catalog sync API (JSON, conditional GET) ---
+
+def _catalog_state(request):
+    # Computed once per request and shared by the ETag and Last-Modified checks
+    if not hasattr(request, '_catalog_state'):
+        request._catalog_state = catalog_state()
+    return request._catalog_state
+
+
+def _catalog_etag(request, *args, **kwargs):
+    last_modified, version = _catalog_state(request)
+    return hashlib.md5(f"{version}|{request.GET.urlencode()}".encode()).hexdigest()
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return _catalog_state(request)[0]
+
+
+@login_required
+@require_GET
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog_sync(request):
+    """
+    GET ?cursor=<next_cursor>&limit=N  -> products changed/deleted since the cursor (no cursor = full catalog)
+    GET ?ids=1,2,3                     -> current state of those products
+    Answers 304 when the client's ETag/Last-Modified still match.
+    """
+    if 'ids' in request.GET:
+        try:
+            ids = [int(pk) for pk in request.GET['ids'].split(',') if pk]
+        except ValueError:
+            return JsonResponse({'error': "ids must be a comma-separated list of integers."}, status=400)
+        data = catalog_lookup(ids[:MAX_PAGE_SIZE])
+    else:
+        try:
+            limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            data = catalog_changes(request.GET.get('cursor'), limit)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    response = JsonResponse(data)
+    # Let clients keep the copy but always revalidate it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@require_GET
+async def product_stream(request):
+    """
+    Server-sent events with the stock and price of products as changes commit (see products/live.py).
+    Resumes after the Last-Event-ID header, which EventSource sends when it reconnects,
+    or after ?last_event_id= on the first connect.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would hold a thread per open screen; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    subscription, replay = await db_query(FEED.subscribe, last_event_id, asyncio.get_running_loop())
+    response = StreamingHttpResponse(subscription.stream(replay), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@require_GET
+def product_state(request):
+    """Current stock and price of ?ids=1,2,3, for a live page told to `reset` (see products/live.py)."""
+    try:
+        pks = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        return JsonResponse({'error': "ids must be comma-separated product ids."}, status=400)
+    if len(pks) > EVENT_BATCH_SIZE:
+        return JsonResponse({'error': f"At most {EVENT_BATCH_SIZE} ids."}, status=400)
+    return JsonResponse({'products': product_states(pks)})
+
+
+# --- Bulk repricing ---
+
+@login_required
+def reprice(request):
+    """Filter, preview, then apply (or schedule) a bulk price change."""
+    form = PriceChangeForm(request.POST or None)
+    summary = None
+    if request.method == 'POST' and form.is_valid():
+        change = form.save(commit=False)
+        if 'confirm' not in request.POST:
+            summary = preview(change)
+        else:
+            change.created_by = request.user
+            change.save()
+            if change.effective_at <= timezone.now():
+                count = apply_price_change(change)
+                messages.success(request, f"Repriced {count} product(s): {change}.")
+            else:
+                schedule_price_change(change)
+                messages.info(request, f"Scheduled for {timezone.localtime(change.effective_at):%Y-%m-%d %H:%M}: {change}.")
+            return redirect('products:price_change_list')
+    return render(request, 'products/reprice.html', {'form': form, 'summary': summary})
+
+
+class PriceChangeListView(LoginRequiredMixin, ListView):
+    model = PriceChange
+    template_name = 'products/price_change_list.html'
+    context_object_name = 'changes'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('created_by')
+
+
+@require_POST
+@login_required
+def price_change_cancel(request, pk):
+    change = get_object_or_404(PriceChange, pk=pk)
+    if cancel_price_change(change):
+        messages.warning(request, f"Cancelled: {change}.")
+    else:
+        messages.error(request, "That price change has already been applied or cancelled.")
+    return redirect('products:price_change_list')
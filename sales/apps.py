@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from audit.recorder import audit_changes
+        from my_project.caching import track_model_versions
+        from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment
+
+        track_model_versions(Sale, SaleItem, InstallmentPlan, InstallmentPayment)
+        audit_changes(Sale, InstallmentPlan, InstallmentPayment)
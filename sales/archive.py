@@ -0,0 +1,120 @@
+"""
+Cold archive of settled sales.
+
+``archive_settled_sales`` attaches the archive SQLite file to the default
+connection and moves sales in chunks. Each chunk is copied with
+INSERT ... SELECT into the attached database and deleted from the hot one
+in the same transaction. The customers and products the sales reference
+are copied too (first copy wins), so archived receipts still resolve
+names and prices after the hot rows change.
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.http import Http404
+
+from customers.models import Customer
+from my_project.caching import bump_model_version
+from my_project.routers import ARCHIVE_DB
+from products.models import Product
+from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment, StatementLine
+
+ARCHIVE_SCHEMA = 'archive'
+CHUNK_TABLE = 'temp.archive_chunk'
+
+
+def archive_available():
+    """True once the archive database exists and has been migrated."""
+    if not Path(settings.DATABASES[ARCHIVE_DB]['NAME']).exists():
+        return False
+    return Sale._meta.db_table in connections[ARCHIVE_DB].introspection.table_names()
+
+
+def get_sale_or_404(pk):
+    """Looks a sale up in the hot database, then in the archive."""
+    try:
+        return Sale.objects.get(pk=pk)
+    except Sale.DoesNotExist:
+        pass
+    if archive_available():
+        try:
+            return Sale.archived.get(pk=pk)
+        except Sale.DoesNotExist:
+            pass
+    raise Http404("No sale found matching the query")
+
+
+def settled_sales(cutoff):
+    """Sales before `cutoff` with nothing left to collect."""
+    return Sale.objects.filter(
+        Q(installment_plan__isnull=True) | Q(installment_plan__is_completed=True),
+        sale_date__lt=cutoff,
+    ).order_by('pk')
+
+
+def _copy_sql(model, where):
+    quote = connections['default'].ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in model._meta.concrete_fields)
+    return (
+        f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.{table} ({columns}) "
+        f"SELECT {columns} FROM main.{table} WHERE {where}"
+    )
+
+
+def _move_chunk(cursor, sale_ids):
+    cursor.execute(f"DELETE FROM {CHUNK_TABLE}")
+    cursor.executemany(f"INSERT INTO {CHUNK_TABLE} (id) VALUES (%s)", [(pk,) for pk in sale_ids])
+
+    chunk = f"(SELECT id FROM {CHUNK_TABLE})"
+    plans = f"(SELECT id FROM main.{InstallmentPlan._meta.db_table} WHERE sale_id IN {chunk})"
+
+    # Parents first, so foreign keys in the archive are satisfied
+    cursor.execute(_copy_sql(Customer, f"id IN (SELECT customer_id FROM main.{Sale._meta.db_table} WHERE id IN {chunk})"))
+    cursor.execute(_copy_sql(Product, f"id IN (SELECT product_id FROM main.{SaleItem._meta.db_table} WHERE sale_id IN {chunk})"))
+    cursor.execute(_copy_sql(Sale, f"id IN {chunk}"))
+    cursor.execute(_copy_sql(InstallmentPlan, f"sale_id IN {chunk}"))
+    cursor.execute(_copy_sql(SaleItem, f"sale_id IN {chunk}"))
+    cursor.execute(_copy_sql(InstallmentPayment, f"plan_id IN {plans}"))
+
+    # Then children first out of the hot database. Statement lines posted
+    # to a moved payment stay behind as the record of the bank credit
+    payments = f"(SELECT id FROM main.{InstallmentPayment._meta.db_table} WHERE plan_id IN {plans})"
+    cursor.execute(f"UPDATE main.{StatementLine._meta.db_table} SET payment_id = NULL WHERE payment_id IN {payments}")
+    cursor.execute(f"DELETE FROM main.{InstallmentPayment._meta.db_table} WHERE plan_id IN {plans}")
+    cursor.execute(f"DELETE FROM main.{SaleItem._meta.db_table} WHERE sale_id IN {chunk}")
+    cursor.execute(f"DELETE FROM main.{InstallmentPlan._meta.db_table} WHERE sale_id IN {chunk}")
+    cursor.execute(f"DELETE FROM main.{Sale._meta.db_table} WHERE id IN {chunk}")
+
+
+def archive_settled_sales(cutoff, chunk_size=500, progress=None):
+    """Moves every settled sale before `cutoff` to the archive. Returns the number moved."""
+    connection = connections['default']
+    archive_path = str(settings.DATABASES[ARCHIVE_DB]['NAME'])
+    moved = 0
+
+    with connection.cursor() as cursor:
+        # ATTACH/DETACH are not allowed inside a transaction
+        cursor.execute(f"ATTACH DATABASE %s AS {ARCHIVE_SCHEMA}", [archive_path])
+        try:
+            cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {CHUNK_TABLE.split('.')[1]} (id INTEGER PRIMARY KEY)")
+            while True:
+                sale_ids = list(settled_sales(cutoff).values_list('pk', flat=True)[:chunk_size])
+                if not sale_ids:
+                    break
+                with transaction.atomic():
+                    _move_chunk(cursor, sale_ids)
+                moved += len(sale_ids)
+                if progress:
+                    progress(moved)
+        finally:
+            cursor.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+    if moved:
+        # Raw SQL sends no signals
+        for model in (Sale, SaleItem, InstallmentPlan, InstallmentPayment):
+            bump_model_version(model)
+    return moved
@@ -0,0 +1,230 @@
+"""
+End-of-day close (Z-report).
+
+Each section of the report is an independent aggregate over one business
+day, so ``close_day`` computes them in parallel in a process pool, each
+process on its own DB connection. The rows come back at cashier scope
+(till + cashier) and are rolled up here to till and shop-wide totals,
+then stored as a new, immutable ZReport version.
+
+The sections read the reporting snapshot instead of the live database
+when the snapshot was taken after the business day ended, so a close
+never holds up checkout; otherwise (closing the day that just ended,
+before the next refresh) they read live.
+"""
+
+import csv
+import datetime
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import repeat
+
+from django.db import connections, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from audit.models import AuditEntry
+from maintenance.reporting import snapshot_status
+from my_project.routers import reporting_reads
+from products.models import Product
+from .models import (
+    InstallmentPayment, Sale, SaleItem, ZReport, ZReportLine, METHOD_CHOICES,
+)
+
+METHOD_LABELS = dict(METHOD_CHOICES)
+PAYMENT_TYPE_LABELS = dict(Sale.PAYMENT_CHOICES)
+
+CSV_FIELDS = ('scope', 'till', 'cashier', 'section', 'label', 'count', 'quantity', 'amount')
+
+
+def day_bounds(day):
+    """[start, end) of a business day in the shop's time zone."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def _line(section, till, cashier, label, count=0, quantity=0, amount=0):
+    return {
+        'section': section, 'till': till, 'cashier': cashier or '', 'label': label,
+        'count': count, 'quantity': quantity, 'amount': Decimal(amount or 0),
+    }
+
+
+def _sales(start, end):
+    rows = (
+        Sale.objects.filter(sale_date__gte=start, sale_date__lt=end)
+        .values('till', 'cashier__username', 'payment_method', 'payment_type')
+        .annotate(count=Count('id'), amount=Sum('total_amount'))
+        .order_by()
+    )
+    return [
+        _line(ZReportLine.SALES, row['till'], row['cashier__username'],
+              f"{METHOD_LABELS.get(row['payment_method'], row['payment_method'])} - "
+              f"{PAYMENT_TYPE_LABELS.get(row['payment_type'], row['payment_type'])}",
+              count=row['count'], amount=row['amount'])
+        for row in rows
+    ]
+
+
+def _down_payments(start, end):
+    rows = (
+        Sale.objects.filter(sale_date__gte=start, sale_date__lt=end, installment_plan__isnull=False)
+        .values('till', 'cashier__username', 'payment_method')
+        .annotate(count=Count('id'), amount=Sum('installment_plan__initial_payment'))
+        .order_by()
+    )
+    return [
+        _line(ZReportLine.DOWN_PAYMENTS, row['till'], row['cashier__username'],
+              METHOD_LABELS.get(row['payment_method'], row['payment_method']),
+              count=row['count'], amount=row['amount'])
+        for row in rows
+    ]
+
+
+def _collections(start, end):
+    # Installment payments aren't taken at a till; they only appear shop-wide
+    totals = InstallmentPayment.objects.filter(payment_date__gte=start, payment_date__lt=end).aggregate(
+        count=Count('id'), amount=Sum('amount_paid'),
+    )
+    if not totals['count']:
+        return []
+    return [_line(ZReportLine.COLLECTIONS, None, '', 'Installment payments', count=totals['count'], amount=totals['amount'])]
+
+
+def _stock_sold(start, end):
+    rows = (
+        SaleItem.objects.filter(sale__sale_date__gte=start, sale__sale_date__lt=end)
+        .values('sale__till', 'sale__cashier__username', 'product__name', 'product__size')
+        .annotate(count=Count('id'), quantity=Sum('quantity'), amount=Sum('subtotal'))
+        .order_by()
+    )
+    return [
+        _line(ZReportLine.STOCK_SOLD, row['sale__till'], row['sale__cashier__username'],
+              ' '.join(part for part in (row['product__name'], row['product__size']) if part),
+              count=row['count'], quantity=row['quantity'], amount=row['amount'])
+        for row in rows
+    ]
+
+
+def _stock_adjustments(start, end):
+    # Stock edited by hand on the product form, from the audit log; sales are ADJUST entries and excluded
+    entries = AuditEntry.objects.filter(
+        model=Product._meta.label_lower, action__in=[AuditEntry.CREATE, AuditEntry.UPDATE],
+        timestamp__gte=start, timestamp__lt=end, changes__has_key='stock_quantity',
+    ).values_list('actor_name', 'object_repr', 'changes')
+    totals = defaultdict(lambda: [0, 0])
+    for actor, product, changes in entries:
+        before, after = changes['stock_quantity']
+        totals[(actor, product)][0] += 1
+        totals[(actor, product)][1] += (after or 0) - (before or 0)
+    return [
+        _line(ZReportLine.STOCK_ADJUSTMENTS, None, actor, product, count=count, quantity=delta)
+        for (actor, product), (count, delta) in totals.items()
+    ]
+
+
+SECTIONS = {
+    ZReportLine.SALES: _sales,
+    ZReportLine.DOWN_PAYMENTS: _down_payments,
+    ZReportLine.COLLECTIONS: _collections,
+    ZReportLine.STOCK_SOLD: _stock_sold,
+    ZReportLine.STOCK_ADJUSTMENTS: _stock_adjustments,
+}
+
+
+def compute_section(section, day, reporting=False):
+    """Runs one section; also the entry point in the worker processes."""
+    token = reporting_reads.set(reporting)
+    try:
+        return SECTIONS[section](*day_bounds(day))
+    finally:
+        reporting_reads.reset(token)
+        connections.close_all()
+
+
+def snapshot_covers(day):
+    """Whether the reporting snapshot was taken after `day` ended, so it holds all of the day's sales."""
+    status = snapshot_status()
+    return status is not None and status['taken_at'] >= day_bounds(day)[1]
+
+
+def compute_sections(day, workers, reporting=False):
+    """Lines of every section, computed in `workers` processes (or inline with workers <= 1)."""
+    if workers <= 1:
+        results = [compute_section(section, day, reporting) for section in SECTIONS]
+    else:
+        # Forked processes must not share the parent's SQLite connections
+        connections.close_all()
+        with ProcessPoolExecutor(min(workers, len(SECTIONS)), mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(compute_section, SECTIONS, repeat(day), repeat(reporting)))
+    return [line for lines in results for line in lines]
+
+
+def roll_up(lines):
+    """Cashier-scope lines plus their till and shop-wide totals, as ZReportLine kwargs."""
+    totals = defaultdict(lambda: [0, 0, Decimal(0)])
+    for line in lines:
+        keys = [(ZReportLine.SHOP, '', '')]
+        if line['till'] is not None:
+            keys += [(ZReportLine.TILL, line['till'], ''), (ZReportLine.CASHIER, line['till'], line['cashier'])]
+        for scope, till, cashier in keys:
+            total = totals[(scope, till, cashier, line['section'], line['label'])]
+            total[0] += line['count']
+            total[1] += line['quantity']
+            total[2] += line['amount']
+
+    scope_order = {scope: n for n, (scope, _) in enumerate(ZReportLine.SCOPE_CHOICES)}
+    section_order = {section: n for n, section in enumerate(SECTIONS)}
+    ordered = sorted(totals.items(), key=lambda item: (
+        scope_order[item[0][0]], item[0][1], item[0][2], section_order[item[0][3]], item[0][4],
+    ))
+    return [
+        {'scope': scope, 'till': till, 'cashier': cashier, 'section': section, 'label': label,
+         'count': count, 'quantity': quantity, 'amount': amount}
+        for (scope, till, cashier, section, label), (count, quantity, amount) in ordered
+    ]
+
+
+def close_day(day, workers=4, generated_by=''):
+    """Builds and stores the Z-report for `day`. Returns the new ZReport."""
+    lines = roll_up(compute_sections(day, workers, reporting=snapshot_covers(day)))
+    shop_sales = [line for line in lines if line['scope'] == ZReportLine.SHOP and line['section'] == ZReportLine.SALES]
+
+    with transaction.atomic():
+        latest = ZReport.objects.filter(business_date=day).aggregate(version=Max('version'))['version'] or 0
+        report = ZReport.objects.create(
+            business_date=day,
+            version=latest + 1,
+            generated_by=generated_by,
+            sales_count=sum(line['count'] for line in shop_sales),
+            sales_total=sum((line['amount'] for line in shop_sales), Decimal(0)),
+        )
+        ZReportLine.objects.bulk_create(ZReportLine(report=report, **line) for line in lines)
+    return report
+
+
+def zreport_context(report):
+    """Template context for sales/zreport.html: the lines grouped into titled blocks by scope."""
+    blocks = defaultdict(list)
+    for line in report.lines.order_by('pk'):
+        if line.scope == ZReportLine.SHOP:
+            title = "Shop-wide"
+        elif line.scope == ZReportLine.TILL:
+            title = f"Till {line.till}"
+        else:
+            title = f"Till {line.till} - {line.cashier or 'unknown cashier'}"
+        blocks[title].append(line)
+    return {'report': report, 'blocks': list(blocks.items())}
+
+
+def write_csv(report, stream):
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    for line in report.lines.order_by('pk'):
+        writer.writerow([
+            line.get_scope_display(), line.till, line.cashier, line.get_section_display(),
+            line.label, line.count, line.quantity, line.amount,
+        ])
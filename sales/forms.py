@@ -63,4 +63,19 @@ class InstallmentPaymentForm(forms.ModelForm):
         fields = ['amount_paid', 'due_date']
         widgets = {
             'due_date': forms.DateInput(attrs={'type': 'date', 'readonly': 'readonly'}),
-        }
\ No newline at end of file
+        }
+
+class StatementUploadForm(forms.Form):
+    statement = forms.FileField(help_text="CSV with columns date, amount, description and optionally reference, phone.")
+
+
+class StatementPostForm(forms.Form):
+    sale = forms.IntegerField(min_value=1, label="Sale #")
+
+    def clean_sale(self):
+        sale_id = self.cleaned_data['sale']
+        plan = InstallmentPlan.objects.filter(sale_id=sale_id).first()
+        if plan is None:
+            raise forms.ValidationError(f"Sale #{sale_id} has no installment plan.")
+        self.cleaned_data['plan'] = plan
+        return sale_id
@@ -0,0 +1,303 @@
+"""
+Batched sale ingestion for tills that queue sales while offline.
+
+A batch is validated as a whole and written in one transaction: Sales,
+SaleItems and InstallmentPlans go in with bulk_create and stock for
+unsharded products is taken with a single conditional UPDATE at the
+till's location and another on the products' totals. Each sale
+carries a client-generated idempotency key; keys already stored (or
+repeated within the batch) are reported as duplicates and skipped, so a
+till can safely resend a batch whose response it never received. New
+sales are numbered in the till's invoice series for the day they were
+made, with one counter increment per day in the batch.
+"""
+
+import datetime
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from audit.recorder import record_adjustment
+from customers.models import Customer
+from my_project.caching import bump_model_version
+from products.live import publish_product_changes
+from products.models import LocationStock, Product
+from products.stock import InsufficientStock, decrement_stock, location_for_till
+from products.tasks import schedule_reorder_refresh
+from .invoicing import allocate_invoice_numbers
+from .models import Sale, SaleItem, InstallmentPlan, DEFAULT_TILL, METHOD_CHOICES, invoice_code
+
+MAX_BATCH_SIZE = 500
+
+PAYMENT_METHODS = {code for code, label in METHOD_CHOICES}
+
+
+class BatchValidationError(Exception):
+    """Raised with a list of per-sale errors; nothing has been written."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} sale(s) failed validation.")
+
+
+def _decimal(value, field):
+    try:
+        amount = Decimal(str(value))
+        # NaN and Infinity would pass quantize() and fail the comparison below
+        if not amount.is_finite():
+            raise ValueError
+        amount = amount.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{field} must be a number.")
+    if amount < 0:
+        raise ValueError(f"{field} must be a non-negative number.")
+    return amount
+
+
+def _is_id(value):
+    # JSON true would otherwise pass as pk 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _positive_int(value, field):
+    if not _is_id(value) or value <= 0:
+        raise ValueError(f"{field} must be a positive integer.")
+    return value
+
+
+def _parse_sale(data, customers, products):
+    """Turns one JSON sale into plain values, raising ValueError on the first problem."""
+    if not isinstance(data, dict):
+        raise ValueError("Each sale must be an object.")
+
+    key = data.get('idempotency_key')
+    if not isinstance(key, str) or not key or len(key) > 64:
+        raise ValueError("idempotency_key must be a non-empty string of at most 64 characters.")
+
+    customer = customers.get(data['customer_id']) if _is_id(data.get('customer_id')) else None
+    if customer is None:
+        raise ValueError(f"Unknown customer_id {data.get('customer_id')!r}.")
+
+    payment_method = data.get('payment_method', 'CASH')
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError(f"Unknown payment_method {payment_method!r}.")
+
+    sale_date = None
+    if data.get('sale_date') is not None:
+        sale_date = parse_datetime(str(data['sale_date']))
+        if sale_date is None:
+            raise ValueError("sale_date must be an ISO 8601 datetime.")
+        if sale_date.tzinfo is None:
+            sale_date = sale_date.replace(tzinfo=datetime.timezone.utc)
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("A sale needs at least one item.")
+    parsed_items = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each item must be an object.")
+        product = products.get(item['product_id']) if _is_id(item.get('product_id')) else None
+        if product is None:
+            raise ValueError(f"Unknown product_id {item.get('product_id')!r}.")
+        quantity = _positive_int(item.get('quantity'), 'quantity')
+        # Price at time of sale: what the till charged, else the current price
+        unit_price = _decimal(item['unit_price'], 'unit_price') if 'unit_price' in item else product.price
+        parsed_items.append((product, quantity, unit_price))
+
+    plan = data.get('installment_plan')
+    if plan is not None:
+        if not isinstance(plan, dict):
+            raise ValueError("installment_plan must be an object.")
+        start_date = parse_date(str(plan.get('start_date', '')))
+        if start_date is None:
+            raise ValueError("installment_plan.start_date must be an ISO 8601 date.")
+        plan = {
+            'initial_payment': _decimal(plan.get('initial_payment', 0), 'initial_payment'),
+            'num_installments': _positive_int(plan.get('num_installments'), 'num_installments'),
+            'installment_amount': _decimal(plan.get('installment_amount'), 'installment_amount'),
+            'start_date': start_date,
+        }
+
+    return {
+        'idempotency_key': key,
+        'customer': customer,
+        'payment_method': payment_method,
+        'sale_date': sale_date,
+        'items': parsed_items,
+        'installment_plan': plan,
+    }
+
+
+def ingest_sales(batch, till=DEFAULT_TILL, cashier=None):
+    """
+    Validates and records a batch of sales rung up on `till` by `cashier`. Returns one result per input sale:
+    ``{'idempotency_key', 'status': 'created' | 'duplicate', 'sale_id', 'invoice'}``.
+
+    Raises BatchValidationError (nothing written) for malformed sales and
+    InsufficientStock (rolled back) when the batch needs more stock than exists.
+    """
+    if not isinstance(batch, list) or not batch:
+        raise BatchValidationError([{'index': None, 'error': "'sales' must be a non-empty list."}])
+    if len(batch) > MAX_BATCH_SIZE:
+        raise BatchValidationError([{'index': None, 'error': f"At most {MAX_BATCH_SIZE} sales per batch."}])
+
+    # --- 1. Load every referenced row once ---
+    customer_ids = [sale.get('customer_id') for sale in batch if isinstance(sale, dict)]
+    product_ids = [
+        item.get('product_id')
+        for sale in batch if isinstance(sale, dict) and isinstance(sale.get('items'), list)
+        for item in sale['items'] if isinstance(item, dict)
+    ]
+    customers = Customer.objects.in_bulk({i for i in customer_ids if _is_id(i)})
+    products = Product.objects.in_bulk({i for i in product_ids if _is_id(i)})
+
+    # --- 2. Validate everything before writing anything ---
+    parsed, errors = [], []
+    for index, data in enumerate(batch):
+        try:
+            parsed.append(_parse_sale(data, customers, products))
+        except ValueError as e:
+            key = data.get('idempotency_key') if isinstance(data, dict) else None
+            errors.append({'index': index, 'idempotency_key': key, 'error': str(e)})
+    if errors:
+        raise BatchValidationError(errors)
+
+    location = location_for_till(till)
+    with transaction.atomic():
+        # --- 3. Drop replays (already stored, or repeated within this batch) ---
+        existing = {
+            key: (pk, invoice_code(series, number))
+            for key, pk, series, number in Sale.objects.filter(
+                idempotency_key__in=[sale['idempotency_key'] for sale in parsed],
+            ).values_list('idempotency_key', 'pk', 'invoice_series', 'invoice_number')
+        }
+        new_sales, seen = [], set(existing)
+        for sale in parsed:
+            if sale['idempotency_key'] not in seen:
+                seen.add(sale['idempotency_key'])
+                new_sales.append(sale)
+
+        if new_sales:
+            _write_sales(new_sales, till, cashier, location)
+
+    stored = {sale['idempotency_key']: (sale['object'].pk, sale['object'].invoice_code) for sale in new_sales}
+    stored.update(existing)
+    return [
+        {
+            'idempotency_key': sale['idempotency_key'],
+            'status': 'created' if sale.get('object') is not None else 'duplicate',
+            'sale_id': stored[sale['idempotency_key']][0],
+            'invoice': stored[sale['idempotency_key']][1],
+        }
+        for sale in parsed
+    ]
+
+
+def _write_sales(new_sales, till, cashier, location):
+    # --- Stock: for normal products one UPDATE at the till's location and one on the totals; hot ones per product ---
+    demand = Counter()
+    for sale in new_sales:
+        for product, quantity, unit_price in sale['items']:
+            demand[product.pk] += quantity
+    products = {product.pk: product for sale in new_sales for product, _, _ in sale['items']}
+
+    plain = {pk: qty for pk, qty in demand.items() if not products[pk].stock_shards}
+    if plain:
+        at_location = LocationStock.objects.filter(location=location, product_id__in=plain)
+        updated = at_location.update(
+            quantity=Case(
+                *(When(product_id=pk, then=F('quantity') - qty) for pk, qty in plain.items()),
+                default=F('quantity'),
+            ),
+        )
+        if updated < len(plain):
+            # Never stocked at this location
+            pk = min(set(plain) - set(at_location.values_list('product_id', flat=True)))
+            raise InsufficientStock(products[pk], plain[pk], 0, location)
+        short = at_location.filter(quantity__lt=0).first()
+        if short is not None:
+            raise InsufficientStock(
+                products[short.product_id], plain[short.product_id], short.quantity + plain[short.product_id], location,
+            )
+
+        Product.objects.filter(pk__in=plain).update(
+            stock_quantity=Case(
+                *(When(pk=pk, then=F('stock_quantity') - qty) for pk, qty in plain.items()),
+                default=F('stock_quantity'),
+            ),
+            updated_at=timezone.now(),
+        )
+        short = Product.objects.filter(pk__in=plain, stock_quantity__lt=0).first()
+        if short is not None:
+            # Raising inside the atomic block undoes the whole batch
+            raise InsufficientStock(short, plain[short.pk], short.stock_quantity + plain[short.pk])
+        for pk, qty in plain.items():
+            record_adjustment(products[pk], stock_quantity=-qty)
+        publish_product_changes(plain)
+    for pk, qty in demand.items():
+        if products[pk].stock_shards:
+            decrement_stock(products[pk], qty, location)
+
+    # --- Invoice numbers: one counter increment per business day in the batch, in batch order ---
+    by_day = defaultdict(list)
+    for sale in new_sales:
+        by_day[timezone.localdate(sale['sale_date'] or timezone.now())].append(sale)
+    for day, day_sales in by_day.items():
+        series, first = allocate_invoice_numbers(till, day, count=len(day_sales))
+        for number, sale in enumerate(day_sales, start=first):
+            sale['invoice'] = (series, number)
+
+    # --- Sales, then their items and plans, in bulk ---
+    sales = Sale.objects.bulk_create([
+        Sale(
+            customer=sale['customer'],
+            payment_method=sale['payment_method'],
+            payment_type='INST' if sale['installment_plan'] else 'FULL',
+            total_amount=sum(quantity * unit_price for _, quantity, unit_price in sale['items']),
+            idempotency_key=sale['idempotency_key'],
+            till=till,
+            cashier=cashier,
+            invoice_series=sale['invoice'][0],
+            invoice_number=sale['invoice'][1],
+        )
+        for sale in new_sales
+    ])
+    for sale, obj in zip(new_sales, sales):
+        sale['object'] = obj
+
+    # sale_date is auto_now_add, so offline timestamps are applied afterwards
+    backdated = []
+    for sale in new_sales:
+        if sale['sale_date'] is not None:
+            sale['object'].sale_date = sale['sale_date']
+            backdated.append(sale['object'])
+    if backdated:
+        Sale.objects.bulk_update(backdated, ['sale_date'])
+
+    SaleItem.objects.bulk_create([
+        SaleItem(
+            sale=sale['object'],
+            product=product,
+            quantity=quantity,
+            unit_price=unit_price,
+            subtotal=quantity * unit_price,
+        )
+        for sale in new_sales
+        for product, quantity, unit_price in sale['items']
+    ])
+    InstallmentPlan.objects.bulk_create([
+        InstallmentPlan(sale=sale['object'], **sale['installment_plan'])
+        for sale in new_sales if sale['installment_plan']
+    ])
+
+    # Bulk writes send no signals
+    def bump_versions():
+        for model in (Product, Sale, SaleItem, InstallmentPlan):
+            bump_model_version(model)
+    transaction.on_commit(bump_versions)
+    schedule_reorder_refresh()
@@ -0,0 +1,41 @@
+import datetime
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from my_project.routers import ARCHIVE_DB
+from sales.archive import archive_settled_sales
+
+
+class Command(BaseCommand):
+    help = "Moves fully settled sales older than a cutoff from db.sqlite3 into the archive database, in chunks."
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--before', help="Archive sales made before this date (YYYY-MM-DD).")
+        group.add_argument('--older-than-days', type=int, help="Archive sales older than this many days.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Sales moved per transaction.")
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError("--before must be a date in YYYY-MM-DD format.")
+        else:
+            day = timezone.localdate() - datetime.timedelta(days=options['older_than_days'])
+        cutoff = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+        # Make sure the archive has the current schema before copying into it
+        call_command('migrate', database=ARCHIVE_DB, verbosity=0)
+
+        started = time.perf_counter()
+        moved = archive_settled_sales(
+            cutoff,
+            chunk_size=options['chunk_size'],
+            progress=lambda n: self.stdout.write(f"  {n} sale(s) archived..."),
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} sale(s) made before {day} in {elapsed:.1f}s."))
@@ -0,0 +1,148 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from customers.models import Customer
+from sales.invoicing import assign_invoice_number
+from sales.models import InvoiceCounter, Sale
+
+
+class AbortedCheckout(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs parallel checkouts with and without invoice numbering, then checks every series "
+        "for gaps and duplicates and compares latencies. Some checkouts are rolled back on "
+        "purpose. Creates and deletes its own sales; run it against a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent checkouts (writer threads).")
+        parser.add_argument('--sales', type=int, default=200, help="Checkouts per thread.")
+        parser.add_argument('--tills', type=int, default=1, help="Tills the threads share; 1 puts every checkout in one series.")
+        parser.add_argument('--abort-every', type=int, default=10, help="Roll back every Nth checkout after it was numbered (0: never).")
+
+    def handle(self, *args, **options):
+        customer = Customer.objects.create(name='Invoice numbering benchmark')
+        try:
+            results = {}
+            for label, numbered in (('plain', False), ('numbered', True)):
+                results[label] = result = self._run(customer, numbered, options)
+                self.stdout.write(
+                    f"{label:>9}: {result['ops']} sales in {result['elapsed']:.2f}s "
+                    f"({result['ops'] / result['elapsed']:.0f}/s), "
+                    f"p50 {result['p50'] * 1000:.1f}ms, p95 {result['p95'] * 1000:.1f}ms, "
+                    f"max {result['max'] * 1000:.1f}ms, rolled back {result['aborted']}, "
+                    f"lock retries {result['retries']}"
+                )
+        finally:
+            Sale.objects.filter(customer=customer).delete()
+            customer.delete()
+
+        numbered = results['numbered']
+        extra = (numbered['p50'] - results['plain']['p50']) * 1000
+        self.stdout.write(f"Numbering adds {extra:.2f}ms at p50.")
+        if numbered['problems']:
+            for problem in numbered['problems']:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(numbered['series'])} series, {numbered['ops']} invoices: no gaps, no duplicates."
+            ))
+
+    def _run(self, customer, numbered, options):
+        threads, sales, abort_every = options['threads'], options['sales'], options['abort_every']
+        # Tills of their own, so real counters are never touched
+        run = uuid.uuid4().hex[:6]
+        tills = [f"bench-{run}-{n}" for n in range(options['tills'])]
+
+        latencies = []
+        counts = {'aborted': 0, 'retries': 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(threads)
+
+        def checkout(till, abort):
+            with transaction.atomic():
+                sale = Sale.objects.create(customer=customer, till=till)
+                sale.total_amount = 1
+                if numbered:
+                    assign_invoice_number(sale)
+                sale.save()
+                if abort:
+                    # e.g. a stock shortfall noticed after numbering; the number must come back
+                    raise AbortedCheckout
+
+        def worker(index):
+            till = tills[index % len(tills)]
+            own_latencies, aborted, retries = [], 0, 0
+            start_barrier.wait()
+            try:
+                for n in range(1, sales + 1):
+                    abort = abort_every > 0 and n % abort_every == 0
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            checkout(till, abort)
+                        except AbortedCheckout:
+                            aborted += 1
+                        except OperationalError:
+                            # SQLite "database is locked": back off and retry like a till would
+                            retries += 1
+                            time.sleep(0.001)
+                            continue
+                        break
+                    if not abort:
+                        own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                counts['aborted'] += aborted
+                counts['retries'] += retries
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        series, problems = defaultdict(list), []
+        if numbered:
+            rows = Sale.objects.filter(till__in=tills).values_list('invoice_series', 'invoice_number')
+            for name, number in rows:
+                series[name].append(number)
+            counters = {
+                f"{till}-{day:%Y%m%d}": last
+                for till, day, last in InvoiceCounter.objects.filter(till__in=tills).values_list('till', 'day', 'last_number')
+            }
+            for name, numbers in sorted(series.items()):
+                numbers.sort()
+                if numbers != list(range(1, len(numbers) + 1)):
+                    problems.append(f"{name}: numbers are not 1..{len(numbers)} without gaps or duplicates.")
+                if counters.get(name) != len(numbers):
+                    problems.append(f"{name}: counter at {counters.get(name)} for {len(numbers)} invoices.")
+            if sum(len(numbers) for numbers in series.values()) != len(latencies):
+                problems.append(f"{len(latencies)} checkouts committed but {len(rows)} invoices stored.")
+            InvoiceCounter.objects.filter(till__in=tills).delete()
+
+        latencies.sort()
+        return {
+            'ops': len(latencies),
+            'elapsed': elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'max': latencies[-1],
+            'aborted': counts['aborted'],
+            'retries': counts['retries'],
+            'series': series,
+            'problems': problems,
+        }
@@ -0,0 +1,133 @@
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from my_project.caching import bump_model_version
+from my_project.rows import CHUNK_SIZE
+from products.models import Product
+from sales.models import Sale, SaleItem
+from sales.reports import sale_item_rows
+
+SEED_BATCH_SIZE = 5000
+
+
+def _instances():
+    # What a report loop over a queryset costs: every line and its related rows as model instances
+    items = list(SaleItem.objects.select_related('sale__customer', 'product').order_by('sale_id', 'pk'))
+    return len(items), sum(item.subtotal for item in items)
+
+
+def _instances_iterator():
+    items = SaleItem.objects.select_related('sale__customer', 'product').order_by('sale_id', 'pk')
+    count, total = 0, 0
+    for item in items.iterator(chunk_size=CHUNK_SIZE):
+        count += 1
+        total += item.subtotal
+    return count, total
+
+
+def _rows():
+    rows = list(sale_item_rows())
+    return len(rows), sum(row.subtotal for row in rows)
+
+
+def _rows_streamed():
+    count, total = 0, 0
+    for row in sale_item_rows():
+        count += 1
+        total += row.subtotal
+    return count, total
+
+
+MODES = {
+    'instances, list': _instances,
+    'instances, iterator': _instances_iterator,
+    'rows, list': _rows,
+    'rows, streamed': _rows_streamed,
+}
+
+
+def run_mode(label):
+    """Runs one mode in a fresh worker process. Returns (lines, total, seconds, peak RSS growth in bytes)."""
+    # ru_maxrss is in KiB on Linux; the forked worker starts at the parent's size
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        started = time.perf_counter()
+        count, total = MODES[label]()
+        elapsed = time.perf_counter() - started
+    finally:
+        connections.close_all()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return count, total, elapsed, (peak - before) * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares time and peak memory of reading every sale line as model instances vs "
+        "report rows (sales/reports.py), each in a fresh process. --seed adds that many "
+        "sale lines first and deletes them afterwards; run it against a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Sale lines to add for the benchmark.")
+        parser.add_argument('--rounds', type=int, default=1, help="Runs per mode; the best is reported.")
+
+    def handle(self, *args, **options):
+        seeded_after = self.seed(options['seed']) if options['seed'] else None
+        try:
+            results = {}
+            for label in MODES:
+                runs = []
+                for _ in range(options['rounds']):
+                    connections.close_all()
+                    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as pool:
+                        runs.append(pool.submit(run_mode, label).result())
+                count, total, elapsed, peak = min(runs, key=lambda run: run[2])
+                results[label] = (count, total, elapsed, min(run[3] for run in runs))
+                self.stdout.write(
+                    f"{label:>19}: {count} lines in {elapsed:.2f}s "
+                    f"({count / elapsed if elapsed else 0:.0f}/s), peak RSS +{peak / 2 ** 20:.1f} MiB "
+                    f"({peak / count if count else 0:.0f} B/line)"
+                )
+        finally:
+            if seeded_after is not None:
+                self.unseed(seeded_after)
+
+        if len({(count, total) for count, total, _, _ in results.values()}) != 1:
+            self.stdout.write(self.style.ERROR("The modes read different lines or totals."))
+            return
+        base, rows = results['instances, list'], results['rows, streamed']
+        self.stdout.write(self.style.SUCCESS(
+            f"Streamed rows: {base[2] / rows[2]:.1f}x faster, "
+            f"{base[3] / max(rows[3], 1):.0f}x less peak memory than a list of instances."
+        ))
+
+    def seed(self, count):
+        """Adds `count` sale lines spread over the existing sales. Returns the pk they come after."""
+        sale_ids = list(Sale.objects.order_by('-pk').values_list('pk', flat=True)[:count])
+        products = list(Product.objects.values_list('pk', 'price'))
+        if not sale_ids or not products:
+            raise CommandError("--seed needs at least one sale and one product.")
+        after = SaleItem.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        started = time.perf_counter()
+        lines = zip(cycle(sale_ids), cycle(products))
+        with transaction.atomic():
+            while batch := list(islice(lines, min(SEED_BATCH_SIZE, count))):
+                SaleItem.objects.bulk_create([
+                    SaleItem(sale_id=sale_id, product_id=product_id, quantity=1, unit_price=price, subtotal=price)
+                    for sale_id, (product_id, price) in batch
+                ])
+                count -= len(batch)
+        self.stdout.write(f"Seeded sale lines in {time.perf_counter() - started:.1f}s.")
+        return after
+
+    def unseed(self, after):
+        # QuerySet.delete() would load every line to send its signals
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(SaleItem._meta.db_table)} WHERE id > %s", [after])
+        bump_model_version(SaleItem)
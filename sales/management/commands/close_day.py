@@ -0,0 +1,51 @@
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from sales.closing import SECTIONS, close_day, write_csv, zreport_context
+
+
+class Command(BaseCommand):
+    help = (
+        "Closes a business day: builds per-cashier, per-till and shop-wide Z-reports and stores them "
+        "as a new immutable report version. Optionally writes the report as HTML and CSV files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Business date to close (YYYY-MM-DD, default: today).")
+        parser.add_argument('--workers', type=int, default=min(len(SECTIONS), os.cpu_count() or 1),
+                            help="Processes computing report sections in parallel (1 = inline).")
+        parser.add_argument('--output-dir', help="Also write z-report-<date>-v<version>.html/.csv here.")
+        parser.add_argument('--user', default='', help="Name recorded as the person closing the day.")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError("--date must be a date in YYYY-MM-DD format.")
+        else:
+            day = timezone.localdate()
+
+        started = time.perf_counter()
+        report = close_day(day, workers=options['workers'], generated_by=options['user'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed {day} (version {report.version}): {report.sales_count} sale(s), "
+            f"total {report.sales_total}, {report.lines.count()} report line(s) in {elapsed:.2f}s "
+            f"({options['workers']} worker(s))."
+        ))
+
+        if options['output_dir']:
+            directory = Path(options['output_dir'])
+            directory.mkdir(parents=True, exist_ok=True)
+            stem = directory / f"z-report-{day}-v{report.version}"
+            stem.with_suffix('.html').write_text(render_to_string('sales/zreport.html', zreport_context(report)))
+            with open(stem.with_suffix('.csv'), 'w', newline='') as f:
+                write_csv(report, f)
+            self.stdout.write(f"Wrote {stem}.html and {stem}.csv")
@@ -0,0 +1,37 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from sales.statements import import_statement
+
+
+class Command(BaseCommand):
+    help = (
+        "Posts installment payments from a bank statement CSV with columns date, amount, description "
+        "and optionally reference, phone. Credits that match no plan are queued for review."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--dry-run', action='store_true', help="Match the statement without writing anything.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                stats = import_statement(csv.DictReader(f), dry_run=options['dry_run'])
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not import the statement: {e}")
+        except IntegrityError:
+            raise CommandError("Some of these rows were imported concurrently; run the import again.")
+        elapsed = time.perf_counter() - started
+        verb = "Would post" if options['dry_run'] else "Posted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {stats['read']} row(s) in {elapsed:.2f}s. {verb} {stats['posted']} payment(s), "
+            f"paying off {stats['settled']} plan(s); {stats['queued']} queued for review, "
+            f"{stats['duplicates']} already imported, {stats['debits']} debit(s) ignored."
+        ))
+        if stats['unreadable']:
+            self.stdout.write(self.style.WARNING(f"{stats['unreadable']} row(s) without a readable date and amount were skipped."))
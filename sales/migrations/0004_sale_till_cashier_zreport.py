@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('sales', '0003_sale_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('generated_at', models.DateTimeField(auto_now_add=True)),
+                ('generated_by', models.CharField(blank=True, max_length=150)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('sales_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'ordering': ['-business_date', '-version'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ZReportLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('SHOP', 'Shop-wide'), ('TILL', 'Till'), ('CASHIER', 'Cashier')], max_length=7)),
+                ('section', models.CharField(choices=[('SALES', 'Sales by payment method'), ('DOWN', 'Installment down payments'), ('COLLECT', 'Installments collected'), ('SOLD', 'Stock sold'), ('ADJUST', 'Manual stock adjustments')], max_length=7)),
+                ('till', models.CharField(blank=True, max_length=20)),
+                ('cashier', models.CharField(blank=True, max_length=150)),
+                ('label', models.CharField(max_length=200)),
+                ('count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='cashier',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='till',
+            field=models.CharField(default='MAIN', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_date'], name='sale_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='zreport',
+            constraint=models.UniqueConstraint(fields=('business_date', 'version'), name='zreport_date_version_uniq'),
+        ),
+        migrations.AddField(
+            model_name='zreportline',
+            name='report',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lines', to='sales.zreport'),
+        ),
+    ]
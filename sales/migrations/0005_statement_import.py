@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_sale_till_cashier_zreport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installmentpayment',
+            name='statement_ref',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booked_on', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('payer_phone', models.CharField(blank=True, max_length=20)),
+                ('bank_reference', models.CharField(blank=True, max_length=64)),
+                ('statement_ref', models.CharField(max_length=64, unique=True)),
+                ('reason', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('POSTED', 'Posted'), ('IGNORED', 'Ignored')], default='OPEN', max_length=7)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('imported_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_line', to='sales.installmentpayment')),
+            ],
+            options={
+                'ordering': ['booked_on', 'pk'],
+                'indexes': [models.Index(fields=['status', 'booked_on'], name='statement_line_status_idx')],
+            },
+        ),
+    ]
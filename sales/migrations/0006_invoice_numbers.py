@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_rfm_segment'),
+        ('sales', '0005_statement_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('till', models.CharField(max_length=20)),
+                ('day', models.DateField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='invoice_number',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='invoice_series',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='sale',
+            constraint=models.UniqueConstraint(fields=('invoice_series', 'invoice_number'), name='unique_invoice_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoicecounter',
+            constraint=models.UniqueConstraint(fields=('till', 'day'), name='unique_invoice_counter'),
+        ),
+    ]
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from customers.models import Customer
 from products.models import Product
+from my_project.routers import ARCHIVE_DB
 
 # Constants for payment status
 
@@ -15,6 +17,22 @@ METHOD_CHOICES = [
     (TRANSFER, 'Bank Transfer'),
 ]
 
+# Till used when a request doesn't say which counter it comes from (see sales/tills.py)
+DEFAULT_TILL = 'MAIN'
+
+def invoice_code(series, number):
+    if number is None:
+        return None
+    return f"{series}-{number:04d}"
+
+
+class ArchivedManager(models.Manager):
+    """Explicit access to rows moved to the archive database (see sales/archive.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().using(ARCHIVE_DB)
+
+
 class Sale(models.Model):
     # Choices for payment type (Full vs. Installment)
     PAYMENT_CHOICES = [
@@ -27,6 +45,55 @@ class Sale(models.Model):
     payment_method = models.CharField(max_length=10, choices=METHOD_CHOICES, default=CASH) 
     payment_type = models.CharField(max_length=4, choices=PAYMENT_CHOICES, default='FULL')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Client-generated key for sales synced from offline tills; replays are ignored
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    # Which counter and which user rang the sale up (grouping for the end-of-day close).
+    # No FK constraint: archived sales keep the id, but the archive has no user table
+    till = models.CharField(max_length=20, default=DEFAULT_TILL)
+    cashier = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='sales', db_constraint=False,
+    )
+
+    # Gapless invoice number within its series, one series per till and business day (sales/invoicing.py).
+    # Empty for sales made before invoice numbering
+    invoice_series = models.CharField(max_length=32, null=True, blank=True, editable=False)
+    invoice_number = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    objects = models.Manager()
+    archived = ArchivedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale_date'], name='sale_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['invoice_series', 'invoice_number'], name='unique_invoice_number'),
+        ]
+
+    @property
+    def invoice_code(self):
+        """The printed invoice number, e.g. 'T1-20261019-0042'; None for sales made before numbering."""
+        return invoice_code(self.invoice_series, self.invoice_number)
+
+
+class InvoiceCounter(models.Model):
+    """
+    The last invoice number issued in one series (a till's business day).
+    Checkouts take the next number by incrementing this row inside their own
+    transaction, see sales/invoicing.py.
+    """
+    till = models.CharField(max_length=20)
+    day = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['till', 'day'], name='unique_invoice_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.till} {self.day}: {self.last_number}"
 
 class SaleItem(models.Model):
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='items')
@@ -50,7 +117,12 @@ class InstallmentPlan(models.Model):
     is_completed = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"Plan for Sale {self.sale.id} ({self.num_installments} payments)"
+        return f"Plan for Sale {self.sale_id} ({self.num_installments} payments)"
+
+    @property
+    def reference(self):
+        # Customers quote this on bank transfers; the statement import matches on it
+        return f"INST-{self.sale_id}"
 
 
 class InstallmentPayment(models.Model):
@@ -69,6 +141,118 @@ class InstallmentPayment(models.Model):
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
     due_date = models.DateField()
     status = models.CharField(max_length=7, choices=INSTALLMENT_STATUS_CHOICES, default='PENDING')
+    # Set for payments posted from a bank statement (sales/statements.py); a re-imported row is skipped
+    statement_ref = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return f"Payment {self.id} for Plan {self.plan.sale_id}"
+
+
+class StatementLine(models.Model):
+    """
+    A bank statement credit the import could not match to an installment plan,
+    queued for someone to post against the right plan or ignore.
+    """
+    OPEN = 'OPEN'
+    POSTED = 'POSTED'
+    IGNORED = 'IGNORED'
+    STATUS_CHOICES = [
+        (OPEN, 'Open'),
+        (POSTED, 'Posted'),
+        (IGNORED, 'Ignored'),
+    ]
+
+    booked_on = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+    payer_phone = models.CharField(max_length=20, blank=True)
+    bank_reference = models.CharField(max_length=64, blank=True)
+    # Same key as InstallmentPayment.statement_ref, so a re-import doesn't queue the row again
+    statement_ref = models.CharField(max_length=64, unique=True)
+    reason = models.CharField(max_length=100)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=OPEN)
+    payment = models.OneToOneField(InstallmentPayment, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_line')
+    imported_at = models.DateTimeField(auto_now_add=True)
+    imported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['booked_on', 'pk']
+        indexes = [
+            models.Index(fields=['status', 'booked_on'], name='statement_line_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.booked_on} {self.amount} {self.description}"
+
+class ZReport(models.Model):
+    """
+    End-of-day close for one business date (``manage.py close_day``, see sales/closing.py).
+    Reports are never changed: closing the same day again adds a new version.
+    """
+    business_date = models.DateField()
+    version = models.PositiveIntegerField(default=1)
+    generated_at = models.DateTimeField(auto_now_add=True)
+    generated_by = models.CharField(max_length=150, blank=True)
+    sales_count = models.PositiveIntegerField(default=0)
+    sales_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-business_date', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['business_date', 'version'], name='zreport_date_version_uniq'),
+        ]
 
     def __str__(self):
-        return f"Payment {self.id} for Plan {self.plan.sale.id}"
\ No newline at end of file
+        return f"Z-report {self.business_date} v{self.version}"
+
+    def get_absolute_url(self):
+        return reverse('sales:zreport_detail', kwargs={'pk': self.pk})
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Z-reports are immutable; close the day again for a new version.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Z-reports are immutable.")
+
+
+class ZReportLine(models.Model):
+    """One figure of a Z-report, at cashier, till or shop-wide scope."""
+
+    CASHIER = 'CASHIER'
+    TILL = 'TILL'
+    SHOP = 'SHOP'
+    SCOPE_CHOICES = [
+        (SHOP, 'Shop-wide'),
+        (TILL, 'Till'),
+        (CASHIER, 'Cashier'),
+    ]
+
+    SALES = 'SALES'
+    DOWN_PAYMENTS = 'DOWN'
+    COLLECTIONS = 'COLLECT'
+    STOCK_SOLD = 'SOLD'
+    STOCK_ADJUSTMENTS = 'ADJUST'
+    SECTION_CHOICES = [
+        (SALES, 'Sales by payment method'),
+        (DOWN_PAYMENTS, 'Installment down payments'),
+        (COLLECTIONS, 'Installments collected'),
+        (STOCK_SOLD, 'Stock sold'),
+        (STOCK_ADJUSTMENTS, 'Manual stock adjustments'),
+    ]
+
+    report = models.ForeignKey(ZReport, on_delete=models.PROTECT, related_name='lines')
+    scope = models.CharField(max_length=7, choices=SCOPE_CHOICES)
+    section = models.CharField(max_length=7, choices=SECTION_CHOICES)
+    till = models.CharField(max_length=20, blank=True)
+    cashier = models.CharField(max_length=150, blank=True)
+    label = models.CharField(max_length=200)
+    count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Z-report lines are immutable.")
+        super().save(*args, **kwargs)
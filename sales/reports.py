@@ -0,0 +1,140 @@
+"""
+Report rows for sales, installment plans and sale lines.
+
+List pages and exports read these through ``my_project.rows``: plain
+values_list tuples mapped into slotted dataclasses, with the customer
+and product columns joined in the same query instead of loaded as
+related instances. Each row class keeps the names templates already use
+on the model (``pk``, ``invoice_code``, ``get_payment_type_display``), so
+a template switches by replacing ``sale.customer.name`` with
+``sale.customer_name``.
+
+``manage.py bench_report_rows`` compares these with model instances for
+time and peak memory; ``manage.py export_sale_items`` streams sale lines
+as CSV.
+"""
+
+import csv
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from my_project.rows import RowList, iter_rows
+from .models import InstallmentPlan, Sale, SaleItem, invoice_code
+
+PAYMENT_TYPE_LABELS = dict(Sale.PAYMENT_CHOICES)
+
+SALE_ITEM_CSV_FIELDS = (
+    'sale_id', 'invoice', 'sale_date', 'till', 'customer', 'product_id', 'product',
+    'brand', 'size', 'quantity', 'unit_price', 'subtotal',
+)
+
+
+@dataclass(slots=True)
+class SaleRow:
+    pk: int
+    sale_date: datetime.datetime
+    customer_name: str
+    total_amount: Decimal
+    payment_type: str
+    invoice_series: str | None
+    invoice_number: int | None
+
+    @property
+    def invoice_code(self):
+        return invoice_code(self.invoice_series, self.invoice_number)
+
+    def get_payment_type_display(self):
+        return PAYMENT_TYPE_LABELS.get(self.payment_type, self.payment_type)
+
+
+@dataclass(slots=True)
+class InstallmentRow:
+    pk: int
+    sale_id: int
+    customer_name: str
+    total_amount: Decimal
+    total_paid: Decimal
+    is_completed: bool
+
+    @property
+    def remaining_balance(self):
+        return self.total_amount - self.total_paid
+
+
+@dataclass(slots=True)
+class SaleItemRow:
+    sale_id: int
+    sale_date: datetime.datetime
+    till: str
+    invoice_series: str | None
+    invoice_number: int | None
+    customer_name: str
+    product_id: int
+    product_name: str
+    product_brand: str
+    product_size: str | None
+    quantity: int
+    unit_price: Decimal
+    subtotal: Decimal
+
+
+def sale_rows(queryset=None):
+    """Sales, newest first, as SaleRows."""
+    queryset = Sale.objects.all() if queryset is None else queryset
+    return RowList(
+        queryset.annotate(customer_name=F('customer__name')).order_by('-sale_date', '-pk'),
+        SaleRow,
+    )
+
+
+def installment_rows(queryset=None):
+    """Installment plans with their sale total and amount paid so far, newest first, as InstallmentRows."""
+    queryset = InstallmentPlan.objects.all() if queryset is None else queryset
+    return RowList(
+        queryset.annotate(
+            customer_name=F('sale__customer__name'),
+            total_amount=F('sale__total_amount'),
+            # A plan without payments has paid 0, not NULL
+            total_paid=Coalesce(Sum('payments__amount_paid'), Value(Decimal('0')), output_field=DecimalField()),
+        ).order_by('-sale_id'),
+        InstallmentRow,
+    )
+
+
+def sale_item_rows(start=None, end=None, using='default'):
+    """Streams the sale lines of sales made in [start, end), oldest first, as SaleItemRows."""
+    queryset = SaleItem.objects.using(using)
+    if start is not None:
+        queryset = queryset.filter(sale__sale_date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(sale__sale_date__lt=end)
+    queryset = queryset.annotate(
+        sale_date=F('sale__sale_date'),
+        till=F('sale__till'),
+        invoice_series=F('sale__invoice_series'),
+        invoice_number=F('sale__invoice_number'),
+        customer_name=F('sale__customer__name'),
+        product_name=F('product__name'),
+        product_brand=F('product__brand'),
+        product_size=F('product__size'),
+    ).order_by('sale_id', 'pk')
+    return iter_rows(queryset, SaleItemRow)
+
+
+def write_sale_items_csv(rows, f):
+    """Writes SaleItemRows to `f` as CSV. Returns the number of lines written."""
+    writer = csv.writer(f)
+    writer.writerow(SALE_ITEM_CSV_FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow((
+            row.sale_id, invoice_code(row.invoice_series, row.invoice_number) or '',
+            row.sale_date.isoformat(), row.till, row.customer_name, row.product_id, row.product_name,
+            row.product_brand, row.product_size or '', row.quantity, row.unit_price, row.subtotal,
+        ))
+        count += 1
+    return count
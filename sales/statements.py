@@ -0,0 +1,373 @@
+"""
+Posting installment payments from a bank statement.
+
+``import_statement`` takes the rows of a statement export (e.g. a
+csv.DictReader with columns date, amount, description and, optionally,
+reference and phone). It loads every open installment plan once, with
+its sale total, amount paid so far and customer phone, into in-memory
+indexes. Each credit is then matched without another query, trying in
+order:
+
+1. the plan reference quoted in the description, ``INST-<sale id>``;
+2. the payer's phone, taken from the phone column or the description and
+   normalized like customer phones. When the customer has several open
+   plans, the one whose installment amount equals the credit wins;
+3. the amount, when exactly one open plan has that installment amount.
+
+Matched credits are written with one bulk INSERT, and the plans they
+settle are marked completed, in the same transaction. Balances are not
+stored: as everywhere else, a plan's balance is its sale total minus its
+payments. Credits that match nothing, or match ambiguously, go to the
+StatementLine review queue, where someone posts them against the right
+plan or ignores them.
+
+Every row carries a statement_ref: the bank's own transaction reference
+when the export has one, otherwise a hash of the date, amount,
+description and the row's occurrence number among identical rows.
+Rows already posted (including payments since archived) or queued are
+skipped, so importing a statement twice, or overlapping statements, is
+harmless.
+
+The bulk writes send no signals, so the posted payments and settled
+plans are recorded in the audit log explicitly, as the importing user.
+"""
+
+import calendar
+import datetime
+import hashlib
+import re
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from audit.models import AuditEntry
+from audit.recorder import record_bulk_changes
+from customers.phones import normalize_phone
+from my_project.caching import bump_model_version
+from my_project.routers import ARCHIVE_DB
+from .archive import archive_available
+from .models import InstallmentPayment, InstallmentPlan, StatementLine
+
+LOOKUP_BATCH_SIZE = 900  # Refs per IN (...), below SQLite's parameter limit
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+
+# The plan reference (InstallmentPlan.reference) as customers type it: 'INST-42', 'inst 42', 'INST#42'
+PLAN_REFERENCE_RE = re.compile(r'\bINST[\s#-]*(\d+)', re.IGNORECASE)
+PHONE_RE = re.compile(r'\+?\d[\d\s-]{5,18}\d')
+
+# Review queue reasons
+NO_OPEN_PLAN = "No open plan for {reference}"
+SEVERAL_FOR_PHONE = "Several open plans for this phone"
+SEVERAL_FOR_AMOUNT = "Several open plans with this installment amount"
+NO_MATCH = "No matching plan"
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def add_months(day, months):
+    """`day` moved `months` ahead, clamped to the end of shorter months (Jan 31 + 1 = Feb 28/29)."""
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def next_due_date(plan, payments_made=None):
+    """Due date of the plan's next installment: one month per installment from its start date."""
+    if payments_made is None:
+        payments_made = plan.payments.count()
+    return add_months(plan.start_date, payments_made)
+
+
+def _plan_repr(sale_id, num_installments):
+    # As InstallmentPlan.__str__, without loading the plan
+    return f"Plan for Sale {sale_id} ({num_installments} payments)"
+
+
+def _audit_completed(plans, actor=None):
+    """Audits plans marked completed by update(): `plans` are (pk, sale_id, num_installments)."""
+    record_bulk_changes(
+        InstallmentPlan,
+        ((pk, _plan_repr(sale_id, num_installments), {'is_completed': [False, True]}) for pk, sale_id, num_installments in plans),
+        action=AuditEntry.UPDATE,
+        actor=actor,
+    )
+
+
+def complete_paid_plans(plan_ids):
+    """Marks the plans among `plan_ids` that are paid in full as completed. Returns how many."""
+    paid_off = list(
+        InstallmentPlan.objects.filter(pk__in=plan_ids, is_completed=False)
+        .annotate(paid=Sum('payments__amount_paid'))
+        .filter(paid__gte=F('sale__total_amount'))
+        .values_list('pk', 'sale_id', 'num_installments')
+    )
+    if not paid_off:
+        return 0
+    with transaction.atomic():
+        completed = InstallmentPlan.objects.filter(pk__in=[pk for pk, _, _ in paid_off]).update(is_completed=True)
+        _audit_completed(paid_off)
+    return completed
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(value.replace(',', ''))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite():
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def _payer_phone(phone, description):
+    if key := normalize_phone(phone):
+        return key
+    for candidate in PHONE_RE.findall(description):
+        if key := normalize_phone(candidate):
+            return key
+    return ''
+
+
+def parse_statement(rows):
+    """
+    Cleans raw statement rows. Yields one dict per row, or None for a row
+    without a readable date and amount.
+    """
+    occurrences = Counter()
+    for row in rows:
+        values = {field: (row.get(field) or '').strip() for field in ('date', 'amount', 'description', 'reference', 'phone')}
+        booked_on = _parse_date(values['date'])
+        amount = _parse_amount(values['amount'])
+        if booked_on is None or amount is None:
+            yield None
+            continue
+        description = values['description'][:255]
+        if values['reference']:
+            statement_ref = f"bank:{values['reference']}"[:64]
+        else:
+            # Two identical transfers on one day are two payments
+            occurrences[booked_on, amount, description] += 1
+            key = f"{booked_on}|{amount}|{description}|{occurrences[booked_on, amount, description]}"
+            statement_ref = f"row:{hashlib.sha1(key.encode()).hexdigest()}"
+        plan_reference = PLAN_REFERENCE_RE.search(f"{values['reference']} {description}")
+        yield {
+            'booked_on': booked_on,
+            'amount': amount,
+            'description': description,
+            'bank_reference': values['reference'][:64],
+            'phone': _payer_phone(values['phone'], description),
+            'sale_id': int(plan_reference.group(1)) if plan_reference else None,
+            'statement_ref': statement_ref,
+        }
+
+
+class PlanIndex:
+    """
+    The open installment plans, loaded with one query and matched in
+    memory. Each plan is a dict; `book` keeps its paid total and
+    installment count current as payments are matched, so a plan settled
+    earlier in the statement stops matching.
+    """
+
+    def __init__(self):
+        plans = (
+            InstallmentPlan.objects.filter(is_completed=False)
+            .annotate(
+                paid=Coalesce(Sum('payments__amount_paid'), Value(Decimal('0')), output_field=DecimalField()),
+                payments_made=Count('payments'),
+            )
+            .values('pk', 'sale_id', 'num_installments', 'installment_amount', 'start_date', 'paid', 'payments_made',
+                    total=F('sale__total_amount'), phone_key=F('sale__customer__phone_key'))
+        )
+        self.by_sale = {}
+        self.by_phone = defaultdict(list)
+        self.by_amount = defaultdict(list)
+        for plan in plans:
+            self.by_sale[plan['sale_id']] = plan
+            if plan['phone_key']:
+                self.by_phone[plan['phone_key']].append(plan)
+            self.by_amount[plan['installment_amount']].append(plan)
+
+    @staticmethod
+    def _open(plans):
+        return [plan for plan in plans if plan['paid'] < plan['total']]
+
+    def match(self, line):
+        """Returns (plan, None) for the plan `line` pays, or (None, reason) when there isn't exactly one."""
+        if line['sale_id'] is not None:
+            plan = self.by_sale.get(line['sale_id'])
+            if plan and self._open([plan]):
+                return plan, None
+            return None, NO_OPEN_PLAN.format(reference=f"INST-{line['sale_id']}")
+
+        if line['phone']:
+            candidates = self._open(self.by_phone.get(line['phone'], ()))
+            if len(candidates) > 1:
+                candidates = [plan for plan in candidates if plan['installment_amount'] == line['amount']]
+                if len(candidates) != 1:
+                    return None, SEVERAL_FOR_PHONE
+            if candidates:
+                return candidates[0], None
+
+        candidates = self._open(self.by_amount.get(line['amount'], ()))
+        if len(candidates) == 1:
+            return candidates[0], None
+        return None, SEVERAL_FOR_AMOUNT if candidates else NO_MATCH
+
+    def book(self, plan, amount):
+        """Records a matched payment against `plan`. Returns its due date and whether it settles the plan."""
+        due_date = add_months(plan['start_date'], plan['payments_made'])
+        plan['payments_made'] += 1
+        plan['paid'] += amount
+        return due_date, plan['paid'] >= plan['total']
+
+
+def _known_refs(refs):
+    payments = [InstallmentPayment.objects]
+    if archive_available():
+        # Payments of settled plans may have moved to the archive since they were posted
+        payments.append(InstallmentPayment.objects.using(ARCHIVE_DB))
+    known = set()
+    for chunk in _chunks(refs, LOOKUP_BATCH_SIZE):
+        for manager in payments:
+            known.update(manager.filter(statement_ref__in=chunk).values_list('statement_ref', flat=True))
+        known.update(StatementLine.objects.filter(statement_ref__in=chunk).values_list('statement_ref', flat=True))
+    return known
+
+
+def _booked_at(day):
+    # Midday, so the booking day survives conversion to any time zone
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+
+
+def import_statement(rows, user=None, dry_run=False):
+    """
+    Posts the credits in `rows` to their installment plans and queues the
+    rest for review. Returns a Counter: read, posted, queued, settled
+    (plans paid off), duplicates (already imported), debits (not credits,
+    ignored) and unreadable.
+    """
+    stats = Counter()
+    lines = []
+    for line in parse_statement(rows):
+        stats['read'] += 1
+        if line is None:
+            stats['unreadable'] += 1
+        elif line['amount'] <= 0:
+            stats['debits'] += 1
+        else:
+            lines.append(line)
+
+    # Lookups happen before the transaction, which then only writes
+    known = _known_refs([line['statement_ref'] for line in lines])
+    index = PlanIndex()
+    payments, queued, settled = [], [], []
+    posted = []  # (booked_on, sale id) per payment, for the audit log
+    posted_on = defaultdict(list)
+    for line in lines:
+        if line['statement_ref'] in known:
+            stats['duplicates'] += 1
+            continue
+        known.add(line['statement_ref'])
+        plan, reason = index.match(line)
+        if plan is None:
+            queued.append(StatementLine(
+                booked_on=line['booked_on'],
+                amount=line['amount'],
+                description=line['description'],
+                payer_phone=line['phone'],
+                bank_reference=line['bank_reference'],
+                statement_ref=line['statement_ref'],
+                reason=reason,
+                imported_by=user,
+            ))
+            continue
+        due_date, paid_off = index.book(plan, line['amount'])
+        posted_on[line['booked_on']].append(line['statement_ref'])
+        posted.append((line['booked_on'], plan['sale_id']))
+        if paid_off:
+            settled.append(plan)
+        payments.append(InstallmentPayment(
+            plan_id=plan['pk'],
+            amount_paid=line['amount'],
+            due_date=due_date,
+            status=InstallmentPayment.PAID,
+            statement_ref=line['statement_ref'],
+        ))
+    stats['posted'], stats['queued'], stats['settled'] = len(payments), len(queued), len(settled)
+    if dry_run or not (payments or queued):
+        return stats
+
+    with transaction.atomic():
+        InstallmentPayment.objects.bulk_create(payments, batch_size=LOOKUP_BATCH_SIZE)
+        # payment_date is auto_now_add; the customer paid on the booking day
+        for day, refs in posted_on.items():
+            for chunk in _chunks(refs, LOOKUP_BATCH_SIZE):
+                InstallmentPayment.objects.filter(statement_ref__in=chunk).update(payment_date=_booked_at(day))
+        if settled:
+            InstallmentPlan.objects.filter(pk__in=[plan['pk'] for plan in settled]).update(is_completed=True)
+        StatementLine.objects.bulk_create(queued, batch_size=LOOKUP_BATCH_SIZE)
+
+        # The same entries a save() of each payment and plan would have recorded
+        record_bulk_changes(
+            InstallmentPayment,
+            (
+                (payment.pk, f"Payment {payment.pk} for Plan {sale_id}", {
+                    'plan_id': [None, payment.plan_id],
+                    'payment_date': [None, _booked_at(booked_on)],
+                    'amount_paid': [None, payment.amount_paid],
+                    'due_date': [None, payment.due_date],
+                    'status': [None, payment.status],
+                    'statement_ref': [None, payment.statement_ref],
+                })
+                for payment, (booked_on, sale_id) in zip(payments, posted)
+            ),
+            action=AuditEntry.CREATE,
+            actor=user,
+        )
+        _audit_completed([(plan['pk'], plan['sale_id'], plan['num_installments']) for plan in settled], user)
+
+        # Bulk writes send no signals
+        def bump_versions():
+            for model in (InstallmentPayment, InstallmentPlan, StatementLine):
+                bump_model_version(model)
+        transaction.on_commit(bump_versions)
+    return stats
+
+
+def post_statement_line(line, plan):
+    """Posts a queued statement line as a payment against `plan`. Returns the payment."""
+    with transaction.atomic():
+        payment = InstallmentPayment.objects.create(
+            plan=plan,
+            amount_paid=line.amount,
+            due_date=next_due_date(plan),
+            status=InstallmentPayment.PAID,
+            statement_ref=line.statement_ref,
+        )
+        InstallmentPayment.objects.filter(pk=payment.pk).update(payment_date=_booked_at(line.booked_on))
+        line.status = StatementLine.POSTED
+        line.payment = payment
+        line.save(update_fields=['status', 'payment'])
+        complete_paid_plans([plan.pk])
+        transaction.on_commit(lambda: bump_model_version(InstallmentPlan))
+    return payment
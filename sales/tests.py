@@ -1,3 +1,277 @@
-from django.test import TestCase
+import datetime
+import io
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from audit.models import AuditEntry
+from customers.models import Customer
+from customers.phones import normalize_phone
+from products.models import Product
+from my_project.routers import REPORTING_DB
+from products.stock import add_to_location, default_location, stock_at
+from .closing import close_day
+from .ingest import BatchValidationError, ingest_sales
+from .invoicing import allocate_invoice_numbers
+from .models import InstallmentPayment, InstallmentPlan, InvoiceCounter, Sale, SaleItem, ZReportLine
+from .statements import (
+    NO_MATCH, NO_OPEN_PLAN, SEVERAL_FOR_AMOUNT, SEVERAL_FOR_PHONE, PlanIndex, import_statement,
+)
+
+
+class IngestSalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Ali')
+        cls.product = Product.objects.create(name='Tyre', brand='B', type='Car', price=Decimal('100.00'), stock_quantity=10)
+        add_to_location(cls.product, default_location(), 10)
+
+    def sale(self, key, **overrides):
+        return {
+            'idempotency_key': key,
+            'customer_id': self.customer.pk,
+            'items': [{'product_id': self.product.pk, 'quantity': 1}],
+            **overrides,
+        }
+
+    def test_resent_batch_is_reported_as_duplicates(self):
+        first = ingest_sales([self.sale('a'), self.sale('b')])
+        again = ingest_sales([self.sale('a'), self.sale('b')])
+
+        self.assertEqual([r['status'] for r in first], ['created', 'created'])
+        self.assertEqual([r['status'] for r in again], ['duplicate', 'duplicate'])
+        self.assertEqual([(r['sale_id'], r['invoice']) for r in again], [(r['sale_id'], r['invoice']) for r in first])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(SaleItem.objects.count(), 2)
+        # Stock is taken once, not per delivery
+        self.assertEqual(stock_at(self.product, default_location()), 8)
+
+    def test_key_repeated_within_a_batch_is_stored_once(self):
+        results = ingest_sales([self.sale('a'), self.sale('a')])
+
+        self.assertEqual([r['status'] for r in results], ['created', 'duplicate'])
+        self.assertEqual(results[0]['sale_id'], results[1]['sale_id'])
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_replay_among_new_sales_only_writes_the_new_ones(self):
+        ingest_sales([self.sale('a')])
+        results = ingest_sales([self.sale('a'), self.sale('b')])
+
+        self.assertEqual([r['status'] for r in results], ['duplicate', 'created'])
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_non_finite_price_is_a_validation_error(self):
+        for price in ('NaN', 'Infinity', '-inf'):
+            with self.subTest(price=price), self.assertRaises(BatchValidationError) as raised:
+                ingest_sales([self.sale('a', items=[{'product_id': self.product.pk, 'quantity': 1, 'unit_price': price}])])
+            self.assertEqual(raised.exception.errors[0]['error'], "unit_price must be a number.")
+        self.assertFalse(Sale.objects.exists())
+
+    def test_boolean_ids_are_rejected(self):
+        with self.assertRaises(BatchValidationError):
+            ingest_sales([self.sale('a', customer_id=True)])
+        with self.assertRaises(BatchValidationError):
+            ingest_sales([self.sale('a', items=[{'product_id': True, 'quantity': 1}])])
+        self.assertFalse(Sale.objects.exists())
+
+
+def make_plan(customer, total, installment):
+    sale = Sale.objects.create(customer=customer, total_amount=Decimal(total), payment_type='INST')
+    return InstallmentPlan.objects.create(
+        sale=sale, num_installments=3, installment_amount=Decimal(installment), start_date=datetime.date(2026, 1, 15),
+    )
+
+
+@mock.patch('sales.statements.archive_available', return_value=False)
+class StatementMatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ali = Customer.objects.create(name='Ali', phone='0300 1234567')
+        cls.sara = Customer.objects.create(name='Sara', phone='0300 7654321')
+        cls.walk_in = Customer.objects.create(name='Walk-in')
+        cls.ali_plan = make_plan(cls.ali, 300, 100)
+        cls.sara_small = make_plan(cls.sara, 150, 50)
+        cls.sara_large = make_plan(cls.sara, 240, 80)
+        cls.walk_in_plan = make_plan(cls.walk_in, 300, 100)
+
+    def match(self, amount, sale_id=None, phone=''):
+        plan, reason = PlanIndex().match({'amount': Decimal(amount), 'sale_id': sale_id, 'phone': normalize_phone(phone)})
+        return (plan['pk'] if plan else None), reason
+
+    def test_reference_wins_over_phone_and_amount(self, _):
+        self.assertEqual(self.match('50', sale_id=self.ali_plan.sale_id, phone=self.sara.phone), (self.ali_plan.pk, None))
+
+    def test_reference_to_a_closed_plan_is_queued(self, _):
+        InstallmentPlan.objects.filter(pk=self.ali_plan.pk).update(is_completed=True)
+        self.assertEqual(self.match('100', sale_id=self.ali_plan.sale_id), (None, NO_OPEN_PLAN.format(reference=f"INST-{self.ali_plan.sale_id}")))
+
+    def test_phone_with_one_open_plan(self, _):
+        self.assertEqual(self.match('100', phone='+92 300 1234567'), (self.ali_plan.pk, None))
+
+    def test_phone_with_several_plans_needs_the_installment_amount(self, _):
+        self.assertEqual(self.match('80', phone=self.sara.phone), (self.sara_large.pk, None))
+        self.assertEqual(self.match('99', phone=self.sara.phone), (None, SEVERAL_FOR_PHONE))
+
+    def test_amount_alone_must_be_unambiguous(self, _):
+        self.assertEqual(self.match('50'), (self.sara_small.pk, None))
+        self.assertEqual(self.match('100'), (None, SEVERAL_FOR_AMOUNT))
+        self.assertEqual(self.match('7'), (None, NO_MATCH))
+
+    def test_plan_settled_earlier_in_the_statement_stops_matching(self, _):
+        index = PlanIndex()
+        line = {'amount': Decimal('300'), 'sale_id': self.ali_plan.sale_id, 'phone': ''}
+        plan, _ = index.match(line)
+        self.assertEqual(index.book(plan, Decimal('300')), (datetime.date(2026, 1, 15), True))
+        self.assertEqual(index.match(line)[0], None)
+
+    def test_import_audits_payments_and_settled_plans_as_the_importer(self, _):
+        user = User.objects.create_user('clerk')
+        rows = [
+            {'date': '2026-02-15', 'amount': '300', 'description': f"INST-{self.ali_plan.sale_id}", 'reference': 'TX1'},
+            {'date': '2026-02-16', 'amount': '50', 'description': 'Sara'},
+        ]
+        writer = mock.Mock()
+        with mock.patch('audit.recorder.get_writer', return_value=writer), \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = import_statement(rows, user=user)
+
+        self.assertEqual((stats['posted'], stats['settled']), (2, 1))
+        entries = [call.args[0] for call in writer.put.call_args_list]
+        payments = {entry['object_id']: entry for entry in entries if entry['model'] == 'sales.installmentpayment'}
+        self.assertEqual(set(payments), {str(pk) for pk in InstallmentPayment.objects.values_list('pk', flat=True)})
+        self.assertTrue(all(entry['action'] == AuditEntry.CREATE for entry in payments.values()))
+        posted = InstallmentPayment.objects.get(statement_ref='bank:TX1')
+        self.assertEqual(payments[str(posted.pk)]['changes']['amount_paid'], [None, Decimal('300.00')])
+        self.assertEqual(payments[str(posted.pk)]['object_repr'], str(posted))
+
+        plans = [entry for entry in entries if entry['model'] == 'sales.installmentplan']
+        self.assertEqual([(p['object_id'], p['action'], p['changes']) for p in plans],
+                         [(str(self.ali_plan.pk), AuditEntry.UPDATE, {'is_completed': [False, True]})])
+        self.assertEqual(plans[0]['object_repr'], str(self.ali_plan))
+        self.assertTrue(all(entry['actor_name'] == 'clerk' for entry in entries))
+
+
+class AbortedCheckout(Exception):
+    pass
+
+
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    # Sales really commit here; keep the audit writer thread out of it
+    @mock.patch('audit.recorder.get_writer')
+    def test_parallel_checkouts_leave_each_series_gapless(self, _):
+        customer = Customer.objects.create(name='Walk-in')
+        tills, threads, checkouts, abort_every = ['T1', 'T2'], 6, 12, 4
+        start = threading.Barrier(threads)
+
+        def checkout(till, abort):
+            with transaction.atomic():
+                sale = Sale.objects.create(customer=customer, till=till, total_amount=1)
+                sale.invoice_series, sale.invoice_number = allocate_invoice_numbers(till)
+                sale.save()
+                if abort:
+                    raise AbortedCheckout
+
+        def worker(index):
+            till = tills[index % len(tills)]
+            # All threads race for the first number of the day, so also for creating the counters
+            start.wait()
+            try:
+                for n in range(1, checkouts + 1):
+                    while True:
+                        try:
+                            checkout(till, n % abort_every == 0)
+                        except AbortedCheckout:
+                            pass
+                        except OperationalError:
+                            # The shared-cache test database reports a busy table at once instead of waiting
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        series = defaultdict(list)
+        for name, number in Sale.objects.values_list('invoice_series', 'invoice_number'):
+            series[name].append(number)
+        committed = threads // len(tills) * (checkouts - checkouts // abort_every)
+        self.assertEqual(len(series), len(tills))
+        for name, numbers in series.items():
+            with self.subTest(series=name):
+                self.assertEqual(sorted(numbers), list(range(1, committed + 1)))
+        self.assertEqual(sorted(InvoiceCounter.objects.values_list('last_number', flat=True)), [committed] * len(tills))
+
+
+class ReportingReadsTests(TransactionTestCase):
+    # The test 'reporting' database mirrors 'default'; what matters is which connection runs the queries.
+    # Data really commits here, since the mirror connection can't see (or read past) an open transaction.
+    databases = {'default', REPORTING_DB}
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager'))
+        status = {'taken_at': timezone.now(), 'age': datetime.timedelta(0), 'stale': False}
+        # Wherever it was imported by name
+        for target in ('maintenance.reporting', 'sales.closing', 'sales.management.commands.export_sale_items'):
+            patcher = mock.patch(f'{target}.snapshot_status', return_value=status)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertReadsReporting(self, run, table):
+        with CaptureQueriesContext(connections['default']) as live, \
+                CaptureQueriesContext(connections[REPORTING_DB]) as snapshot:
+            run()
+        self.assertTrue(any(table in query['sql'] for query in snapshot.captured_queries))
+        self.assertFalse(any(f'FROM "{table}"' in query['sql'] for query in live.captured_queries))
+
+    def test_report_pages_read_the_snapshot(self):
+        for name, table in (('sales:sale_list', 'sales_sale'), ('sales:installment_list', 'sales_installmentplan')):
+            with self.subTest(page=name):
+                self.assertReadsReporting(lambda: self.assertEqual(self.client.get(reverse(name)).status_code, 200), table)
+
+    def test_sale_line_export_reads_the_snapshot(self):
+        self.assertReadsReporting(lambda: call_command('export_sale_items', stdout=io.StringIO(), stderr=io.StringIO()), 'sales_saleitem')
+
+    def test_closing_a_past_day_reads_the_snapshot(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        self.assertReadsReporting(lambda: close_day(yesterday, workers=1), 'sales_saleitem')
+
+    def test_closing_a_day_the_snapshot_does_not_cover_reads_live(self):
+        with CaptureQueriesContext(connections[REPORTING_DB]) as snapshot:
+            close_day(timezone.localdate(), workers=1)
+        self.assertEqual(snapshot.captured_queries, [])
+
+
+class CloseDayTests(TransactionTestCase):
+    # close_day closes the connections its sections used, so it can't run inside a test transaction
+
+    @mock.patch('audit.recorder.get_writer')
+    @mock.patch('sales.closing.snapshot_status', return_value=None)
+    def test_stock_sold_is_labelled_by_name_and_size(self, *_):
+        customer = Customer.objects.create(name='Ali')
+        sized = Product.objects.create(name='Pilot', brand='B', size='205/55R16', type='Car', price=Decimal('100.00'))
+        unsized = Product.objects.create(name='Valve', brand='B', type='Part', price=Decimal('5.00'))
+        sale = Sale.objects.create(customer=customer, total_amount=Decimal('210.00'))
+        SaleItem.objects.create(sale=sale, product=sized, quantity=2, unit_price=Decimal('100.00'), subtotal=Decimal('200.00'))
+        SaleItem.objects.create(sale=sale, product=unsized, quantity=2, unit_price=Decimal('5.00'), subtotal=Decimal('10.00'))
+
+        report = close_day(timezone.localdate(), workers=1)
+
+        sold = report.lines.filter(scope=ZReportLine.SHOP, section=ZReportLine.STOCK_SOLD)
+        self.assertEqual(
+            sorted(sold.values_list('label', 'quantity', 'amount')),
+            [('Pilot 205/55R16', 2, Decimal('200.00')), ('Valve', 2, Decimal('10.00'))],
+        )
+        self.assertEqual((report.sales_count, report.sales_total), (1, Decimal('210.00')))
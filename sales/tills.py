@@ -0,0 +1,18 @@
+"""
+Which till (counter) a request comes from.
+
+Till clients send an ``X-Till`` header; browsers on a counter machine carry
+a ``till`` cookie set once when the machine is set up. Anything else is
+recorded against DEFAULT_TILL.
+"""
+
+import re
+
+from .models import DEFAULT_TILL
+
+TILL_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,20}$')
+
+
+def current_till(request):
+    till = (request.headers.get('X-Till') or request.COOKIES.get('till') or '').strip()
+    return till if TILL_PATTERN.match(till) else DEFAULT_TILL
@@ -13,4 +13,12 @@ urlpatterns = [
     path('installments/', views.InstallmentListView.as_view(), name='installment_list'),
     # Route to pay against a specific InstallmentPlan (uses its PK)
     path('installments/<int:pk>/pay/', views.InstallmentPaymentCreateView.as_view(), name='installment_pay'),
+    # Bank statement import and the review queue of unmatched credits
+    path('installments/statement/', views.statement_review, name='statement_review'),
+    path('installments/statement/<int:pk>/', views.statement_line_action, name='statement_line_action'),
+    # End-of-day close (manage.py close_day)
+    path('z-reports/', views.ZReportListView.as_view(), name='zreport_list'),
+    path('z-reports/<int:pk>/', views.zreport_detail, name='zreport_detail'),
+    # JSON API for offline-capable tills
+    path('api/batch/', views.sale_batch_ingest, name='sale_batch_ingest'),
 ]
\ No newline at end of file
@@ -1,17 +1,37 @@
+import csv
+import io
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from django.db.models import Sum, F
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
+from django.db.models import Sum
 from django.forms import inlineformset_factory
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.contrib import messages
+from django.core.paginator import Paginator
 
 # We assume these models and forms are defined and imported correctly
-from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment
-from .forms import SaleForm, SaleItemForm, InstallmentPlanForm, InstallmentPaymentForm 
+from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment, StatementLine, ZReport
+from .archive import get_sale_or_404
+from .closing import write_csv, zreport_context
+from .ingest import BatchValidationError, ingest_sales
+from .invoicing import assign_invoice_number
+from .reports import installment_rows, sale_rows
+from .statements import complete_paid_plans, import_statement, next_due_date, post_statement_line
+from .tills import current_till
+from .forms import SaleForm, SaleItemForm, InstallmentPlanForm, InstallmentPaymentForm, StatementPostForm, StatementUploadForm
 from products.models import Product # Crucial for stock management
+from products.stock import InsufficientStock, decrement_stock, location_for_till
+from products.tasks import schedule_reorder_refresh
+from customers.models import Customer
+from my_project.caching import VersionedCacheMixin, bump_model_version
+from maintenance.reporting import reads_from_reporting
 
 # Define the SaleItem Formset (to add multiple products to one sale)
 SaleItemFormSet = inlineformset_factory(
@@ -24,17 +44,26 @@ SaleItemFormSet = inlineformset_factory(
 
 # --- 1. Sale Views (Main Transactions) ---
 
-class SaleListView(LoginRequiredMixin, ListView):
-    model = Sale
+@method_decorator(reads_from_reporting, name='dispatch')
+class SaleListView(LoginRequiredMixin, VersionedCacheMixin, ListView):
+    cache_models = (Sale, Customer)
     template_name = 'sales/sale_list.html'
     context_object_name = 'sales'
-    ordering = ['-sale_date']
+    paginate_by = 50
+
+    def get_queryset(self):
+        # Read-only rows (sales/reports.py), one query per page with the customer joined
+        return sale_rows()
 
 class SaleDetailView(LoginRequiredMixin, DetailView):
     model = Sale
     template_name = 'sales/sale_detail.html'
     context_object_name = 'sale'
 
+    def get_object(self, queryset=None):
+        # Old sales may have been moved to the archive database
+        return get_sale_or_404(self.kwargs['pk'])
+
 # The complex view handling Sale, SaleItem Formset, and Stock Management
 class SaleCreateView(LoginRequiredMixin, CreateView):
     model = Sale
@@ -61,85 +90,214 @@ class SaleCreateView(LoginRequiredMixin, CreateView):
         # Crucial check: all components must be valid
         if items_formset.is_valid() and installment_form.is_valid():
             
-            with transaction.atomic():
-                # 1. Save the main Sale object
-                self.object = form.save()
-                total_sale_amount = 0
-                
-                # 2. Process Sale Items, Reduce Stock, and Calculate Total
-                for item_form in items_formset:
-                    if item_form.cleaned_data and not item_form.cleaned_data.get('DELETE', False):
-                        sale_item = item_form.save(commit=False)
-                        sale_item.sale = self.object
-                        sale_item.save()
-                        
-                        total_sale_amount += sale_item.subtotal
-                        
-                        # --- STOCK MANAGEMENT (Core Logic) ---
-                        product = sale_item.product
-                        product.stock_quantity -= sale_item.quantity
-                        product.save()
-                
-                # Update total_amount on the Sale object
-                self.object.total_amount = total_sale_amount
-                self.object.save()
-                
-                # 3. Handle Installment Plan
-                if self.request.POST.get('is_installment_sale') == 'on':
-                    installment_plan = installment_form.save(commit=False)
-                    installment_plan.sale = self.object
-                    installment_plan.save()
+            # Looked up before the transaction: its first statement should be a write
+            till = current_till(self.request)
+            location = location_for_till(till)
+            try:
+                with transaction.atomic():
+                    # 1. Save the main Sale object
+                    form.instance.till = till
+                    form.instance.cashier = self.request.user
+                    self.object = form.save()
+                    total_sale_amount = 0
                     
-                messages.success(self.request, f"Sale #{self.object.pk} created successfully and stock updated.")
-                return redirect(self.get_success_url())
+                    # 2. Process Sale Items, Reduce Stock, and Calculate Total
+                    for item_form in items_formset:
+                        if item_form.cleaned_data and not item_form.cleaned_data.get('DELETE', False):
+                            sale_item = item_form.save(commit=False)
+                            sale_item.sale = self.object
+                            sale_item.save()
+                            
+                            total_sale_amount += sale_item.subtotal
+                            
+                            # --- STOCK MANAGEMENT (Core Logic) ---
+                            decrement_stock(sale_item.product, sale_item.quantity, location)
+                    
+                    # Update total_amount on the Sale object and number the invoice
+                    self.object.total_amount = total_sale_amount
+                    assign_invoice_number(self.object)
+                    self.object.save()
+                    
+                    # 3. Handle Installment Plan
+                    if self.request.POST.get('is_installment_sale') == 'on':
+                        installment_plan = installment_form.save(commit=False)
+                        installment_plan.sale = self.object
+                        installment_plan.save()
+
+                    schedule_reorder_refresh()
+            except InsufficientStock as e:
+                # The whole sale was rolled back; let the user fix the quantities
+                self.object = None
+                form.instance.pk = None
+                messages.error(self.request, str(e))
+                return self.render_to_response(self.get_context_data(form=form))
+
+            messages.success(self.request, f"Invoice {self.object.invoice_code} created successfully and stock updated.")
+            return redirect(self.get_success_url())
         else:
             # Re-render with errors if any form/formset is invalid
             return self.render_to_response(self.get_context_data(form=form))
 
 # --- 2. Installment Views (Payment Tracking) ---
 
-class InstallmentListView(LoginRequiredMixin, ListView):
-    model = InstallmentPlan
+@method_decorator(reads_from_reporting, name='dispatch')
+class InstallmentListView(LoginRequiredMixin, VersionedCacheMixin, ListView):
+    cache_models = (InstallmentPlan, InstallmentPayment, Sale, Customer)
     template_name = 'sales/installment_list.html'
     context_object_name = 'plans'
+    paginate_by = 50
 
     def get_queryset(self):
-        # Annotate queryset to calculate remaining balance
-        return InstallmentPlan.objects.annotate(
-            total_paid=Sum('payments__amount_paid')
-        ).annotate(
-            remaining_balance=F('sale__total_amount') - F('total_paid')
-        ).all()
+        # Amount paid is summed in the same query; the row computes the remaining balance
+        return installment_rows()
 
 # View for Creating a Payment against an Installment Plan
 class InstallmentPaymentCreateView(LoginRequiredMixin, CreateView):
     model = InstallmentPayment
     form_class = InstallmentPaymentForm
-    template_name = 'sales/installment_pay_form.html'
+    template_name = 'sales/installment_payment_form.html'
     success_url = reverse_lazy('sales:installment_list')
 
+    def dispatch(self, request, *args, **kwargs):
+        self.plan = get_object_or_404(InstallmentPlan.objects.select_related('sale'), pk=self.kwargs['pk'])
+        return super().dispatch(request, *args, **kwargs)
+
     def get_initial(self):
         initial = super().get_initial()
-        initial['installment_plan'] = get_object_or_404(InstallmentPlan, pk=self.kwargs['pk'])
+        initial['amount_paid'] = self.plan.installment_amount
+        initial['due_date'] = next_due_date(self.plan)
         return initial
-    
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        total_paid = self.plan.payments.aggregate(total=Sum('amount_paid'))['total'] or 0
+        context['plan'] = self.plan
+        context['remaining_balance'] = self.plan.sale.total_amount - total_paid
+        return context
+
     def form_valid(self, form):
-        payment = form.save(commit=False)
+        payment = self.object = form.save(commit=False)
         # Link the payment to the correct plan based on the URL
-        payment.installment_plan = get_object_or_404(InstallmentPlan, pk=self.kwargs['pk'])
-        payment.save()
-        messages.success(self.request, f"Payment of ${payment.amount_paid} recorded successfully.")
+        payment.plan = self.plan
+        payment.status = InstallmentPayment.PAID
+        with transaction.atomic():
+            payment.save()
+            if complete_paid_plans([self.plan.pk]):
+                transaction.on_commit(lambda: bump_model_version(InstallmentPlan))
+        messages.success(self.request, f"Payment of Rs {payment.amount_paid} recorded successfully.")
         return redirect(self.get_success_url())
-    
+
+
+@login_required
+def statement_review(request):
+    """Upload a bank statement, and post or ignore the credits it could not match (see sales/statements.py)."""
+    upload_form = StatementUploadForm()
+    if request.method == 'POST':
+        upload_form = StatementUploadForm(request.POST, request.FILES)
+        if upload_form.is_valid():
+            statement = io.TextIOWrapper(upload_form.cleaned_data['statement'], encoding='utf-8-sig', newline='')
+            try:
+                stats = import_statement(csv.DictReader(statement), user=request.user)
+            except (UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, f"Could not read the statement: {e}")
+            except IntegrityError:
+                messages.error(request, "This statement is being imported by someone else; try again in a moment.")
+            else:
+                messages.success(
+                    request,
+                    f"{stats['posted']} payment(s) posted, {stats['settled']} plan(s) paid off, "
+                    f"{stats['queued']} line(s) queued for review, {stats['duplicates']} already imported.",
+                )
+                return redirect('sales:statement_review')
+
+    page_obj = Paginator(StatementLine.objects.filter(status=StatementLine.OPEN), 50).get_page(request.GET.get('page'))
+    return render(request, 'sales/statement_review.html', {
+        'upload_form': upload_form,
+        'page_obj': page_obj,
+        'lines': page_obj.object_list,
+        'post_form': StatementPostForm(),
+    })
+
+
+@require_POST
+@login_required
+def statement_line_action(request, pk):
+    """Posts an open statement line against the plan of the sale given, or ignores it."""
+    line = get_object_or_404(StatementLine, pk=pk, status=StatementLine.OPEN)
+    if request.POST.get('action') == 'ignore':
+        line.status = StatementLine.IGNORED
+        line.save(update_fields=['status'])
+        messages.success(request, f"Ignored the {line.booked_on} credit of Rs {line.amount}.")
+        return redirect('sales:statement_review')
+
+    form = StatementPostForm(request.POST)
+    if not form.is_valid():
+        for error in form.errors.get('sale', []):
+            messages.error(request, error)
+        return redirect('sales:statement_review')
+    try:
+        post_statement_line(line, form.cleaned_data['plan'])
+    except IntegrityError:
+        messages.error(request, "This line was already posted.")
+    else:
+        messages.success(request, f"Posted Rs {line.amount} to sale #{form.cleaned_data['sale']}.")
+    return redirect('sales:statement_review')
 
 
 @login_required
 def sale_receipt_view(request, pk):
     """Generates a simplified, print-friendly receipt view for a Sale."""
-    sale = get_object_or_404(Sale, pk=pk)
+    sale = get_sale_or_404(pk)
     
     context = {
         'sale': sale,
     }
     # Renders the new, simple receipt template
-    return render(request, 'sales/sale_receipt.html', context)
\ No newline at end of file
+    return render(request, 'sales/sale_receipt.html', context)
+
+
+@require_POST
+@login_required
+def sale_batch_ingest(request):
+    """Records a batch of sales queued by an offline till. JSON in, JSON out; see sales/ingest.py."""
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': "Request body must be JSON."}, status=400)
+
+    try:
+        results = ingest_sales(
+            payload.get('sales') if isinstance(payload, dict) else None,
+            till=current_till(request),
+            cashier=request.user,
+        )
+    except BatchValidationError as e:
+        return JsonResponse({'errors': e.errors}, status=400)
+    except InsufficientStock as e:
+        return JsonResponse({'error': str(e), 'product_id': e.product.pk}, status=409)
+    except IntegrityError:
+        # Another request stored one of these keys at the same time; a retry reports it as a duplicate
+        return JsonResponse({'error': "Concurrent submission of the same sale; retry the batch."}, status=409)
+
+    return JsonResponse({'results': results})
+
+
+# --- 4. End-of-day close (Z-reports) ---
+
+class ZReportListView(LoginRequiredMixin, ListView):
+    model = ZReport
+    template_name = 'sales/zreport_list.html'
+    context_object_name = 'reports'
+    paginate_by = 30
+
+
+@login_required
+def zreport_detail(request, pk):
+    """Printable Z-report; ?format=csv downloads the same figures as CSV."""
+    report = get_object_or_404(ZReport, pk=pk)
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="z-report-{report.business_date}-v{report.version}.csv"'
+        write_csv(report, response)
+        return response
+    return render(request, 'sales/zreport.html', zreport_context(report))